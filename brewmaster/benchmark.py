@@ -0,0 +1,206 @@
+"""
+Benchmark the simulation over a matrix of horizons, demand levels and cellar sizes.
+
+Run it from the command line and keep the results file to flag regressions later::
+
+    python -m brewmaster.benchmark --output benchmark.json
+    python -m brewmaster.benchmark --output new.json --baseline benchmark.json
+
+"""
+from __future__ import division, print_function
+from argparse import ArgumentParser
+from itertools import product
+from json import dump, load
+from multiprocessing import Pool
+from platform import platform, python_version
+from time import perf_counter
+import numpy as np
+import simpy
+from simpy import Environment
+from .brewery import AVG_GROUP_ARRIVAL_TIME, Brewery
+from .memory import memory_report
+from .replication import kpis
+
+
+HORIZONS = {'day': 24, 'month': 30 * 24, 'year': 365 * 24, '5 years': 5 * 365 * 24}
+DEMANDS = {'default': 1, '5x arrivals': 5}
+COOPERAGES = {'small': dict(num_stored_kegs=10, num_kegs_per_beer=2),
+              'large': dict(num_stored_kegs=100, num_kegs_per_beer=20)}
+TIMINGS = ['wall_time', 'events_per_second', 'peak_rss']
+TOLERANCE = 0.2
+MIN_WALL_TIME = 0.1
+
+
+class CountingEnvironment(Environment):
+    """ An environment that counts the events it schedules. """
+
+    def __init__(self, initial_time=0):
+        super(CountingEnvironment, self).__init__(initial_time)
+        self.scheduled = 0
+
+    def schedule(self, event, priority=1, delay=0):
+        self.scheduled += 1
+        super(CountingEnvironment, self).schedule(event, priority, delay)
+
+
+def scenarios(horizons=None, demands=None, cooperages=None):
+    """
+    Return the benchmark scenarios, one per combination of horizon, demand and cooperage.
+
+    :param horizons: the names of the horizons to run (defaults to all of :data:`HORIZONS`)
+    :param demands: the names of the demand levels to run (defaults to all of :data:`DEMANDS`)
+    :param cooperages: the names of the cellar sizes to run (defaults to all of :data:`COOPERAGES`)
+
+    :type horizons: list
+    :type demands: list
+    :type cooperages: list
+
+    :rtype: list
+
+    """
+    return [{'name': '{} / {} / {} cooperage'.format(horizon, demand, cooperage),
+             'horizon': horizon, 'demand': demand, 'cooperage': cooperage}
+            for horizon, demand, cooperage in product(horizons or HORIZONS, demands or DEMANDS, cooperages or COOPERAGES)]
+
+
+def run_scenario(scenario, random_seed=0, **config):
+    """
+    Run one benchmark scenario and measure it.
+
+    Peak RSS is only meaningful when the scenario has the process to itself,
+    which :func:`benchmark` ensures by running every scenario in a fresh worker.
+
+    :param scenario: the scenario, as returned by :func:`scenarios`
+    :param random_seed: the seed of the run
+    :param config: extra keyword arguments passed on to :class:`Brewery`
+
+    :type scenario: dict
+    :type random_seed: int
+
+    :rtype: dict
+
+    """
+    options = dict(COOPERAGES[scenario['cooperage']], arrival_rate=AVG_GROUP_ARRIVAL_TIME * DEMANDS[scenario['demand']])
+    options.update(config)
+    env = CountingEnvironment()
+    start = perf_counter()
+    brewery = Brewery(env=env, random_seed=random_seed, **options)
+    brewery.run(HORIZONS[scenario['horizon']])
+    wall_time = perf_counter() - start
+    memory = memory_report()
+    return dict(scenario,
+                seed=random_seed,
+                wall_time=wall_time,
+                events=env.scheduled,
+                events_per_second=env.scheduled / wall_time if wall_time else float('nan'),
+                rss=memory['rss'],
+                peak_rss=memory['peak_rss'],
+                objects=memory['objects'],
+                counts=memory['counts'],
+                kpis=kpis(brewery))
+
+
+def benchmark(selected=None, random_seed=0, output=None, **config):
+    """
+    Run benchmark scenarios, each in its own worker process, and optionally write the results as JSON.
+
+    :param selected: the scenarios to run (defaults to the full matrix of :func:`scenarios`)
+    :param random_seed: the seed of every run
+    :param output: the file to write the results to
+    :param config: extra keyword arguments passed on to :class:`Brewery`
+
+    :type selected: list
+    :type random_seed: int
+    :type output: str
+
+    :rtype: dict
+
+    """
+    selected = scenarios() if selected is None else selected
+    results = []
+    for scenario in selected:
+        pool = Pool(1)
+        try:
+            results.append(pool.apply(run_scenario, (scenario, random_seed), config))
+        finally:
+            pool.close()
+            pool.join()
+
+    report = {'python': python_version(),
+              'numpy': np.__version__,
+              'simpy': simpy.__version__,
+              'platform': platform(),
+              'results': results}
+    if output is not None:
+        with open(output, 'w') as results_file:
+            dump(report, results_file, indent=2, sort_keys=True)
+    return report
+
+
+def regressions(report, baseline, tolerance=TOLERANCE):
+    """
+    Return the measurements of a report that are worse than a baseline report by more than a tolerance.
+
+    Wall time and peak RSS regress when they grow, events per second when it shrinks.
+    Timings of scenarios that ran for less than ``MIN_WALL_TIME`` seconds are too noisy to compare and are skipped.
+
+    :param report: the new benchmark report
+    :param baseline: the baseline benchmark report
+    :param tolerance: the relative change allowed
+
+    :type report: dict
+    :type baseline: dict
+    :type tolerance: float
+
+    :return: one entry per regression with the scenario, measurement, baseline and new value
+    :rtype: list
+
+    """
+    previous = {result['name']: result for result in baseline['results']}
+    found = []
+    for result in report['results']:
+        if result['name'] not in previous:
+            continue
+        quick = previous[result['name']]['wall_time'] < MIN_WALL_TIME
+        for timing in TIMINGS:
+            if quick and timing != 'peak_rss':
+                continue
+            old, new = previous[result['name']].get(timing), result.get(timing)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if timing == 'events_per_second':
+                change = -change
+            if change > tolerance:
+                found.append({'name': result['name'], 'measurement': timing, 'baseline': old, 'value': new,
+                              'change': change})
+    return found
+
+
+def main(args=None):
+    parser = ArgumentParser(description='Benchmark the brewery simulation.')
+    parser.add_argument('--output', default='benchmark.json', help='the file to write the results to')
+    parser.add_argument('--baseline', help='a previous results file to flag regressions against')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='the relative slowdown allowed')
+    parser.add_argument('--horizons', nargs='+', choices=list(HORIZONS), help='the horizons to run')
+    parser.add_argument('--demands', nargs='+', choices=list(DEMANDS), help='the demand levels to run')
+    parser.add_argument('--cooperages', nargs='+', choices=list(COOPERAGES), help='the cellar sizes to run')
+    parser.add_argument('--seed', type=int, default=0, help='the random seed of every run')
+    options = parser.parse_args(args)
+
+    report = benchmark(scenarios(options.horizons, options.demands, options.cooperages),
+                       random_seed=options.seed, output=options.output)
+    for result in report['results']:
+        print('{name:40s} {wall_time:8.2f} s {events_per_second:10.0f} events/s {peak_rss:>12} B peak'.format(**result))
+
+    if options.baseline:
+        with open(options.baseline) as baseline_file:
+            found = regressions(report, load(baseline_file), options.tolerance)
+        for regression in found:
+            print('REGRESSION {name}: {measurement} {baseline:.4g} -> {value:.4g} ({change:+.0%})'.format(**regression))
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,11 +1,18 @@
 from __future__ import division, print_function
-from json import load
-from random import seed, expovariate, normalvariate, sample, uniform
+from array import array
+from collections import Counter
 from six import string_types
+import numpy as np
 import simpy
-from .util import SimpyMixin, poisson, csv_to_dict, json_to_dict, check_inputs
+from .eventlog import INFO, DEBUG, WARNING, EventLog, register_event
+from .sampling import Streams
+from .util import Interrupt, SimpyMixin, check_inputs, load_beers, load_prices
 from .patron import Patron
-from .keg import Keg
+from .cohort import COHORT_INTERVAL, Cohort
+from .demand import SalesProfile, iter_sales
+from .keg import Cooperage, Keg
+from .recipes import DryStorage, RecipeMatrix, lowest_inventory
+from .profiling import Profiler
 
 
 DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
@@ -21,11 +28,51 @@ MAX_MASH_WAIT = 6
 AVG_GROUP_ARRIVAL_TIME = 1.5
 TIME_TO_KEG = 0.5
 TIME_TO_DELIVER = [5, 48]
-MAX_AMOUNT_PER_INGREDIENT = 100
+INITIAL_INGREDIENT_STOCK = 1000
+REORDER_BATCHES = 2
+CREDIT_INTERVAL = 1
 TABLES = {2: 4, 4: 10, 6: 4, 8: 4, 10: 1}
+STREAMS = ['arrivals', 'patrons', 'brewing', 'delivery', 'bar']
+BAR_MODES = ['patrons', 'cohorts', 'replay', 'resample']
+STAGES = MASH_STAGE, FERMENT_STAGE, CONDITION_STAGE, KEG_STAGE = ['mashing', 'fermenting', 'conditioning', 'kegging']
+KEG_RETURN_TIME = 24
+
+OPENED = register_event(INFO, 'Brewery is open on a {}', names=(0,))
+CLOSED = register_event(INFO, 'Brewery is closing for {}', names=(0,))
+NOT_OPENED = register_event(WARNING, 'Could not open on {} because no beers were on tap', names=(0,))
+RESTOCKING = register_event(DEBUG, 'trying to restock kegs')
+TAPPED = register_event(INFO, 'Tapped {}', names=(0,))
+KICKING_OUT = register_event(INFO, 'Kicking out {:.0f} patrons')
+SALE_FAILED = register_event(WARNING, 'Failed to sell {:g} pints of {}', names=(1,))
+COHORT_SERVED = register_event(DEBUG, 'Seated {:.0f} of {:.0f} parties who drank {:.0f} pints')
+WAITING_FOR_MASH_TUN = register_event(INFO, 'Waiting for Mash Tun for {}', names=(0,))
+RELEASED_MASH_TUN = register_event(INFO, 'Released Mash Tun for beer {}', names=(0,))
+FERMENTING = register_event(INFO, 'Starting fermentation for beer {}', names=(0,))
+FERMENTED = register_event(INFO, 'Finished fermentation for beer {}', names=(0,))
+BATCH_FAILED = register_event(WARNING, 'Failed batch of {} ({:.0f} kegs) because of timeout for fermenter', names=(0,))
+CONDITIONING = register_event(INFO, 'Starting conditioning for beer {}', names=(0,))
+CONDITIONED = register_event(INFO, 'Finished conditioning for beer {}', names=(0,))
+BREW_FAILED = register_event(WARNING, 'Failed to brew {} because of {}', names=(0, 1))
+ORDERED = register_event(INFO, 'Ordered {:g} of {}', names=(1,))
+SHIPPED = register_event(INFO, 'Shipped {:.0f} kegs of {}', names=(1,))
+NOT_SHIPPED = register_event(WARNING, 'Could not ship any kegs of {}', names=(0,))
+DELIVERED = register_event(INFO, 'Received {:g} of {} for ${:.2f}', names=(1,))
+OWING = register_event(WARNING, 'Owing ${:.2f} for {} the register could not cover', names=(1,))
 
 
 class Brewery(SimpyMixin):
+    """
+    A brewery that brews beer, stores it in kegs and sells it by the pint at its bar.
+
+    The bar is modelled with one process per party by default (``bar='patrons'``).
+    With ``bar='cohorts'`` the parties arriving each hour are drawn as one :class:`Cohort`
+    and their pints are poured in bulk, which is much faster for long horizons or
+    busy bars at the cost of hourly rather than per-party timing.
+    With ``bar='replay'`` or ``bar='resample'`` demand comes from a CSV file of historical
+    sales instead (see :mod:`brewmaster.demand`): its sales are replayed at their times,
+    or whole days of them are drawn at random for each day the bar opens.
+    """
+
     def __init__(self, beers_list='beers.json',
                  price_list='prices.csv',
                  initial_funds=10000.0,
@@ -39,114 +86,434 @@ class Brewery(SimpyMixin):
                  num_kegs_per_beer=2,
                  tables=None,
                  hours=None,
-                 random_seed=None, *args, **kwargs):
-
+                 arrival_rate=AVG_GROUP_ARRIVAL_TIME,
+                 reorder_points=None,
+                 order_quantities=None,
+                 lead_times=None,
+                 brew_policy=lowest_inventory,
+                 bar='patrons',
+                 sales=None,
+                 random_seed=None,
+                 antithetic=False,
+                 log_level=INFO,
+                 log_capacity=None,
+                 profile=False,
+                 checkpoint=None, *args, **kwargs):
+
+        self.streams = Streams(random_seed, names=STREAMS, antithetic=antithetic)
+        kwargs.setdefault('rng', self.streams['bar'])
+        kwargs.setdefault('events', EventLog(level=log_level, capacity=log_capacity))
+        if profile:
+            kwargs.setdefault('profiler', Profiler())
         super(Brewery, self).__init__(*args, **kwargs)
 
-        if random_seed is not None:
-            seed(random_seed)
-
-        self.register = self.new_container(init=initial_funds)
-        self.beers = {name: beer for name, beer in json_to_dict(beers_list).items()}
-        for beer in self.beers:
-            self.beers[beer].update({'name': beer})
-        self.prices = {item['name']: item['price'] for item in csv_to_dict(price_list)}
+        self.register = self.new_container(init=initial_funds if checkpoint is None else checkpoint['register'])
+        self.unbanked = 0.0
+        self.payables = 0.0
+        self.banking = None
+        self.beers = load_beers(beers_list)
+        self.prices = load_prices(price_list)
         self.hours = hours if hours is not None else DEFAULT_HOURS
+        self.arrival_rate = arrival_rate
         self.batch_size = batch_size
-
-        self.patrons = []
+        if bar not in BAR_MODES:
+            raise ValueError("bar must be one of {}, not {!r}".format(BAR_MODES, bar))
+        self.bar = bar
+        if bar in ('replay', 'resample') and sales is None:
+            raise ValueError("bar={!r} needs a sales file".format(bar))
+        self.sales = sales
+        self.sales_read = 0
+        self.trace = None
+        self.next_sale = None
+        self.sales_profile = SalesProfile(sales, self.beers) if bar == 'resample' else None
+
+        self.patrons = {}
+        self.swaps = {}
+        self.pints_sold = 0
+        self.pints_by_beer = {}
+        self.pour_times = array('d')
+        self.pour_beers = array('i')
+        self.pour_pints = array('d')
+        self.stockouts = 0
+        self.parties_arrived = 0
+        self.parties_turned_away = 0
 
         self.mash_tuns = self.new_resource(capacity=num_mash_tuns)
         self.cooper_tanks = self.new_resource(capacity=num_cooper_tanks)
         self.fermenters = self.new_resource(capacity=num_fermenters)
         self.conditioners = self.new_resource(capacity=num_conditioners)
 
-        self.dry_storage = {}
-        for ingredient in [beer['ingredients'] for beer in self.beers.values()][0]:
-            if ingredient not in self.dry_storage:
-                self.dry_storage[ingredient] = self.new_container(init=1000)
-        self.cellar = self.new_store(capacity=num_stored_kegs, kind='filter')
-        self.tapped_kegs = self.new_store(capacity=num_bar_kegs, kind='filter')
+        self.recipes = RecipeMatrix(self.beers)
+        self.brew_policy = brew_policy
+        self.dry_storage = DryStorage(self.recipes, init=INITIAL_INGREDIENT_STOCK, env=self.env,
+                                      monitoring=self.monitoring, bucket=self.monitor_interval)
+        self.reorder_points = {ingredient: REORDER_BATCHES * batch_size *
+                               max(beer['ingredients'].get(ingredient, 0) for beer in self.beers.values())
+                               for ingredient in self.dry_storage}
+        self.reorder_points.update(reorder_points or {})
+        self.dry_storage.reorder_points[:] = [self.reorder_points[ingredient] for ingredient in self.dry_storage]
+        self.order_quantities = dict.fromkeys(self.dry_storage, INITIAL_INGREDIENT_STOCK)
+        self.order_quantities.update(order_quantities or {})
+        self.lead_times = dict.fromkeys(self.dry_storage, TIME_TO_DELIVER)
+        self.lead_times.update(lead_times or {})
+        self.orders = {}
+        self.cellar = self.new_store(capacity=num_stored_kegs, kind='keg')
+        self.tapped_kegs = self.new_store(capacity=num_bar_kegs, kind='keg')
+
+        if self.profiler is not None:
+            for name in ('register', 'cellar', 'tapped_kegs', 'mash_tuns', 'cooper_tanks', 'fermenters', 'conditioners'):
+                self.profiler.watch(getattr(self, name), name)
 
         self._tables = TABLES if tables is None else tables
         self.set_tables()
 
-        if isinstance(num_kegs_per_beer, int):
-            for beer in self.beers:
-                for keg in [k for k in self.cellar.items if k.amount == 0 and k.clean][:num_kegs_per_beer]:
-                    keg.fill(beer)
-        elif isinstance(num_kegs_per_beer, dict):
-            for beer, num_kegs in num_kegs_per_beer.items():
-                for keg in [k for k in self.cellar.items if k.amount == 0 and k.clean][:num_kegs]:
-                    keg.fill(beer)
-
-        for _ in range(num_stored_kegs):
-            self.cellar.put(Keg())
-
+        self.cooperage = Cooperage(env=self.env, monitoring=self.monitoring, bucket=self.monitor_interval)
         self.kegs_ready = []
+        self.brewing = None
+        self.deliveries = {}
+        self.shipments = []
+        self.kegs_shipped = 0
+        self.bar_state = {'day': 0}
 
         check_inputs(self.beers, self.prices)
-        self.buying_ingredients = self.process(self.buy_ingredients())
-        self.running_bar = self.process(self.run_bar())
-        self.running_brewery = self.process(self.run_brewery())
+        if checkpoint is not None:
+            self.restore(checkpoint, num_stored_kegs)
+        else:
+            for _ in range(num_stored_kegs):
+                self.cellar.put(Keg(cooperage=self.cooperage, env=self.env))
+
+            if isinstance(num_kegs_per_beer, int):
+                for beer in self.beers:
+                    for keg in list(self.cellar.clean_kegs)[:num_kegs_per_beer]:
+                        keg.fill(beer)
+            elif isinstance(num_kegs_per_beer, dict):
+                for beer, num_kegs in num_kegs_per_beer.items():
+                    for keg in list(self.cellar.clean_kegs)[:num_kegs]:
+                        keg.fill(beer)
+
+            for ingredient in self.dry_storage:
+                self.reorder(ingredient)
+            self.running_bar = self.process(self.run_bar())
+            self.running_brewery = self.process(self.run_brewery())
 
         self.errors = None
 
+    def checkpoint(self):
+        """
+        Return the state of the brewery as plain, picklable data.
+
+        SimPy processes cannot be saved, so the state of each activity in flight is
+        recorded explicitly: the day of the bar and when it next opens or starts a new
+        day, the brew in progress with its stage and the hours left in it, the
+        ingredient orders and keg shipments on their way, and the state of every
+        random stream. A checkpoint can only be taken while the bar is closed; pass it
+        to :class:`Brewery` as ``checkpoint`` (see :func:`brewmaster.checkpoint.fork`)
+        to continue from it.
+
+        :rtype: dict
+        """
+        if self.patrons or self.swaps or (getattr(self, 'serving', None) is not None and self.serving.is_alive):
+            raise ValueError("A checkpoint can only be taken while the bar is closed")
+
+        kegs, locations = [], {}
+        held = [('cellar', self.cellar.items), ('tapped_kegs', self.tapped_kegs.items),
+                ('brewing', self.brewing['kegs'] if self.brewing else [])]
+        held += [('shipment', shipment['kegs']) for shipment in self.shipments]
+        for location, items in held:
+            for keg in items:
+                locations[keg] = len(kegs)
+                kegs.append({'number': keg.number, 'name': keg.name, 'expiration': keg.expiration,
+                             'amount': keg.amount, 'clean': keg.clean, 'location': location})
+
+        brewing = None
+        if self.brewing is not None:
+            brewing = {'beer': self.brewing['beer'],
+                       'kegs': [locations[keg] for keg in self.brewing['kegs']],
+                       'stage': self.brewing['stage'],
+                       'remaining': max(0.0, self.brewing['ends'] - self.now)}
+
+        return {'time': self.now,
+                'register': self.register.level,
+                'unbanked': self.unbanked,
+                'counters': {'pints_sold': self.pints_sold,
+                             'pints_by_beer': dict(self.pints_by_beer),
+                             'stockouts': self.stockouts,
+                             'parties_arrived': self.parties_arrived,
+                             'parties_turned_away': self.parties_turned_away,
+                             'kegs_shipped': self.kegs_shipped,
+                             'sales_read': self.sales_read,
+                             'payables': self.payables},
+                'dry_storage': {ingredient: float(self.dry_storage.level(ingredient)) for ingredient in self.dry_storage},
+                'kegs': kegs,
+                'brewing': brewing,
+                'deliveries': {ingredient: list(delivery) for ingredient, delivery in self.deliveries.items()},
+                'shipments': [{'kegs': [locations[keg] for keg in shipment['kegs']], 'due': shipment['due']}
+                              for shipment in self.shipments],
+                'bar': dict(self.bar_state),
+                'streams': {name: stream.getstate() for name, stream in self.streams.items()}}
+
+    def restore(self, checkpoint, num_stored_kegs=0):
+        """
+        Restore the state returned by :meth:`checkpoint` into a brewery built at the checkpoint's time,
+        and restart its activities where they left off.
+
+        Kegs are put back where they were, with clean kegs added to reach ``num_stored_kegs``.
+        The random streams are restored unless ``checkpoint['streams']`` is ``None``.
+        Every keg comes back to the cellar sooner or later, so a cellar with fewer slots than
+        the checkpoint has kegs, or a bar with fewer taps than kegs on tap, is refused.
+
+        :param checkpoint: the checkpoint
+        :param num_stored_kegs: the number of kegs the brewery should have
+
+        :type checkpoint: dict
+        :type num_stored_kegs: int
+        """
+        states = checkpoint['kegs']
+        on_tap = sum(1 for state in states if state['location'] == 'tapped_kegs')
+        if len(states) > self.cellar.capacity:
+            raise ValueError("The checkpoint holds {} kegs, more than the {} the cellar can store"
+                             .format(len(states), self.cellar.capacity))
+        if on_tap > self.tapped_kegs.capacity:
+            raise ValueError("The checkpoint has {} kegs on tap, more than the {} the bar can hold"
+                             .format(on_tap, self.tapped_kegs.capacity))
+
+        for name, value in checkpoint['counters'].items():
+            setattr(self, name, value)
+        self.bank(checkpoint['unbanked'])
+        for ingredient, level in checkpoint['dry_storage'].items():
+            if ingredient in self.dry_storage:
+                self.dry_storage.stock(ingredient, level - self.dry_storage.level(ingredient))
+        if checkpoint['streams'] is not None:
+            for name, state in checkpoint['streams'].items():
+                self.streams[name].setstate(state)
+
+        order = sorted(range(len(states)), key=lambda idx: states[idx]['number'])
+        kegs = [None] * len(states)
+        for idx in order:
+            kegs[idx] = keg = Keg(cooperage=self.cooperage, env=self.env, init=states[idx]['amount'])
+            keg.name, keg.expiration, keg.clean = states[idx]['name'], states[idx]['expiration'], states[idx]['clean']
+        self.cellar.put_kegs([kegs[idx] for idx in order if states[idx]['location'] == 'cellar'])
+        self.tapped_kegs.put_kegs([kegs[idx] for idx in order if states[idx]['location'] == 'tapped_kegs'])
+        for _ in range(num_stored_kegs - len(kegs)):
+            self.cellar.put(Keg(cooperage=self.cooperage, env=self.env))
+
+        for ingredient, (quantity, due) in checkpoint['deliveries'].items():
+            self.orders[ingredient] = self.process(self.buy_ingredient(ingredient, quantity, due=due))
+        for ingredient in self.dry_storage:
+            self.reorder(ingredient)
+        for shipment in checkpoint['shipments']:
+            self.process(self.return_kegs([kegs[idx] for idx in shipment['kegs']], shipment['due']))
+
+        brewing = checkpoint['brewing']
+        if brewing is not None:
+            brewing = dict(brewing, kegs=[kegs[idx] for idx in brewing['kegs']])
+            self.brewing = {'beer': brewing['beer'], 'kegs': brewing['kegs'], 'stage': brewing['stage'],
+                            'ends': self.now + brewing['remaining']}
+        self.bar_state = dict(checkpoint['bar'])
+        self.running_bar = self.process(self.run_bar(**checkpoint['bar']))
+        self.running_brewery = self.process(self.run_brewery(brewing))
+
+    def time_series(self):
+        """
+        Return the level series of the monitored containers and stores, keyed by name.
+
+        Only available when the brewery was built with ``monitoring=True``.
+
+        :rtype: dict
+
+        """
+        series = {'register': self.register.series,
+                  'cellar': self.cellar.series,
+                  'tapped_kegs': self.tapped_kegs.series}
+        for ingredient, ingredient_series in self.dry_storage.series.items():
+            series['dry_storage/' + ingredient] = ingredient_series
+        return series
+
+    def pours(self):
+        """
+        Return the ``time``, ``beer`` (an index into ``recipes.names``) and ``pints`` of every pour
+        since the brewery was built or restored, whatever its event log keeps.
+
+        :rtype: dict
+
+        """
+        return {'time': np.array(self.pour_times, dtype=float),
+                'beer': np.array(self.pour_beers, dtype=np.int32),
+                'pints': np.array(self.pour_pints, dtype=float)}
+
     def set_tables(self):
         self.tables = {}
+        self.table_for = {}
         for table_size, quantity in self._tables.items():
             self.tables[table_size] = self.new_resource(capacity=quantity)
+            if self.profiler is not None:
+                self.profiler.watch(self.tables[table_size], 'tables/{}'.format(table_size))
 
-    def buy_ingredients(self):
-        while True:
-            yield self.wait(1)
-            for ingredient, container in self.dry_storage.items():
-                if container.level == 0:
-                    quantity = MAX_AMOUNT_PER_INGREDIENT / self.prices[ingredient]
-                    self.buy_ingredient(ingredient, quantity)
-
-    def buy_ingredient(self, ingredient, quantity):
-        # Await arrival of ingredient
-        yield self.wait(TIME_TO_DELIVER)
-        # Stock ingredient
-        self.dry_storage[ingredient] += quantity
-        # Pay for ingredient
-        self.register -= self.prices[ingredient] * quantity
-
-    def run_bar(self):
-        day = 0
+    def reorder(self, ingredient):
+        """
+        Order an ingredient if its level is at or below its reorder point and no order is outstanding.
+
+        :param ingredient: the ingredient to check
+        :type ingredient: str
+        """
+        if ingredient not in self.orders and self.dry_storage.level(ingredient) <= self.reorder_points[ingredient]:
+            self.orders[ingredient] = self.process(self.buy_ingredient(ingredient, self.order_quantities[ingredient]))
+
+    def buy_ingredient(self, ingredient, quantity, due=None):
+        """
+        Order an ingredient and pay for it on delivery.
+
+        :param ingredient: the ingredient to buy
+        :param quantity: the amount to buy
+        :param due: the delivery time of an order restored from a checkpoint
+
+        :type ingredient: str
+        :type quantity: float
+        :type due: float
+        """
+        if due is None:
+            self.log(ORDERED, quantity, ingredient)
+            due = self.now + self.duration(self.lead_times[ingredient], rng=self.streams['delivery'])
+        self.deliveries[ingredient] = (quantity, due)
+        yield self.wait(max(0.0, due - self.now))
+        cost = self.prices[ingredient] * quantity
+        owed = self.pay(cost)
+        if owed:
+            self.log(OWING, owed, ingredient)
+        self.dry_storage.stock(ingredient, quantity)
+        self.log(DELIVERED, quantity, ingredient, cost)
+        del self.orders[ingredient]
+        del self.deliveries[ingredient]
+        self.reorder(ingredient)
+
+    def run_bar(self, day=0, opening=None, wakeup=None):
+        """
+        Open the bar on every day it has beer on tap.
+
+        A bar restored from a checkpoint starts on ``day``, either waiting to open at
+        ``opening`` (its taps already restocked) or closed until ``wakeup``.
+
+        :param day: the number of the day
+        :param opening: the time the bar opens
+        :param wakeup: the time the bar starts its next day
+
+        :type day: int
+        :type opening: float
+        :type wakeup: float
+        """
+        if wakeup is not None:
+            self.bar_state = {'day': day, 'wakeup': wakeup}
+            yield self.wait(wakeup - self.now)
         while True:
             day_of_the_week = day % 7
-            self.process(self.restock_bar())
-            if self.tapped_kegs.items:
+            if opening is None:
+                self.process(self.restock_bar())
+            if opening is not None or self.tapped_kegs.items:
                 start, end = self.hours[DAYS[day_of_the_week]]
-                time_till_open = max(0, start - (self.now % 24.0))
+                time_till_open = max(0, start - (self.now % 24.0)) if opening is None else opening - self.now
+                self.bar_state = {'day': day, 'opening': self.now + time_till_open}
+                opening = None
                 yield self.wait(time_till_open)
-                self.log("Brewery is open on a {}".format(DAYS[day_of_the_week]))
-                self.serving = self.process(self.serve_customers())
+                self.log(OPENED, DAYS[day_of_the_week])
                 time_till_close = max(0, end - self.now % 24.0)
+                if self.bar == 'cohorts':
+                    self.serving = self.process(self.serve_cohorts(self.now + time_till_close))
+                elif self.bar == 'replay':
+                    self.serving = self.process(self.replay_sales(self.now + time_till_close))
+                elif self.bar == 'resample':
+                    self.serving = self.process(self.resample_sales(day_of_the_week, self.now + time_till_close))
+                else:
+                    self.serving = self.process(self.serve_customers())
                 yield self.wait(time_till_close)
-                self.serving.interrupt("Brewery is closing")
-                self.log("Brewery is closing for {}".format(DAYS[day_of_the_week]))
+                if self.serving.is_alive:
+                    self.serving.interrupt("Brewery is closing")
+                self.log(CLOSED, DAYS[day_of_the_week])
                 self.set_tables()
                 self.process(self.check_kegs())
-                yield self.wait(24 - (self.now % 24.0))
+                time_till_tomorrow = 24 - (self.now % 24.0)
             else:
-                self.log("Could not open on {} because no beers were on tap".format(DAYS[day_of_the_week]))
-                yield self.wait(24)
+                self.log(NOT_OPENED, DAYS[day_of_the_week])
+                time_till_tomorrow = 24
+            self.bar_state = {'day': day + 1, 'wakeup': self.now + time_till_tomorrow}
+            yield self.wait(time_till_tomorrow)
 
             day += 1
 
     def restock_bar(self):
-        for _ in range(len(self.tapped_kegs.items) < self.tapped_kegs.capacity):
-            self.log("trying to restock kegs")
-            beers_on_tap = [keg.name for keg in self.tapped_kegs.items]
-            candidate_kegs = [keg for keg in self.cellar.items if keg.name not in beers_on_tap]
-            if candidate_kegs:
-                keg = sample(candidate_kegs, 1)[0]
-                yield self.cellar.get(filter=lambda x: x == keg)
-                yield self.tapped_kegs.put(keg)
-                self.log("Tapped {}".format(keg.name))
+        free_taps = self.tapped_kegs.capacity - len(self.tapped_kegs.items)
+        if not free_taps:
+            return
+        self.log(RESTOCKING)
+        beers_on_tap = set(self.tapped_kegs.beers)
+        kegs = []
+        for _ in range(free_taps):
+            candidate_kegs = [keg for beer in self.cellar.beers if beer not in beers_on_tap
+                              for keg in self.cellar.kegs(beer) if keg.amount]
+            if not candidate_kegs:
+                break
+            keg = self.rng.choice(candidate_kegs)
+            kegs.append(keg)
+            beers_on_tap.add(keg.name)
+
+        if kegs:
+            yield self.cellar.get_kegs(kegs)
+            yield self.tapped_kegs.put_kegs(kegs)
+            for keg in kegs:
+                self.log(TAPPED, keg.name)
+
+    def dispatch_kegs(self, beer, num_kegs, price=None):
+        """
+        Take up to a number of the fullest kegs of a beer out of the cellar and bank their sale.
+
+        :param beer: the beer to sell
+        :param num_kegs: the number of kegs wanted
+        :param price: the price per pint (defaults to the bar price)
+
+        :type beer: str
+        :type num_kegs: int
+        :type price: float
+
+        :return: the kegs sold, still holding the beer sold, now owed back to the cellar
+        :rtype: list
+        """
+        kegs = [keg for keg in self.cellar.kegs(beer) if keg.amount][-num_kegs:] if num_kegs > 0 else []
+        if not kegs:
+            self.log(NOT_SHIPPED, beer)
+            return kegs
+        self.cellar.get_kegs(kegs)
+        pints = sum(keg.amount for keg in kegs)
+        self.bank(pints * (self.prices[beer] if price is None else price))
+        self.kegs_shipped += len(kegs)
+        self.log(SHIPPED, len(kegs), beer)
+        return kegs
+
+    def ship_kegs(self, beer, num_kegs, price=None, return_time=KEG_RETURN_TIME):
+        """
+        Sell the fullest kegs of a beer in the cellar, e.g. to a festival, and get the empties back later.
+
+        :param beer: the beer to ship
+        :param num_kegs: the number of kegs wanted
+        :param price: the price per pint (defaults to the bar price)
+        :param return_time: the hours until the empty kegs come back
+
+        :type beer: str
+        :type num_kegs: int
+        :type price: float
+        :type return_time: float
+        """
+        kegs = self.dispatch_kegs(beer, num_kegs, price)
+        if kegs:
+            yield self.process(self.return_kegs(kegs, self.now + return_time))
+
+    def return_kegs(self, kegs, due):
+        """ Put shipped kegs back in the cellar, cleaned, when they come back at ``due``. """
+        shipment = {'kegs': kegs, 'due': due}
+        self.shipments.append(shipment)
+        yield self.wait(max(0.0, due - self.now))
+        self.shipments.remove(shipment)
+        for keg in kegs:
+            keg.empty()
+        yield self.cellar.put_kegs(kegs)
 
     def check_kegs(self):
         """ Ensure kegs are not expired """
@@ -155,81 +522,276 @@ class Brewery(SimpyMixin):
             if keg.expiration > self.now:
                 keg.empty()
 
-        for keg in self.tapped_kegs.items:
-            if keg.expiration > self.now:
-                yield self.tapped_kegs.get(filter=lambda x: x == keg)
-                yield keg.empty()
-                yield self.cellar.put(keg)
+        expired = [keg for keg in self.tapped_kegs.items if keg.expiration > self.now]
+        if expired:
+            yield self.tapped_kegs.get_kegs(expired)
+            for keg in expired:
+                keg.empty()
+            yield self.cellar.put_kegs(expired)
 
     def serve_customers(self):
         while True:
             try:
-                yield self.wait(expovariate(AVG_GROUP_ARRIVAL_TIME))
-                self.patrons.append(Patron(env=self.env, brewery=self))
+                yield self.wait(self.streams['arrivals'].expovariate(self.arrival_rate))
+                patron = Patron(brewery=self)
+                self.patrons[patron] = None
+                self.parties_arrived += 1
             except simpy.Interrupt:
-                self.log("Kicking out {} patrons".format(sum([patron.party_size for patron in self.patrons])))
-                for patron in self.patrons:
+                self.log(KICKING_OUT, sum([patron.party_size for patron in self.patrons]))
+                for patron in list(self.patrons):
                     try:
-                        patron.consuming.interrupt()
+                        patron.consuming.interrupt("the brewery is closing")
                     except:
                         pass
-                    del patron
-                self.patrons = []
+                return
 
-    def take_order(self, beers, pints):
-        revenue = 0
-        if hasattr(beers, '__iter__'):
-            if isinstance(pints, (int, float)):
-                for beer in beers:
-                    revenue += self.sell(beer, pints)
-            else:
-                for beer, pints_of_beer in zip(beers, pints):
-                    revenue += self.sell(beer, pints_of_beer)
+    def serve_cohorts(self, closing):
+        """
+        Serve the parties arriving before closing time one hourly :class:`Cohort` at a time.
+
+        :param closing: the time the bar closes
+        :type closing: float
+        """
+        backlog = None
+        try:
+            while self.now < closing:
+                hours = min(COHORT_INTERVAL, closing - self.now)
+                parties = self.streams['arrivals'].poisson(self.arrival_rate * hours)
+                cohort = Cohort(self.streams['patrons'], parties, hours, self._tables,
+                                closing=closing - self.now, backlog=backlog, table_for=self.table_for)
+                backlog = cohort.backlog
+                self.parties_arrived += cohort.parties
+                self.parties_turned_away += cohort.turned_away
+                self.log(COHORT_SERVED, cohort.seated, cohort.parties, cohort.pints)
+                if cohort.pints:
+                    revenue = yield self.process(self.pour_round(cohort.pints, cohort.drinkers))
+                    self.bank(revenue)
+                yield self.wait(hours)
+        except simpy.Interrupt:
+            pass
+
+    def replay_sales(self, closing):
+        """
+        Sell the pints of the sales file made before closing, each at its time.
+
+        Sales made while the bar was closed are poured when it opens, and sales of
+        beers outside the catalog are skipped. The file is read in chunks as it is
+        replayed, and :attr:`sales_read` keeps the place in it across days and checkpoints.
+
+        :param closing: the time the bar closes
+        :type closing: float
+        """
+        if self.trace is None:
+            self.trace = iter_sales(self.sales, skip=self.sales_read)
+            self.next_sale = next(self.trace, None)
+        try:
+            while self.next_sale is not None and self.next_sale[0] < closing:
+                time, beer, pints = self.next_sale
+                if time > self.now:
+                    yield self.wait(time - self.now)
+                if beer in self.beers:
+                    self.settle(beer, pints)
+                self.sales_read += 1
+                self.next_sale = next(self.trace, None)
+        except simpy.Interrupt:
+            pass
+
+    def resample_sales(self, day_of_the_week, closing):
+        """
+        Sell the hourly pints of a day of the sales file, drawn at random from the same day of the week.
+
+        Each hour's pints of every beer are poured as one order at the start of the hour.
+
+        :param day_of_the_week: the day of the week, Monday being 0
+        :param closing: the time the bar closes
+
+        :type day_of_the_week: int
+        :type closing: float
+        """
+        hourly = self.sales_profile.draw_day(self.streams['arrivals'], day_of_the_week)
+        beers = self.sales_profile.beers
+        try:
+            while self.now < closing:
+                pints = hourly[int(self.now % 24)]
+                sold = np.flatnonzero(pints)
+                if sold.size:
+                    self.settle([beers[idx] for idx in sold], pints[sold].tolist())
+                yield self.wait(min(closing, self.now // 1 + 1) - self.now)
+        except simpy.Interrupt:
+            pass
+
+    def pour_round(self, pints, drinkers=None):
+        """
+        Pour pints of beers picked at random from the taps.
+
+        Orders for kicked kegs wait for the kegs to be swapped and are then spread
+        again over the beers left on tap, so a round drains the taps as successive
+        orders from individual patrons would. Once the taps run dry the pints left
+        are stockouts, at most one per drinker, since a :class:`Patron` who cannot
+        get any beer gives up after one order.
+
+        :param pints: the number of pints ordered
+        :param drinkers: the number of customers the pints are for (defaults to one per pint)
+
+        :type pints: int
+        :type drinkers: int
+
+        :return: the revenue of the pints poured
+        :rtype: float
+        """
+        rng = self.streams['patrons']
+        revenue = 0.0
+        while pints:
+            if self.swaps:
+                yield self.env.all_of(list(self.swaps.values()))
+            beers_on_tap = self.tapped_kegs.beers
+            if not beers_on_tap:
+                self.stockouts += pints if drinkers is None else min(pints, drinkers)
+                break
+            beers = [beer for beer in beers_on_tap if self.tapped_kegs.inventory(beer)]
+            if not beers:
+                self.stockouts += pints if drinkers is None else min(pints, drinkers)
+                break
+
+            orders = np.bincount((rng.randoms(int(pints)) * len(beers)).astype(int), minlength=len(beers))
+            for beer, ordered in zip(beers, orders.tolist()):
+                poured = self.draw_pints(beer, ordered)
+                revenue += poured * self.prices[beer]
+                pints -= poured
+        return revenue
+
+    @property
+    def funds(self):
+        """ The money in the register plus the revenue waiting to be credited to it, less what is owed. """
+        return self.register.level + self.unbanked - self.payables
+
+    def pay(self, cost):
+        """
+        Pay a cost out of the register straight away, owing whatever the register cannot cover.
+
+        What is owed is paid off first out of the next revenue to reach the register, so
+        :attr:`funds` goes negative rather than a purchase waiting for money.
+
+        :param cost: the amount to pay
+        :type cost: float
+
+        :return: the part of the cost that is owed
+        :rtype: float
+        """
+        paid = min(cost, self.register.level)
+        if paid > 0:
+            self.register.get(paid)
+        self.payables += cost - paid
+        return cost - paid
+
+    def pay_off(self, revenue):
+        """ Pay off what is owed out of revenue and return the revenue left for the register. """
+        owed = min(revenue, self.payables)
+        self.payables -= owed
+        return revenue - owed
+
+    def ring_up(self, beers, pints):
+        """
+        Pour an order and return its revenue.
+
+        Pints of the same beer are poured together, one keg lookup per beer.
+
+        :param beers: the beer, or the beers, ordered
+        :param pints: the pints of each beer, or one number of pints for every beer
+
+        :rtype: float
+        """
+        if not hasattr(beers, '__iter__') or isinstance(beers, string_types):
+            return self.sell(beers, pints)
+
+        if isinstance(pints, (int, float)):
+            order = Counter(beers)
+            for beer in order:
+                order[beer] *= pints
         else:
-            revenue = self.sell(beers, pints)
+            order = Counter()
+            for beer, pints_of_beer in zip(beers, pints):
+                order[beer] += pints_of_beer
+        return sum(self.sell(beer, pints_of_beer) for beer, pints_of_beer in order.items())
 
-        yield self.register.put(revenue)
+    def take_order(self, beers, pints):
+        revenue = self.pay_off(self.ring_up(beers, pints))
+        if revenue:
+            yield self.register.put(revenue)
+
+    def settle(self, beers, pints):
+        """
+        Pour an order and bank its revenue, without any process or event of its own.
+
+        The revenue reaches the register with the next credit, at most ``CREDIT_INTERVAL`` hours later;
+        :attr:`funds` includes it straight away.
+
+        :param beers: the beer, or the beers, ordered
+        :param pints: the pints of each beer, or one number of pints for every beer
+
+        :rtype: float
+        """
+        revenue = self.ring_up(beers, pints)
+        self.bank(revenue)
+        return revenue
+
+    def bank(self, revenue):
+        """ Hold revenue for the next register credit, scheduling one if none is pending. """
+        if revenue:
+            self.unbanked += revenue
+            if self.banking is None:
+                self.banking = self.process(self.credit_register())
+
+    def credit_register(self):
+        yield self.wait(CREDIT_INTERVAL - self.now % CREDIT_INTERVAL)
+        revenue, self.unbanked = self.pay_off(self.unbanked), 0.0
+        self.banking = None
+        if revenue:
+            yield self.register.put(revenue)
 
     def find_keg(self, beer, location='bar', any_beer=False):
         if location == 'bar':
-            storage = self.tapped_kegs.items
+            return self.tapped_kegs.find(beer)
         elif location == 'cellar':
-            storage = self.cellar.items
-        kegs = sorted([keg for keg in storage if keg.name == beer], key=lambda x: x.amount)
-        if kegs:
-            return kegs[0]
-        return None
+            return self.cellar.find(beer)
 
     def swap_keg(self, keg):
-        old_keg = yield self.tapped_kegs.get(filter=lambda x: x == keg)
-        new_keg = find_keg(keg.name, location='cellar')
+        yield self.tapped_kegs.get_kegs([keg])
+        new_keg = self.find_keg(keg.name, location='cellar')
         if new_keg is None:
-            tapped_kegs = [item.name for item in self.tapped_kegs.items]
-            new_keg = yield self.cellar.get(filter=lambda x: x.name not in tapped_kegs)
-        if new_keg is None:
-            new_keg = yield self.cellar.get()
-        yield self.tapped_kegs.put(new_keg)
-        old_keg.name = None
-        yield self.cellar.put(old_keg)
-
-    def pour(self, beer, pints):
+            tapped_kegs = self.tapped_kegs.beers
+            candidate_kegs = [item for beer in self.cellar.beers if beer not in tapped_kegs
+                              for item in self.cellar.kegs(beer) if item.amount]
+            if candidate_kegs:
+                new_keg = candidate_kegs[0]
+        if new_keg is not None:
+            yield self.cellar.get_kegs([new_keg])
+            yield self.tapped_kegs.put_kegs([new_keg])
+        keg.empty()
+        yield self.cellar.put_kegs([keg])
+        self.swaps.pop(keg, None)
+
+    def draw_pints(self, beer, pints):
+        """ Draw up to the pints of a beer from its emptiest keg on tap, swapping the keg once kicked. """
         keg = self.find_keg(beer)
-
-        if keg.contents.level < pints:
-            poured = keg.contents.level
-        else:
-            poured = pints
+        poured = 0 if keg is None else min(keg.amount, pints)
 
         if poured:
-            keg.contents.get(poured)
-        else:
-            return poured
+            keg.draw(poured)
+            self.pints_sold += poured
+            self.pints_by_beer[beer] = self.pints_by_beer.get(beer, 0) + poured
+            self.pour_times.append(self.now)
+            self.pour_beers.append(self.recipes.beer_index[beer])
+            self.pour_pints.append(poured)
+            if not keg.amount:
+                self.swaps[keg] = self.process(self.swap_keg(keg))
+        return poured
 
+    def pour(self, beer, pints):
+        poured = self.draw_pints(beer, pints)
         if poured < pints:
-            self.swap_keg(keg)
-            poured += self.pour(beer, pints - poured)
-            if poured < pints:
-                self.log('Failed to sell {} pints of {}'.format(pints - poured, beer))
+            self.stockouts += pints - poured
+            self.log(SALE_FAILED, pints - poured, beer)
         return poured
 
     def sell(self, beer, pints):
@@ -239,101 +801,150 @@ class Brewery(SimpyMixin):
         return 0.0
 
     def inventory(self, beer):
-        return sum(keg.amount for keg in self.cellar.items if keg.name == beer) + \
-               sum(keg.amount for keg in self.tapped_kegs.items if keg.name == beer)
+        return self.cellar.inventory(beer) + self.tapped_kegs.inventory(beer)
+
+    def run_brewery(self, brewing=None):
+        """
+        Brew batch after batch, as long as there are clean kegs and ingredients.
+
+        :param brewing: a brew in progress restored from a checkpoint, with its ``beer``, ``kegs``, ``stage`` and ``remaining`` hours
+        :type brewing: dict
+        """
+        if brewing is not None:
+            yield self.process(self.brew_beer(self.beers[brewing['beer']], brewing['kegs'],
+                                              stage=brewing['stage'], remaining=brewing['remaining']))
+            yield self.cellar.put_kegs(self.kegs_ready)
+            self.kegs_ready = []
 
-    def run_brewery(self):
         while True:
-            kegs = []
-            while len(kegs) < self.batch_size:
-                with self.cellar.get(filter=lambda keg: keg.clean) as req:
-                    keg = yield req
-                    kegs.append(keg)
+            kegs = yield self.cellar.get_clean(self.batch_size)
 
             beer = self.select_beer_to_brew()
 
             if beer is None:
+                yield self.cellar.put_kegs(kegs)
                 yield self.wait(2)
                 continue
 
             yield self.process(self.brew_beer(self.beers[beer], kegs))
 
-            for keg in self.kegs_ready:
-                yield self.cellar.put(keg)
+            yield self.cellar.put_kegs(self.kegs_ready)
             self.kegs_ready = []
 
+    def inventories(self):
+        """ Return the pints of every beer held in the cellar and on tap, in recipe matrix order. """
+        return np.array([self.inventory(beer) for beer in self.recipes.names], dtype=float)
+
     def select_beer_to_brew(self):
-        candidates = [beer for beer, recipe in self.beers.items() if all(self.dry_storage[ingredient].level >= recipe['ingredients'][ingredient] * self.batch_size for ingredient in recipe['ingredients'])]
-        if candidates:
-            return sorted(candidates, key=lambda beer: self.inventory(beer))[0]
-        else:
+        feasible = self.dry_storage.feasible(self.batch_size)
+        if not feasible.any():
             return None
+        scores = np.where(feasible, self.brew_policy(self), np.inf)
+        return self.recipes.names[int(np.argmin(scores))]
+
+    def hold(self, stage, duration):
+        """ Return a timeout for a stage of the brew in progress, recording when the stage ends. """
+        self.brewing['stage'] = stage
+        self.brewing['ends'] = self.now + duration
+        return self.wait(duration)
 
-    def brew_beer(self, beer, kegs):
+    def brew_beer(self, beer, kegs, stage=MASH_STAGE, remaining=None):
         """
         Simulates the brewing process for a beer and fills the kegs given.
 
+        A new brew draws its ingredients and starts by mashing. A brew restored from
+        a checkpoint resumes at ``stage`` with ``remaining`` hours left in it, holding
+        the vessel of that stage.
+
         :param beer: the beer to brew
         :param kegs: the list of kegs to fill once the beer is brewed
+        :param stage: the stage to resume at, one of :data:`STAGES`
+        :param remaining: the hours left in that stage
 
         :type beer: dict
         :type kegs: list
+        :type stage: str
+        :type remaining: float
         """
         if isinstance(beer, string_types):
             beer = self.beers[beer]
 
         quantity = len(kegs)
-        ingredients = {}
-        for ingredient in beer['ingredients']:
-            ingredients[ingredient] = self.dry_storage[ingredient].get(beer['ingredients'][ingredient] * quantity)
+        resuming = remaining is not None
+        if not resuming:
+            for ingredient in self.dry_storage.draw(beer['name'], quantity):
+                self.reorder(ingredient)
+        self.brewing = {'beer': beer['name'], 'kegs': kegs, 'stage': stage, 'ends': self.now}
 
         try:
-            self.log("Waiting for Mash Tun for {}".format(beer['name']))
-            mash_tun = self.mash_tuns.request()
-            request = yield mash_tun | self.wait(MAX_START_WAIT)
-            if mash_tun in request:
-                yield self.wait(beer['mash_time'])
-            else:
-                raise Interrupt("brewer could not get Mash Tun")
-
-            fermenter = self.fermenters.request()
-            request = yield fermenter | self.wait(MAX_MASH_WAIT)
-            if fermenter in request.events:
-                self.mash_tuns.release(mash_tun)
-                self.log("Released Mash Tun for beer " + beer['name'])
-                self.log("Starting fermentation for beer " + beer['name'])
-                yield self.wait(beer['fermentation_time'])
-                self.log("Finished fermentation for beer " + beer['name'])
-            else:
-                self.mash_tuns.release(mash_tun)
-                self.log("Failed batch of {} ({} kegs) because of timeout for fermenter".format(beer['name'], quantity))
-                self.kegs_ready = kegs
-
-            self.log("Starting conditioning for beer " + beer['name'])
-            conditioner = self.conditioners.request()
-            start_conditioning = self.now
-            conditioning_time = uniform(*beer['conditioning_time'])
-            request = yield conditioner | self.wait(conditioning_time)
-            if conditioner in request.events:
-                self.fermenters.release(fermenter)
-                self.log("Finished conditioning for beer " + beer['name'])
-                self.wait(conditioning_time - (self.now - start_conditioning))
-            else:
-                self.fermenters.release(fermenter)
-                self.conditioners.release(conditioner)
+            if stage == MASH_STAGE:
+                self.log(WAITING_FOR_MASH_TUN, beer['name'])
+                mash_tun = self.mash_tuns.request()
+                if resuming:
+                    yield mash_tun
+                else:
+                    request = yield mash_tun | self.wait(MAX_START_WAIT)
+                    if mash_tun not in request:
+                        mash_tun.cancel()
+                        self.kegs_ready = kegs
+                        raise Interrupt("brewer could not get Mash Tun")
+                    remaining = self.duration(beer['mash_time'], rng=self.streams['brewing'])
+                yield self.hold(MASH_STAGE, remaining)
+                stage, resuming = FERMENT_STAGE, False
+
+            if stage == FERMENT_STAGE:
+                fermenter = self.fermenters.request()
+                if resuming:
+                    yield fermenter
+                else:
+                    request = yield fermenter | self.wait(MAX_MASH_WAIT)
+                    if fermenter not in request.events:
+                        fermenter.cancel()
+                        self.mash_tuns.release(mash_tun)
+                        self.log(BATCH_FAILED, beer['name'], quantity)
+                        self.kegs_ready = kegs
+                        return
+                    self.mash_tuns.release(mash_tun)
+                    self.log(RELEASED_MASH_TUN, beer['name'])
+                    remaining = self.duration(beer['fermentation_time'], rng=self.streams['brewing'])
+                self.log(FERMENTING, beer['name'])
+                yield self.hold(FERMENT_STAGE, remaining)
+                self.log(FERMENTED, beer['name'])
+                stage, resuming = CONDITION_STAGE, False
+
+            if stage == CONDITION_STAGE:
+                conditioner = self.conditioners.request()
+                if resuming:
+                    yield conditioner
+                else:
+                    self.log(CONDITIONING, beer['name'])
+                    start_conditioning = self.now
+                    conditioning_time = self.duration(beer['conditioning_time'], rng=self.streams['brewing'])
+                    self.brewing.update(stage=CONDITION_STAGE, ends=start_conditioning + conditioning_time)
+                    request = yield conditioner | self.wait(conditioning_time)
+                    self.fermenters.release(fermenter)
+                    if conditioner not in request.events:
+                        conditioner.cancel()
+                        conditioner = None
+                    remaining = conditioning_time - (self.now - start_conditioning)
+                if conditioner is not None:
+                    yield self.hold(CONDITION_STAGE, remaining)
+                    self.conditioners.release(conditioner)
+                    self.log(CONDITIONED, beer['name'])
+                stage, resuming = KEG_STAGE, False
 
             # TODO: find formula for number of kegs made
             num_kegs = self.batch_size
-            yield self.wait(TIME_TO_KEG * num_kegs)
-
-            amount_brewed = 124 * num_kegs
+            yield self.hold(KEG_STAGE, remaining if resuming else TIME_TO_KEG * num_kegs)
 
             for keg in kegs[:num_kegs]:
                 keg.fill(beer['name'])
 
             self.kegs_ready = kegs
         except Interrupt as interruption:
-            self.log('Failed to brew {} because of {}'.format(beer['name'], interruption))
+            self.log(BREW_FAILED, beer['name'], str(interruption))
+        finally:
+            self.brewing = None
 
 '''
 2.      Availability of hops.  This is handled by contract and we have a reasonably good hanld on this at the moment.  However, we'd certainly like to be able to use whatever is developed to project hops for future contracts.
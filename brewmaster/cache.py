@@ -0,0 +1,279 @@
+"""
+Keep the results of finished runs on disk and return them instead of running again.
+
+A result is keyed on everything that decides it: the parsed contents of the beers, price
+and sales files, every :class:`Brewery` argument, the constants of the model modules, the
+run horizon, the seed and the package version. Changing any of them misses the cache;
+renaming or touching a file with the same contents does not::
+
+    cache = ResultCache('.brewmaster-cache')
+    result = cache.run(365 * 24, random_seed=1, num_fermenters=2, monitoring=True)
+    result['kpis'], result['time_series']['cellar']
+
+Results are pickled one file per key. Files are written to a temporary name and renamed
+into place, so any number of processes can share a directory, and the least recently
+used files are deleted once the directory grows past ``max_bytes``.
+
+"""
+from __future__ import division, print_function
+from collections.abc import Mapping
+from functools import partial
+from hashlib import sha256
+from inspect import signature
+from json import dumps
+from multiprocessing import Pool, cpu_count
+import os
+import pickle
+from tempfile import mkstemp
+import numpy as np
+from simpy import Environment
+from six import string_types
+from . import __version__, brewery, cohort, demand, keg, patron, recipes, sampling
+from .brewery import Brewery
+from .replication import kpis
+from .util import load_beers, load_prices
+
+
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+MODEL_MODULES = [brewery, cohort, demand, keg, patron, recipes, sampling]
+EXTENSION = '.pkl'
+UNKEYED_ARGUMENTS = ['env', 'args', 'kwargs']
+
+
+def _canonical(value):
+    if value is None or isinstance(value, (bool, int, float) + string_types):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, Mapping):
+        return [[_canonical(key), _canonical(item)] for key, item in value.items()]
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if callable(value) and hasattr(value, '__qualname__'):
+        return '{}.{}'.format(value.__module__, value.__qualname__)
+    raise TypeError("Cannot key a result on {!r}".format(value))
+
+
+def _file_digest(filename):
+    digest = sha256()
+    with open(filename, 'rb') as source:
+        for block in iter(partial(source.read, 2 ** 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def model_constants():
+    """
+    Return the public constants of the model modules, keyed by module and name.
+
+    :rtype: dict
+    """
+    constants = {}
+    for module in MODEL_MODULES:
+        for name, value in vars(module).items():
+            if name.isupper() and not name.startswith('_'):
+                try:
+                    constants['{}.{}'.format(module.__name__, name)] = _canonical(value)
+                except TypeError:
+                    pass
+    return constants
+
+
+def result_key(until=365*24, random_seed=None, **config):
+    """
+    Return the key of the result of a run.
+
+    Mappings are keyed in their own order, since the order of beers and tables can change a run.
+
+    :param until: the simulated time (in hours) of the run
+    :param random_seed: the seed of the run, which must be given: runs without one cannot be repeated
+    :param config: keyword arguments of :class:`Brewery`
+
+    :type until: float
+    :type random_seed: int
+
+    :rtype: str
+    """
+    if random_seed is None:
+        raise ValueError("Only runs with a random_seed can be cached")
+    arguments = signature(Brewery).bind(random_seed=random_seed, **config)
+    arguments.apply_defaults()
+    arguments = dict(arguments.arguments)
+    arguments.update(arguments.pop('kwargs', {}))
+    for name in UNKEYED_ARGUMENTS:
+        arguments.pop(name, None)
+    arguments['beers_list'] = load_beers(arguments['beers_list'])
+    arguments['price_list'] = load_prices(arguments['price_list'])
+    if isinstance(arguments['sales'], string_types):
+        arguments['sales'] = _file_digest(arguments['sales'])
+
+    content = {'version': __version__,
+               'until': until,
+               'arguments': sorted([name, _canonical(value)] for name, value in arguments.items()),
+               'constants': sorted(model_constants().items())}
+    return sha256(dumps(content, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def simulate(until=365*24, random_seed=None, **config):
+    """
+    Run a brewery and return its KPIs, and its level series if it was built with ``monitoring=True``.
+
+    :rtype: dict
+    """
+    brewery = Brewery(env=Environment(), random_seed=random_seed, **config)
+    brewery.run(until)
+    return {'kpis': kpis(brewery),
+            'time_series': brewery.time_series() if brewery.monitoring else None}
+
+
+class ResultCache(object):
+    """
+    A directory of run results, keyed by :func:`result_key` and bounded in size.
+
+    :param directory: the directory of the cache, created if needed
+    :param max_bytes: the size the directory is kept under, by deleting the least recently used results
+
+    :type directory: str
+    :type max_bytes: int
+
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + EXTENSION)
+
+    def get(self, key):
+        """
+        Return the result stored under a key, or ``None``, and mark it as recently used.
+
+        :param key: the key returned by :func:`result_key`
+        :type key: str
+        """
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as stored:
+                result = pickle.load(stored)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            # Evicted by another process since it was read, which does not make it stale.
+            pass
+        return result
+
+    def put(self, key, result):
+        """
+        Store a result under a key, replacing any stored by another writer, and evict old results.
+
+        :param key: the key returned by :func:`result_key`
+        :param result: the result to store
+        :type key: str
+        """
+        handle, temporary = mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as stored:
+                pickle.dump(result, stored, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, self.path(key))
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        self.evict()
+
+    def evict(self):
+        """ Delete the least recently used results until the directory is under ``max_bytes``. """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(EXTENSION):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """ Delete every stored result. """
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(EXTENSION):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def run(self, until=365*24, random_seed=None, **config):
+        """
+        Return the stored result of a run, or run it with :func:`simulate` and store its result.
+
+        :param until: the simulated time (in hours) to run for
+        :param random_seed: the seed of the run
+        :param config: keyword arguments passed on to :class:`Brewery`
+
+        :type until: float
+        :type random_seed: int
+
+        :return: the ``kpis`` of the run and its ``time_series`` (``None`` unless ``monitoring=True``)
+        :rtype: dict
+        """
+        key = result_key(until, random_seed, **config)
+        result = self.get(key)
+        if result is not None:
+            self.hits += 1
+            return result
+        self.misses += 1
+        result = simulate(until, random_seed, **config)
+        self.put(key, result)
+        return result
+
+
+def _cached_run(random_seed, directory, max_bytes, until, config):
+    return ResultCache(directory, max_bytes).run(until, random_seed, **config)
+
+
+def run_cached(seeds, directory, until=365*24, processes=None, max_bytes=DEFAULT_MAX_BYTES, **config):
+    """
+    Return the result of a run for each seed, running those not in the cache in parallel.
+
+    :param seeds: the seeds of the runs
+    :param directory: the directory of the cache
+    :param until: the simulated time (in hours) to run for
+    :param processes: the number of worker processes, ``1`` runs serially in this process
+    :param max_bytes: the size the cache directory is kept under
+    :param config: keyword arguments passed on to :class:`Brewery`
+
+    :type seeds: list
+    :type directory: str
+    :type until: float
+    :type processes: int
+    :type max_bytes: int
+
+    :rtype: list
+    """
+    task = partial(_cached_run, directory=directory, max_bytes=max_bytes, until=until, config=config)
+    processes = cpu_count() if processes is None else processes
+    if processes <= 1:
+        return [task(seed) for seed in seeds]
+    pool = Pool(processes=processes)
+    try:
+        return pool.map(task, seeds, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,75 @@
+"""
+Warm a brewery up once and fork what-if variants from the warmed-up state.
+
+Warming up a brewery for a few months before comparing variants both saves
+simulating the same months again for every variant and starts every variant
+from the same cellar, brewing schedule and ingredient orders::
+
+    snapshot = warm_up(30 * 24, random_seed=1, num_stored_kegs=40, num_kegs_per_beer=10)
+    base = fork(snapshot)
+    pricier = fork(snapshot, price_list='pricier.csv')
+    bigger = fork(snapshot, num_fermenters=2)
+    festival = fork(snapshot)
+    festival.process(festival.ship_kegs('Bridal Veil Pale Ale', 2))
+    festival.run(365 * 24)
+    festival.kegs_shipped
+
+"""
+from __future__ import division, print_function
+from copy import deepcopy
+from simpy import Environment
+from .brewery import Brewery
+
+
+MAX_QUIET_WAIT = 7 * 24
+
+
+def warm_up(until, random_seed=None, **config):
+    """
+    Run a brewery until a time, then on to the next hour the bar is closed, and return a snapshot of it.
+
+    :param until: the time to warm the brewery up to
+    :param random_seed: the seed of the brewery
+    :param config: keyword arguments passed on to :class:`Brewery`
+
+    :type until: float
+    :type random_seed: int
+
+    :return: the ``config`` the brewery was built with and the ``state`` returned by :meth:`Brewery.checkpoint`
+    :rtype: dict
+
+    """
+    brewery = Brewery(env=Environment(), random_seed=random_seed, **config)
+    brewery.run(until)
+    for _ in range(MAX_QUIET_WAIT):
+        try:
+            state = brewery.checkpoint()
+            break
+        except ValueError:
+            brewery.run(brewery.now + 1)
+    else:
+        raise ValueError("The bar did not close within {} hours of {}".format(MAX_QUIET_WAIT, until))
+    return {'config': dict(config, random_seed=random_seed), 'state': state}
+
+
+def fork(snapshot, **changes):
+    """
+    Build a brewery that continues from a snapshot, with some of its configuration changed.
+
+    Changing ``random_seed`` draws fresh random streams instead of continuing those of the snapshot.
+    The snapshot is left untouched, so it can be forked any number of times.
+
+    :param snapshot: the snapshot returned by :func:`warm_up`
+    :param changes: keyword arguments of :class:`Brewery` to change, e.g. ``price_list`` or ``num_fermenters``
+
+    :type snapshot: dict
+
+    :rtype: :class:`Brewery`
+
+    """
+    state = deepcopy(snapshot['state'])
+    if 'random_seed' in changes:
+        state['streams'] = None
+    config = dict(snapshot['config'], **changes)
+    config.setdefault('env', Environment(initial_time=state['time']))
+    return Brewery(checkpoint=state, **config)
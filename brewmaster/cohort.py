@@ -0,0 +1,122 @@
+from __future__ import division, print_function
+from math import ceil, log1p
+from .patron import (AVG_GROUP_SIZE, AVG_GROUP_STAY, AVG_NUM_DRINKS, MAX_WAIT, TIME_TO_ORDER, TIME_TO_BE_SERVED,
+                     TIME_TO_REORDER, TIME_TO_PAY, table_size_for)
+
+
+COHORT_INTERVAL = 1.0
+MAX_SEATING_PASSES = 5
+
+
+class Cohort(object):
+    """
+    The parties that arrive at the bar over an interval, drawn in one batch.
+
+    Parties get the same size, stay, patience, drinks and timings as a
+    :class:`~brewmaster.patron.Patron` and arrive uniformly over the interval.
+    Each table size is treated as a fluid queue: a party waits until the table-hours
+    owed to the parties ahead of it have been worked off by the tables of its size
+    (tables sitting idle do not bank table-hours for later parties),
+    and is turned away if that takes longer than it is willing to wait. Parties turned
+    away free their share and waiting eats into the stay, so seating is settled in a
+    few passes. Seated parties drink one round every ``TIME_TO_BE_SERVED + TIME_TO_REORDER``
+    hours until they are past their departure time, the bar closes or nobody wants
+    another pint, and each customer drinks at most their own number of pints.
+
+    :param rng: the stream the parties are drawn from
+    :param parties: the number of parties that arrive
+    :param hours: the length of the interval
+    :param tables: the number of tables of each size
+    :param closing: the time from the start of the interval until the bar closes
+    :param backlog: the table-hours still owed to earlier parties, by table size
+    :param table_for: the table size asked for by each party size, filled in as sizes come up and shared between cohorts
+
+    :type rng: :class:`~brewmaster.sampling.Sampler`
+    :type parties: int
+    :type hours: float
+    :type tables: dict
+    :type closing: float
+    :type backlog: dict
+    :type table_for: dict
+
+    """
+
+    def __init__(self, rng, parties, hours, tables, closing=float('inf'), backlog=None, table_for=None):
+        backlog = {} if backlog is None else backlog
+        table_for = {} if table_for is None else table_for
+        self.parties = parties
+        self.seated = 0
+        self.turned_away = 0
+        self.pints = 0
+        self.drinkers = 0
+        self.backlog = {table_size: max(0.0, backlog.get(table_size, 0.0) - quantity * hours)
+                        for table_size, quantity in tables.items()}
+        if not parties:
+            return
+
+        # An hour holds a handful of parties, so the variates are drawn in three vector
+        # calls and the seating is worked out on plain lists: NumPy's per-call overhead
+        # would cost more than the arithmetic it saves.
+        uniforms = rng.randoms(6 * parties).tolist()
+        arrivals = sorted(hours * u for u in uniforms[:parties])
+        stays = [-log1p(-u) / AVG_GROUP_STAY for u in uniforms[parties:2 * parties]]
+        patience = [MAX_WAIT[0] + (MAX_WAIT[1] - MAX_WAIT[0]) * u for u in uniforms[2 * parties:3 * parties]]
+        first_order = [TIME_TO_ORDER[0] + (TIME_TO_ORDER[1] - TIME_TO_ORDER[0]) * u
+                       for u in uniforms[3 * parties:4 * parties]]
+        round_time = [TIME_TO_BE_SERVED + TIME_TO_REORDER[0] + (TIME_TO_REORDER[1] - TIME_TO_REORDER[0]) * u
+                      for u in uniforms[4 * parties:5 * parties]]
+        paying = [TIME_TO_PAY[0] + (TIME_TO_PAY[1] - TIME_TO_PAY[0]) * u for u in uniforms[5 * parties:]]
+        sizes = (rng.poissons(AVG_GROUP_SIZE - 1, parties) + 1).tolist()
+        orders = rng.poissons(AVG_NUM_DRINKS, sum(sizes)).tolist()
+
+        party_orders = []
+        start = 0
+        for size in sizes:
+            party_orders.append(orders[start:start + size])
+            start += size
+        most_orders = [max(drinks) for drinks in party_orders]
+
+        def rounds_until(idx, wait):
+            last_call = min(stays[idx], closing - arrivals[idx]) - wait - first_order[idx]
+            return min(max(ceil(last_call / round_time[idx]), 0), most_orders[idx])
+
+        def visit(idx, wait):
+            return first_order[idx] + rounds_until(idx, wait) * round_time[idx] + paying[idx]
+
+        groups = {}
+        for idx, size in enumerate(sizes):
+            table_size = table_for.get(size)
+            if table_size is None:
+                table_size = table_for[size] = table_size_for(tables, size)
+            groups.setdefault(table_size, []).append(idx)
+
+        waits = [0.0] * parties
+        seated = [True] * parties
+        for _ in range(MAX_SEATING_PASSES):
+            visits = [visit(idx, wait) for idx, wait in enumerate(waits)]
+            for table_size, members in groups.items():
+                quantity = tables[table_size]
+                owed_ahead = backlog.get(table_size, 0.0)
+                lowest = 0.0
+                for idx in members:
+                    owed = owed_ahead / quantity - arrivals[idx] if quantity else float('inf')
+                    lowest = min(lowest, owed)
+                    waits[idx] = max(owed - lowest, 0.0)
+                    if seated[idx]:
+                        owed_ahead += visits[idx]
+            previous, seated = seated, [wait <= most for wait, most in zip(waits, patience)]
+            if seated == previous:
+                break
+
+        for table_size, quantity in tables.items():
+            owed = backlog.get(table_size, 0.0) + sum(visit(idx, waits[idx]) for idx in groups.get(table_size, ())
+                                                      if seated[idx])
+            self.backlog[table_size] = max(0.0, owed - quantity * hours)
+        self.seated = sum(seated)
+        self.turned_away = parties - self.seated
+        for idx, drinks in enumerate(party_orders):
+            if seated[idx]:
+                rounds = rounds_until(idx, waits[idx])
+                drunk = [min(drink, rounds) for drink in drinks]
+                self.pints += sum(drunk)
+                self.drinkers += sum(1 for pints in drunk if pints)
@@ -0,0 +1,122 @@
+from __future__ import division, print_function
+from csv import DictReader
+from datetime import datetime, timedelta
+from itertools import islice
+from six import string_types
+import numpy as np
+from .util import to_number
+
+
+SALES_CHUNK_SIZE = 10000
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def read_sales(filename, chunk_size=SALES_CHUNK_SIZE, timestamp_format=TIMESTAMP_FORMAT):
+    """
+    Read a CSV file of pint sales in chunks, so files of any length can be replayed in constant memory.
+
+    The file has a ``time``, a ``beer`` and a ``pints`` column and is sorted by time.
+    Times are either hours since midnight on the Monday the sales start or timestamps,
+    which are converted to hours since midnight on the Monday of the week of the first
+    sale, so days of the week and hours line up with the opening hours of the bar.
+
+    :param filename: the CSV file of sales
+    :param chunk_size: the number of sales per chunk
+    :param timestamp_format: the :func:`~datetime.datetime.strptime` format of timestamps
+
+    :type filename: str
+    :type chunk_size: int
+    :type timestamp_format: str
+
+    :return: lists of ``(time, beer, pints)`` sales
+    :rtype: generator
+
+    """
+    with open(filename) as csvfile:
+        rows = DictReader(csvfile)
+        start = None
+        while True:
+            chunk = []
+            for row in islice(rows, chunk_size):
+                time = to_number(row['time'])
+                if isinstance(time, string_types):
+                    time = datetime.strptime(time, timestamp_format)
+                    if start is None:
+                        start = datetime(time.year, time.month, time.day) - timedelta(days=time.weekday())
+                    time = (time - start).total_seconds() / 3600
+                chunk.append((time, row['beer'], to_number(row['pints'])))
+            if not chunk:
+                return
+            yield chunk
+
+
+def iter_sales(filename, skip=0, **kwargs):
+    """
+    Yield the sales of a CSV file one ``(time, beer, pints)`` at a time, read in chunks by :func:`read_sales`.
+
+    :param filename: the CSV file of sales
+    :param skip: the number of sales to skip, e.g. those already replayed before a checkpoint
+    :param kwargs: keyword arguments passed on to :func:`read_sales`
+
+    :type filename: str
+    :type skip: int
+
+    :rtype: generator
+
+    """
+    rows = (sale for chunk in read_sales(filename, **kwargs) for sale in chunk)
+    return islice(rows, skip, None)
+
+
+class SalesProfile(object):
+    """
+    The pints of each beer sold in each hour of each day of a sales file, for resampling whole days.
+
+    The file is read once, chunk by chunk, and only the hourly totals are kept, so the
+    profile takes days x 24 x beers numbers however many sales the file holds. Sales of
+    beers outside ``beers`` are left out.
+
+    :param filename: the CSV file of sales
+    :param beers: the names of the beers to keep
+    :param kwargs: keyword arguments passed on to :func:`read_sales`
+
+    :type filename: str
+    :type beers: list
+
+    """
+
+    def __init__(self, filename, beers, **kwargs):
+        self.beers = list(beers)
+        beer_index = {beer: idx for idx, beer in enumerate(self.beers)}
+        days = {}
+        for chunk in read_sales(filename, **kwargs):
+            for time, beer, pints in chunk:
+                if beer in beer_index:
+                    day = int(time // 24)
+                    if day not in days:
+                        days[day] = np.zeros((24, len(self.beers)))
+                    days[day][int(time % 24), beer_index[beer]] += pints
+        self.days = sorted(days)
+        self.pints = np.array([days[day] for day in self.days]).reshape(len(self.days), 24, len(self.beers))
+        self.weekdays = {weekday: [idx for idx, day in enumerate(self.days) if day % 7 == weekday]
+                         for weekday in range(7)}
+
+    def __len__(self):
+        return len(self.days)
+
+    def draw_day(self, rng, weekday):
+        """
+        Return the hourly sales of a day drawn at random, from the same day of the week if there is one.
+
+        :param rng: the stream to draw the day from
+        :param weekday: the day of the week, Monday being 0
+
+        :type rng: :class:`~brewmaster.sampling.Sampler`
+        :type weekday: int
+
+        :return: the pints of each beer sold in each hour of the day
+        :rtype: :class:`numpy.ndarray`
+
+        """
+        candidates = self.weekdays[weekday] or range(len(self.days))
+        return self.pints[rng.choice(candidates)]
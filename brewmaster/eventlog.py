@@ -0,0 +1,155 @@
+from __future__ import division, print_function
+from array import array
+from logging import DEBUG, INFO, WARNING
+import numpy as np
+
+
+TIMESTAMP = '[{:10.1f}]'
+NUM_FIELDS = 4
+FIELDS = ['time', 'code', 'a', 'b', 'c', 'd']
+
+LEVELS = []
+TEMPLATES = []
+NAME_FIELDS = []
+
+
+def register_event(level, template, names=()):
+    """
+    Register a kind of event and return its code.
+
+    :param level: the severity of the event (``logging.DEBUG``, ``INFO`` or ``WARNING``)
+    :param template: the text of the event, formatted with its numeric fields as positional arguments
+    :param names: the positions of the fields that hold names rather than numbers
+
+    :type level: int
+    :type template: str
+    :type names: tuple
+
+    :rtype: int
+
+    """
+    LEVELS.append(level)
+    TEMPLATES.append(template)
+    NAME_FIELDS.append(tuple(names))
+    return len(TEMPLATES) - 1
+
+
+class EventLog(object):
+    """
+    A structured log of simulation events.
+
+    Each event is stored as its time, a code from :func:`register_event` and up to
+    four numeric fields in typed arrays; names are interned and stored as their index.
+    Events below ``level`` are dropped before anything is stored, and text is only
+    rendered when asked for.
+
+    :param level: the lowest severity that is recorded
+    :param capacity: the number of most recent events to keep, ``None`` keeps all of them
+
+    :type level: int
+    :type capacity: int
+
+    """
+
+    def __init__(self, level=INFO, capacity=None):
+        self.level = level
+        self.capacity = capacity
+        self.names = []
+        self._name_ids = {}
+        self.clear()
+
+    def clear(self):
+        """ Discard all recorded events. """
+        size = 0 if self.capacity is None else self.capacity
+        self._times = array('d', [0.0]) * size
+        self._codes = array('H', [0]) * size
+        self._fields = [array('d', [0.0]) * size for _ in range(NUM_FIELDS)]
+        self.recorded = 0
+
+    def __len__(self):
+        if self.capacity is None:
+            return self.recorded
+        return min(self.recorded, self.capacity)
+
+    def enabled(self, code):
+        """ Return whether events of this kind are recorded at the current level. """
+        return LEVELS[code] >= self.level
+
+    def intern(self, name):
+        """ Return the index of a name in :attr:`names`, adding it if needed. """
+        try:
+            return self._name_ids[name]
+        except KeyError:
+            self._name_ids[name] = len(self.names)
+            self.names.append(name)
+            return self._name_ids[name]
+
+    def record(self, time, code, a=0.0, b=0.0, c=0.0, d=0.0):
+        """
+        Record an event if its severity is at or above the log level.
+
+        :param time: the simulation time of the event
+        :param code: the kind of event
+        :param a: the first field
+        :param b: the second field
+        :param c: the third field
+        :param d: the fourth field
+
+        """
+        if LEVELS[code] < self.level:
+            return
+        values = [a, b, c, d]
+        for idx in NAME_FIELDS[code]:
+            values[idx] = self.intern(values[idx])
+
+        if self.capacity is None:
+            self._times.append(time)
+            self._codes.append(code)
+            for column, value in zip(self._fields, values):
+                column.append(value)
+        elif self.capacity:
+            idx = self.recorded % self.capacity
+            self._times[idx] = time
+            self._codes[idx] = code
+            for column, value in zip(self._fields, values):
+                column[idx] = value
+        self.recorded += 1
+
+    def arrays(self):
+        """
+        Return the recorded events as NumPy arrays in chronological order.
+
+        :rtype: dict
+
+        """
+        columns = [self._times, self._codes] + self._fields
+        arrays = {name: np.array(column, dtype=column.typecode) for name, column in zip(FIELDS, columns)}
+        if self.capacity and self.recorded > self.capacity:
+            start = self.recorded % self.capacity
+            arrays = {name: np.roll(values, -start) for name, values in arrays.items()}
+        elif self.capacity:
+            arrays = {name: values[:self.recorded] for name, values in arrays.items()}
+        return arrays
+
+    def __iter__(self):
+        arrays = self.arrays()
+        for idx in range(len(self)):
+            code = int(arrays['code'][idx])
+            fields = [float(arrays[name][idx]) for name in FIELDS[2:]]
+            for field in NAME_FIELDS[code]:
+                fields[field] = self.names[int(fields[field])]
+            yield float(arrays['time'][idx]), code, fields
+
+    def render(self, level=None):
+        """
+        Return the recorded events as timestamped lines of text.
+
+        :param level: the lowest severity to render (defaults to all recorded events)
+        :type level: int
+
+        :rtype: list
+
+        """
+        level = self.level if level is None else level
+        return [TIMESTAMP.format(time) + ' - ' + TEMPLATES[code].format(*fields)
+                for time, code, fields in self if LEVELS[code] >= level]
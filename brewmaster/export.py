@@ -0,0 +1,359 @@
+"""
+Write the outputs of many runs to columnar files on disk and read them back memory-mapped.
+
+Every column is a one-dimensional ``.npy`` file that grows by one run at a time, so a sweep
+never holds more than one run in memory, and an analysis that memory-maps the files only
+reads the columns and runs it touches::
+
+    export_replications('sweep', replications=1000, num_fermenters=2, monitoring=True)
+    store = RunReader('sweep')
+    store.kpis['funds'].mean()
+    times, levels = store.series('cellar', 10)
+    store.sales(10)['pints'].sum()
+
+A store directory holds ``kpis/<kpi>.npy`` with one row per run, ``series/<name>/time.npy``
+and ``level.npy`` with the samples of every run one after the other, ``sales/time.npy``,
+``beer.npy`` and ``pints.npy`` with every pint poured, and a ``manifest.json`` with the
+number of runs, the beer names and where each run ends in the concatenated columns.
+The manifest is replaced after the columns are appended, and a writer opening a store cuts
+every column back to the manifest, so a run is either fully in the store or not at all,
+even after a crash. A store has one writer at a time.
+
+"""
+from __future__ import division, print_function
+from ast import literal_eval
+from copy import deepcopy
+from functools import partial
+from json import dump, load
+from multiprocessing import Pool, cpu_count
+import os
+import numpy as np
+from simpy import Environment
+from . import __version__
+from .brewery import Brewery
+from .replication import kpis
+
+
+MANIFEST = 'manifest.json'
+HEADER_SIZE = 128
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+
+
+def _write_header(stream, dtype, length):
+    # A fixed-size header, so the shape can be rewritten in place as the column grows.
+    header = repr({'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                   'fortran_order': False,
+                   'shape': (length,)})
+    header = header.ljust(HEADER_SIZE - len(NPY_MAGIC) - 3) + '\n'
+    stream.seek(0)
+    stream.write(NPY_MAGIC + np.uint16(len(header)).tobytes() + header.encode('latin1'))
+
+
+def _read_header(stream):
+    stream.seek(len(NPY_MAGIC))
+    header_size = int(np.frombuffer(stream.read(2), dtype=np.uint16)[0])
+    header = literal_eval(stream.read(header_size).decode('latin1'))
+    return np.dtype(header['descr']), header['shape'][0], len(NPY_MAGIC) + 2 + header_size
+
+
+def append_column(filename, values, dtype=np.float64):
+    """
+    Append values to a one-dimensional ``.npy`` file, creating it if needed.
+
+    :param filename: the ``.npy`` file
+    :param values: the values to append
+    :param dtype: the type of the column, used when the file is created
+
+    :type filename: str
+    :type values: :class:`numpy.ndarray`
+    :type dtype: :class:`numpy.dtype`
+
+    :return: the length of the column
+    :rtype: int
+    """
+    if not os.path.exists(filename):
+        directory = os.path.dirname(filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        with open(filename, 'wb') as stream:
+            _write_header(stream, dtype, 0)
+    with open(filename, 'r+b') as stream:
+        dtype, length, start = _read_header(stream)
+        stream.seek(start + length * dtype.itemsize)
+        values = np.ascontiguousarray(values, dtype=dtype)
+        stream.write(values.tobytes())
+        stream.truncate()
+        _write_header(stream, dtype, length + len(values))
+    return length + len(values)
+
+
+def truncate_column(filename, length):
+    """
+    Cut a ``.npy`` file written by :func:`append_column` back to a length, dropping anything written after it.
+
+    :param filename: the ``.npy`` file
+    :param length: the length to keep
+
+    :type filename: str
+    :type length: int
+    """
+    with open(filename, 'r+b') as stream:
+        dtype, current, start = _read_header(stream)
+        stream.truncate(start + min(length, current) * dtype.itemsize)
+        _write_header(stream, dtype, min(length, current))
+
+
+def run_outputs(brewery, **labels):
+    """
+    Return the KPIs, level series and pints poured of a finished run as plain arrays.
+
+    Level series are only there if the brewery was built with ``monitoring=True``.
+
+    :param brewery: the brewery that was run
+    :param labels: numbers to store with the KPIs, e.g. the ``seed`` of the run
+
+    :type brewery: :class:`Brewery`
+
+    :rtype: dict
+    """
+    result = dict(kpis(brewery), **labels)
+    series = {}
+    if brewery.monitoring:
+        series = {name: (levels.times.copy(), levels.levels.copy())
+                  for name, levels in brewery.time_series().items()}
+    pours = brewery.pours()
+    names = brewery.recipes.names
+    return {'kpis': result,
+            'series': series,
+            'sales': {'time': pours['time'],
+                      'beer': [names[idx] for idx in pours['beer']],
+                      'pints': pours['pints']}}
+
+
+class RunWriter(object):
+    """
+    Append the outputs of runs to a store directory.
+
+    :param directory: the store directory, created if needed; an existing store is appended to
+    :type directory: str
+
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        path = os.path.join(directory, MANIFEST)
+        if os.path.exists(path):
+            with open(path) as stream:
+                self.manifest = load(stream)
+        else:
+            if not os.path.isdir(directory):
+                os.makedirs(directory, exist_ok=True)
+            self.manifest = {'version': __version__, 'runs': 0, 'kpis': None, 'beers': [],
+                             'series': {}, 'sales': []}
+        self.recover()
+
+    def __len__(self):
+        return self.manifest['runs']
+
+    def path(self, *parts):
+        return os.path.join(self.directory, *parts) + '.npy'
+
+    def recover(self):
+        """
+        Cut every column back to the length the manifest records.
+
+        A writer that stopped part way through :meth:`append` leaves columns longer than
+        the manifest says, and a later run must not be appended after those leftovers.
+        """
+        manifest = self.manifest
+        lengths = {self.path('kpis', name): manifest['runs'] for name in manifest['kpis'] or []}
+        for name, ends in manifest['series'].items():
+            for column in ('time', 'level'):
+                lengths[self.path('series', name, column)] = ends[-1] if ends else 0
+        for column in ('time', 'beer', 'pints'):
+            lengths[self.path('sales', column)] = manifest['sales'][-1] if manifest['sales'] else 0
+        lengths = {os.path.normpath(path): length for path, length in lengths.items()}
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.npy'):
+                    path = os.path.normpath(os.path.join(root, name))
+                    truncate_column(path, lengths.get(path, 0))
+
+    def append(self, outputs):
+        """
+        Append the outputs of a run.
+
+        :param outputs: the outputs returned by :func:`run_outputs`
+        :type outputs: dict
+
+        :return: the index of the run in the store
+        :rtype: int
+        """
+        try:
+            return self._append(outputs)
+        except BaseException:
+            # Drop whatever was appended after the manifest, so the writer can go on.
+            self.recover()
+            raise
+
+    def _append(self, outputs):
+        manifest = deepcopy(self.manifest)
+        run = manifest['runs']
+        names = sorted(outputs['kpis'])
+        if manifest['kpis'] is None:
+            manifest['kpis'] = names
+        elif names != manifest['kpis']:
+            raise ValueError("The KPIs {} do not match those of the store {}".format(names, manifest['kpis']))
+        for name in names:
+            append_column(self.path('kpis', name), [outputs['kpis'][name]])
+
+        for name, (times, levels) in outputs['series'].items():
+            ends = manifest['series'].setdefault(name, [])
+            start = ends[-1] if ends else 0
+            ends.extend([start] * (run - len(ends)))
+            append_column(self.path('series', name, 'time'), times)
+            ends.append(append_column(self.path('series', name, 'level'), levels))
+
+        sales = outputs['sales']
+        beers = manifest['beers']
+        for beer in sales['beer']:
+            if beer not in beers:
+                beers.append(beer)
+        beer_ids = {beer: idx for idx, beer in enumerate(beers)}
+        append_column(self.path('sales', 'time'), sales['time'])
+        append_column(self.path('sales', 'beer'), [beer_ids[beer] for beer in sales['beer']], dtype=np.int32)
+        manifest['sales'].append(append_column(self.path('sales', 'pints'), sales['pints']))
+
+        manifest['runs'] = run + 1
+        temporary = os.path.join(self.directory, MANIFEST + '.tmp')
+        with open(temporary, 'w') as stream:
+            dump(manifest, stream)
+        os.replace(temporary, os.path.join(self.directory, MANIFEST))
+        self.manifest = manifest
+        return run
+
+
+class RunReader(object):
+    """
+    Read a store directory written by :class:`RunWriter`, memory-mapping its columns.
+
+    Columns are only mapped when first used, and only the pages of the runs read are loaded.
+
+    :param directory: the store directory
+    :type directory: str
+
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST)) as stream:
+            self.manifest = load(stream)
+        self.beers = self.manifest['beers']
+        self._columns = {}
+
+    def __len__(self):
+        return self.manifest['runs']
+
+    def column(self, *parts):
+        """
+        Return a whole column, memory-mapped read-only, e.g. ``column('series', 'cellar', 'level')``.
+
+        :rtype: :class:`numpy.ndarray`
+        """
+        if parts not in self._columns:
+            path = os.path.join(self.directory, *parts) + '.npy'
+            try:
+                self._columns[parts] = np.load(path, mmap_mode='r')
+            except ValueError:
+                # Empty columns cannot be memory-mapped.
+                self._columns[parts] = np.load(path)
+        return self._columns[parts]
+
+    @property
+    def kpis(self):
+        """ The KPIs of every run, keyed by name, one row per run. """
+        return {name: self.column('kpis', name)[:len(self)] for name in self.manifest['kpis'] or []}
+
+    @property
+    def series_names(self):
+        return sorted(self.manifest['series'])
+
+    def _bounds(self, ends, run):
+        if not -len(self) <= run < len(self):
+            raise IndexError("There are {} runs in the store".format(len(self)))
+        run %= len(self)
+        if run >= len(ends):
+            end = ends[-1] if ends else 0
+            return end, end
+        return (ends[run - 1] if run else 0), ends[run]
+
+    def series(self, name, run):
+        """
+        Return the times and levels of a level series of a run.
+
+        :param name: the name of the series, e.g. ``'cellar'`` or ``'dry_storage/malt'``
+        :param run: the index of the run
+
+        :type name: str
+        :type run: int
+
+        :rtype: tuple
+        """
+        start, end = self._bounds(self.manifest['series'][name], run)
+        return self.column('series', name, 'time')[start:end], self.column('series', name, 'level')[start:end]
+
+    def sales(self, run):
+        """
+        Return the ``time``, ``beer`` (an index into :attr:`beers`) and ``pints`` of every pour of a run.
+
+        :param run: the index of the run
+        :type run: int
+
+        :rtype: dict
+        """
+        start, end = self._bounds(self.manifest['sales'], run)
+        return {name: self.column('sales', name)[start:end] for name in ('time', 'beer', 'pints')}
+
+
+def _export_replication(random_seed, until, config):
+    brewery = Brewery(env=Environment(), random_seed=random_seed, **config)
+    brewery.run(until)
+    return run_outputs(brewery, seed=random_seed)
+
+
+def export_replications(directory, replications=10, until=365*24, seeds=None, processes=None, **config):
+    """
+    Run seeded replications in parallel and append each one's outputs to a store as it finishes.
+
+    :param directory: the store directory
+    :param replications: the number of replications
+    :param until: the simulated time (in hours) each replication runs for
+    :param seeds: the seeds of the replications (defaults to ``range(replications)``)
+    :param processes: the number of worker processes, ``1`` runs serially in this process
+    :param config: keyword arguments passed on to :class:`Brewery`, e.g. ``monitoring=True`` to export level series
+
+    :type directory: str
+    :type replications: int
+    :type until: float
+    :type seeds: list
+    :type processes: int
+
+    :return: the writer of the store
+    :rtype: :class:`RunWriter`
+    """
+    seeds = list(range(replications)) if seeds is None else list(seeds)
+    writer = RunWriter(directory)
+    task = partial(_export_replication, until=until, config=config)
+    processes = cpu_count() if processes is None else processes
+    if processes <= 1:
+        for seed in seeds:
+            writer.append(task(seed))
+        return writer
+    pool = Pool(processes=processes)
+    try:
+        for outputs in pool.imap(task, seeds):
+            writer.append(outputs)
+    finally:
+        pool.close()
+        pool.join()
+    return writer
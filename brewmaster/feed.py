@@ -0,0 +1,254 @@
+"""
+Follow running simulations live, one KPI record per simulated day, from asyncio code.
+
+Each run is simulated in a worker thread (or a worker process, for runs that should use
+more than one CPU) and its daily records are delivered through a bounded queue: a
+consumer that falls behind holds the simulations back instead of letting records pile up
+in memory. Any number of runs are merged into one async iterator of ``(name, record)``::
+
+    async def dashboard():
+        runs = {seed: {'random_seed': seed, 'num_fermenters': 2} for seed in range(24)}
+        async for name, record in stream_kpis(runs, until=365 * 24, processes=4):
+            print(name, record['day'], record['revenue'], record['vessel_occupancy'])
+
+    asyncio.run(dashboard())
+
+"""
+from __future__ import division, print_function
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from functools import partial
+from multiprocessing import Manager, Pool, cpu_count
+from queue import Empty
+from threading import Event, Thread
+from simpy import Environment
+from .brewery import Brewery
+
+
+DAY = 24
+SAMPLE_INTERVAL = 0.25
+FEED_BUFFER = 64
+POLL_INTERVAL = 0.1
+VESSELS = ['mash_tuns', 'cooper_tanks', 'fermenters', 'conditioners']
+
+
+class _Stopped(Exception):
+    pass
+
+
+class DailyReport(object):
+    """
+    Sample the tables and brewing vessels of a brewery through the day and sum up each day as a record.
+
+    Occupancy is the share of units in use, averaged over samples taken every
+    ``sample_interval`` hours.
+
+    :param brewery: the brewery to report on
+    :param sample_interval: the hours between samples of the tables and vessels
+
+    :type brewery: :class:`Brewery`
+    :type sample_interval: float
+
+    """
+
+    def __init__(self, brewery, sample_interval=SAMPLE_INTERVAL):
+        self.brewery = brewery
+        self.sample_interval = sample_interval
+        self.day = 0
+        self.pints_by_beer = dict(brewery.pints_by_beer)
+        self.stockouts = brewery.stockouts
+        self.funds = brewery.funds
+        self._reset()
+        brewery.process(self.sample())
+
+    def _reset(self):
+        self.samples = 0
+        self.tables = dict.fromkeys(self.brewery.tables, 0.0)
+        self.vessels = dict.fromkeys(VESSELS, 0.0)
+
+    def sample(self):
+        brewery = self.brewery
+        while True:
+            for size, tables in brewery.tables.items():
+                self.tables[size] += tables.count / tables.capacity if tables.capacity else 0.0
+            for name in VESSELS:
+                vessels = getattr(brewery, name)
+                self.vessels[name] += vessels.count / vessels.capacity
+            self.samples += 1
+            yield brewery.wait(self.sample_interval)
+
+    def report(self):
+        """
+        Return the record of the day since the last report and start a new day.
+
+        :return: the ``day`` and ``time``, the ``revenue`` of the pints poured, the ``pints`` of each beer,
+                 the ``stockouts``, the ``funds``, the ``kegs`` in the ``cellar`` and on ``tap``, the
+                 pints of each beer in ``inventory``, the ``table_utilization`` of each table size and the
+                 ``vessel_occupancy`` of each kind of brewing vessel
+        :rtype: dict
+        """
+        brewery = self.brewery
+        pints = {beer: poured - self.pints_by_beer.get(beer, 0) for beer, poured in brewery.pints_by_beer.items()}
+        samples = max(1, self.samples)
+        record = {'day': self.day,
+                  'time': brewery.now,
+                  'revenue': sum(poured * brewery.prices[beer] for beer, poured in pints.items()),
+                  'pints': pints,
+                  'stockouts': brewery.stockouts - self.stockouts,
+                  'funds': brewery.funds,
+                  'funds_change': brewery.funds - self.funds,
+                  'kegs': {'cellar': len(brewery.cellar.items), 'tap': len(brewery.tapped_kegs.items)},
+                  'inventory': {beer: brewery.inventory(beer) for beer in brewery.beers},
+                  'table_utilization': {size: busy / samples for size, busy in self.tables.items()},
+                  'vessel_occupancy': {name: busy / samples for name, busy in self.vessels.items()}}
+        self.day += 1
+        self.pints_by_beer = dict(brewery.pints_by_beer)
+        self.stockouts = brewery.stockouts
+        self.funds = brewery.funds
+        self._reset()
+        return record
+
+
+def feed_run(name, until, config, emit, sample_interval=SAMPLE_INTERVAL):
+    """
+    Run a brewery day by day and pass each day's record to ``emit`` as ``(name, record)``.
+
+    ``emit`` is called with ``(name, None)`` once the run is over, or ``(name, error)`` if it failed.
+    A slow ``emit`` slows the run down, which is how the feed applies backpressure.
+
+    :param name: the name of the run
+    :param until: the simulated time (in hours) to run for
+    :param config: keyword arguments passed on to :class:`Brewery`
+    :param emit: the function the records are passed to
+    :param sample_interval: the hours between samples of the tables and vessels
+
+    :type until: float
+    :type config: dict
+    :type sample_interval: float
+
+    """
+    try:
+        brewery = Brewery(env=Environment(), **config)
+        report = DailyReport(brewery, sample_interval)
+        while brewery.now < until:
+            brewery.run(min(until, brewery.now + DAY))
+            emit((name, report.report()))
+    except _Stopped:
+        return
+    except Exception as error:
+        emit((name, error))
+        return
+    emit((name, None))
+
+
+def _feed_process_run(run, until, sample_interval, queue):
+    name, config = run
+    feed_run(name, until, config, queue.put, sample_interval)
+
+
+def _get_blocking(queue, stopped):
+    while not stopped.is_set():
+        try:
+            return queue.get(timeout=POLL_INTERVAL)
+        except Empty:
+            pass
+    raise _Stopped()
+
+
+def _shutdown(executor, relay, pool, manager):
+    if executor is not None:
+        # Each worker stops at its next record, within a simulated day.
+        executor.shutdown(wait=True, cancel_futures=True)
+    if relay is not None:
+        relay.join()
+    if pool is not None:
+        pool.terminate()
+        pool.join()
+    if manager is not None:
+        manager.shutdown()
+
+
+async def stream_kpis(runs, until=365*24, processes=0, buffer=FEED_BUFFER, sample_interval=SAMPLE_INTERVAL):
+    """
+    Run simulations in the background and yield their daily KPI records as they come, merged into one stream.
+
+    Records of one run arrive in day order; records of different runs are interleaved as
+    they are produced. At most ``buffer`` records wait for the consumer, after which the
+    simulations block. Closing the iterator early stops the runs.
+
+    :param runs: the :class:`Brewery` keyword arguments of each run, keyed by the name of the run,
+                 or a list of them named by their index
+    :param until: the simulated time (in hours) every run runs for
+    :param processes: the number of worker processes (``None`` for one per CPU), ``0`` runs every run at once
+                      in worker threads of this process
+    :param buffer: the most records waiting for the consumer
+    :param sample_interval: the hours between samples of the tables and vessels
+
+    :type runs: dict
+    :type until: float
+    :type processes: int
+    :type buffer: int
+    :type sample_interval: float
+
+    :return: ``(name, record)`` pairs, with the records returned by :meth:`DailyReport.report`
+    :rtype: async iterator
+    """
+    runs = dict(enumerate(runs)) if isinstance(runs, (list, tuple)) else dict(runs)
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=buffer)
+    stopped = Event()
+
+    def forward(item):
+        if stopped.is_set():
+            raise _Stopped()
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while True:
+            try:
+                return future.result(timeout=POLL_INTERVAL)
+            except TimeoutError:
+                if stopped.is_set():
+                    future.cancel()
+                    raise _Stopped()
+
+    executor = pool = manager = relay = None
+    if processes != 0:
+        processes = cpu_count() if processes is None else processes
+        manager = Manager()
+        shared = manager.Queue(maxsize=buffer)
+        pool = Pool(processes=min(processes, len(runs)) or 1)
+        pool.map_async(partial(_feed_process_run, until=until, sample_interval=sample_interval, queue=shared),
+                       list(runs.items()), chunksize=1)
+
+        def pump():
+            finished = 0
+            try:
+                while finished < len(runs):
+                    item = _get_blocking(shared, stopped)
+                    forward(item)
+                    if item[1] is None or isinstance(item[1], BaseException):
+                        finished += 1
+            except _Stopped:
+                pass
+
+        relay = Thread(target=pump, daemon=True)
+        relay.start()
+    else:
+        executor = ThreadPoolExecutor(max_workers=max(1, len(runs)))
+        for name, config in runs.items():
+            executor.submit(feed_run, name, until, config, forward, sample_interval)
+
+    try:
+        running = len(runs)
+        while running:
+            name, record = await queue.get()
+            if record is None:
+                running -= 1
+            elif isinstance(record, BaseException):
+                raise record
+            else:
+                yield name, record
+    finally:
+        stopped.set()
+        # Joining the workers blocks, so it runs in a thread while the event loop goes on.
+        await asyncio.shield(loop.run_in_executor(None, _shutdown, executor, relay, pool, manager))
+
@@ -0,0 +1,175 @@
+"""
+Choose what equipment to buy by simulated profit, with successive halving over the candidates.
+
+Every candidate configuration gets a few seeded replications, the clearly worse half is
+dropped, and the survivors get twice as many replications, until one is left or the
+replication budget is spent. All candidates share their seeds (common random numbers), so
+they are compared on the same demand and brewing luck::
+
+    best, ranking = optimize({'num_stored_kegs': [10, 20, 40], 'num_fermenters': [1, 2],
+                              'num_conditioners': [1, 2]})
+
+"""
+from __future__ import division, print_function
+from functools import partial
+from itertools import product
+from math import ceil, sqrt
+from multiprocessing import Pool, cpu_count
+from .replication import Z_95, run_replication
+
+
+UNIT_COSTS = {'num_mash_tuns': 8000.0,
+              'num_cooper_tanks': 3000.0,
+              'num_fermenters': 5000.0,
+              'num_conditioners': 4000.0,
+              'num_bar_kegs': 500.0,
+              'num_stored_kegs': 150.0}
+OWNED = {'num_mash_tuns': 1, 'num_cooper_tanks': 1, 'num_fermenters': 1, 'num_conditioners': 1,
+         'num_bar_kegs': 5, 'num_stored_kegs': 10}
+ELIMINATION_RATE = 2
+FIRST_REPLICATIONS = 4
+
+
+def candidates(space):
+    """
+    Return every combination of the equipment options.
+
+    :param space: the options of each :class:`Brewery` argument, e.g. ``{'num_fermenters': [1, 2, 3]}``
+    :type space: dict
+
+    :rtype: list
+    """
+    names = list(space)
+    return [dict(zip(names, values)) for values in product(*(space[name] for name in names))]
+
+
+def capital_cost(config, unit_costs=None, owned=None):
+    """
+    Return the cost of the equipment a configuration needs beyond what is already owned.
+
+    :param config: keyword arguments of :class:`Brewery`
+    :param unit_costs: the cost of one more unit of each kind of equipment (defaults to :data:`UNIT_COSTS`)
+    :param owned: the units of each kind of equipment owned already (defaults to :data:`OWNED`)
+
+    :type config: dict
+    :type unit_costs: dict
+    :type owned: dict
+
+    :rtype: float
+    """
+    unit_costs = UNIT_COSTS if unit_costs is None else unit_costs
+    owned = OWNED if owned is None else owned
+    return sum(cost * max(0, config.get(name, owned.get(name, 0)) - owned.get(name, 0))
+               for name, cost in unit_costs.items())
+
+
+def _simulate_profit(task, until, initial_funds):
+    config, capital, random_seed = task
+    return run_replication(random_seed, until=until, **config)['funds'] - initial_funds - capital
+
+
+def optimize(space, until=365*24, first_replications=FIRST_REPLICATIONS, max_replications=64,
+             elimination_rate=ELIMINATION_RATE, unit_costs=None, owned=None, processes=None, **config):
+    """
+    Find the equipment with the highest simulated profit net of its capital cost, by successive halving.
+
+    Each round runs every surviving candidate up to the round's number of replications,
+    in parallel. It then keeps the best ``1 / elimination_rate`` of them, plus any whose
+    seed-by-seed profit difference from the leader is not significantly negative at 95%
+    confidence. The next round runs
+    ``elimination_rate`` times as many replications. Profit is the change in funds over ``until``
+    less the capital cost of the equipment.
+
+    :param space: the options of each :class:`Brewery` argument, as for :func:`candidates`
+    :param until: the simulated time (in hours) each replication runs for
+    :param first_replications: the replications of every candidate in the first round
+    :param max_replications: the most replications of any one candidate
+    :param elimination_rate: the factor by which each round cuts the candidates and grows the replications
+    :param unit_costs: the cost of one more unit of each kind of equipment, as for :func:`capital_cost`
+    :param owned: the units of each kind of equipment owned already, as for :func:`capital_cost`
+    :param processes: the number of worker processes, ``1`` runs serially in this process
+    :param config: keyword arguments shared by every candidate :class:`Brewery`
+
+    :type space: dict
+    :type until: float
+    :type first_replications: int
+    :type max_replications: int
+    :type elimination_rate: int
+    :type unit_costs: dict
+    :type owned: dict
+    :type processes: int
+
+    :return: the best configuration and the ranking of every candidate, best first, with its mean
+             ``profit``, ``ci95``, ``replications`` and the ``round`` it was dropped in (``None`` for survivors)
+    :rtype: tuple
+    """
+    options = candidates(space)
+    ranking = [{'config': dict(config, **option), 'option': option, 'profits': [], 'round': None,
+                'capital': capital_cost(option, unit_costs, owned)} for option in options]
+    simulate = partial(_simulate_profit, until=until, initial_funds=config.get('initial_funds', 10000.0))
+    processes = cpu_count() if processes is None else processes
+    pool = Pool(processes=processes) if processes > 1 else None
+
+    survivors = list(ranking)
+    replications = first_replications
+    round_number = 0
+    try:
+        while True:
+            tasks, owners = [], []
+            for candidate in survivors:
+                for seed in range(len(candidate['profits']), replications):
+                    tasks.append((candidate['config'], candidate['capital'], seed))
+                    owners.append(candidate)
+            if pool is None:
+                profits = [simulate(task) for task in tasks]
+            else:
+                profits = pool.map(simulate, tasks, chunksize=1)
+            for owner, profit in zip(owners, profits):
+                owner['profits'].append(profit)
+            for candidate in survivors:
+                _summarize(candidate)
+
+            if len(survivors) == 1 or replications >= max_replications:
+                break
+            survivors.sort(key=lambda candidate: -candidate['profit'])
+            leader = survivors[0]
+            keep = max(1, int(ceil(len(survivors) / elimination_rate)))
+            kept = [candidate for idx, candidate in enumerate(survivors) if idx < keep or not _clearly_worse(candidate, leader)]
+            for candidate in survivors:
+                if candidate not in kept:
+                    candidate['round'] = round_number
+            survivors = kept
+            replications = min(max_replications, replications * elimination_rate)
+            round_number += 1
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    ranking.sort(key=lambda candidate: (candidate['round'] is not None, -(candidate['round'] or 0),
+                                        -candidate['profit']))
+    for candidate in ranking:
+        del candidate['profits']
+        del candidate['config']
+    return ranking[0]['option'], ranking
+
+
+def _summarize(candidate):
+    profits = candidate['profits']
+    n = len(profits)
+    mean = sum(profits) / n
+    std = sqrt(sum((profit - mean) ** 2 for profit in profits) / (n - 1)) if n > 1 else float('inf')
+    candidate.update(profit=mean, ci95=Z_95 * std / sqrt(n), replications=n)
+
+
+def _clearly_worse(candidate, leader):
+    differences = [profit - best for profit, best in zip(candidate['profits'], leader['profits'])]
+    n = len(differences)
+    mean = sum(differences) / n
+    std = sqrt(sum((difference - mean) ** 2 for difference in differences) / (n - 1)) if n > 1 else float('inf')
+    return mean + Z_95 * std / sqrt(n) < 0
+
+
+def simulated_years(ranking, until=365*24):
+    """ Return the simulated years spent on a ranking returned by :func:`optimize`. """
+    return sum(candidate['replications'] for candidate in ranking) * until / (365 * 24)
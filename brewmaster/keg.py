@@ -1,34 +1,154 @@
 from __future__ import division, print_function
-from .util import SimpyMixin
+from array import array
+from itertools import count
+import numpy as np
+from .monitoring import LevelSeries
 
 
-KEGS_PER_PINT = 1 / 124
+PINTS_PER_KEG = 124
+KEGS_PER_PINT = 1 / PINTS_PER_KEG
 GALLONS_PER_KEG = 15.5
 
 
-class Keg(SimpyMixin):
-    def __init__(self, name=None, expiration=0, init=0, *args, **kwargs):
-        super(Keg, self).__init__(*args, **kwargs)
+class Cooperage(object):
+    """
+    The fill levels of a brewery's kegs, held in one shared array indexed by keg slot.
+
+    :param capacity: the number of pints a keg holds
+    :param env: the simulation environment, used to time-stamp monitored levels
+    :param monitoring: whether to record a :class:`LevelSeries` of each keg's level
+    :param bucket: the width of the downsampling buckets of the series
+
+    :type capacity: float
+    :type env: :class:`simpy.Environment`
+    :type monitoring: bool
+    :type bucket: float
+
+    """
+
+    def __init__(self, capacity=PINTS_PER_KEG, env=None, monitoring=False, bucket=None):
+        self.capacity = capacity
+        self.env = env
+        self.bucket = bucket
+        self.levels = array('d')
+        self.series = {} if monitoring else None
+
+    def __len__(self):
+        return len(self.levels)
+
+    def add(self, level=0):
+        """
+        Add a keg to the cooperage and return its slot.
+
+        :param level: the initial level of the keg
+        :type level: float
+
+        :rtype: int
+
+        """
+        self.levels.append(level)
+        slot = len(self.levels) - 1
+        if self.series is not None:
+            self.series[slot] = LevelSeries(self.now, level, bucket=self.bucket)
+        return slot
+
+    @property
+    def now(self):
+        return 0.0 if self.env is None else self.env.now
+
+    def set(self, slot, level):
+        """
+        Set the level of the keg in a slot.
+
+        :param slot: the slot of the keg
+        :param level: the new level
+
+        :type slot: int
+        :type level: float
+
+        """
+        self.levels[slot] = level
+        if self.series is not None:
+            self.series[slot].record(self.now, level)
+
+    def snapshot(self):
+        """
+        Return a copy of all keg levels as a NumPy array.
+
+        :rtype: :class:`numpy.ndarray`
+
+        """
+        return np.array(self.levels)
+
+
+class Keg(object):
+    """
+    A keg whose level lives in a slot of a shared :class:`Cooperage`.
+
+    :param name: the beer in the keg
+    :param expiration: the day the keg expires
+    :param init: the initial number of pints in the keg
+    :param cooperage: the cooperage holding the level of the keg (defaults to a new one)
+    :param env: the simulation environment
+
+    """
+    __slots__ = ('number', 'name', 'expiration', 'clean', 'store', 'index_key', 'cooperage', 'slot')
+    _numbers = count()
+
+    def __init__(self, name=None, expiration=0, init=0, cooperage=None, env=None):
+        now = 0.0 if env is None else env.now
+        self.number = next(Keg._numbers)
+        self.store = None
+        self.index_key = None
         expiration = 24 * expiration
-        self.expiration = self.now + expiration if expiration < self.now else expiration
+        self.expiration = now + expiration if expiration < now else expiration
         self.name = name
-        self.contents = self.new_container(capacity=124, init=init)
+        self.cooperage = Cooperage(env=env) if cooperage is None else cooperage
+        self.slot = self.cooperage.add(init)
         self.clean = True
 
-        get = self.contents.get
-
     @property
     def amount(self):
-        return self.contents.level
+        return self.cooperage.levels[self.slot]
+
+    @property
+    def capacity(self):
+        return self.cooperage.capacity
 
     def fill(self, beer, amount=None):
         if amount is None:
-            amount = self.contents.capacity
-        if amount > self.contents.capacity:
-            raise ValueError("Keg has capacity of {}, cannot fill it with {} pints of beer".format(self.contents.capacity, amount))
+            amount = self.capacity
+        if self.amount + amount > self.capacity:
+            raise ValueError("Keg has capacity of {}, cannot fill it with {} pints of beer".format(self.capacity, amount))
+        if self.store is not None:
+            self.store.unindex(self)
         self.name = beer
         self.clean = False
-        self.contents.put(amount)
+        self.cooperage.set(self.slot, self.amount + amount)
+        if self.store is not None:
+            self.store.index(self)
+
+    def draw(self, pints):
+        """
+        Take pints of beer out of the keg.
+
+        :param pints: the number of pints to take
+        :type pints: float
+        """
+        if pints > self.amount:
+            raise ValueError("Keg has {} pints left, cannot draw {} pints of beer".format(self.amount, pints))
+        if self.store is not None:
+            self.store.unindex(self)
+        self.cooperage.set(self.slot, self.amount - pints)
+        if self.store is not None:
+            self.store.index(self)
 
     def empty(self):
-        self.get(self.amount)
+        if self.store is not None:
+            self.store.unindex(self)
+        if self.amount:
+            self.cooperage.set(self.slot, 0)
+        self.name = None
+        self.clean = True
+        if self.store is not None:
+            self.store.index(self)
@@ -0,0 +1,86 @@
+from __future__ import division, print_function
+from collections import Counter
+from gc import collect, get_objects
+from sys import platform
+try:
+    from resource import getrusage, RUSAGE_SELF
+except ImportError:  # not available on Windows
+    getrusage = None
+try:
+    from psutil import Process as _PsutilProcess
+except ImportError:
+    _PsutilProcess = None
+
+
+TRACKED_TYPES = ['Keg', 'Patron', 'Process', 'Timeout', 'Initialize', 'Condition', 'Request', 'Release',
+                 'ContainerGet', 'ContainerPut', 'StoreGet', 'StorePut', 'FilterStoreGet', 'KegsGet', 'KegsPut',
+                 'generator', 'dict', 'list', 'tuple', 'str', 'float']
+
+
+def rss():
+    """
+    Return the current resident set size of this process in bytes, or ``None`` if it cannot be measured.
+
+    :rtype: int
+
+    """
+    if _PsutilProcess is not None:
+        return _PsutilProcess().memory_info().rss
+    try:
+        from os import sysconf
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, ImportError):
+        return None
+
+
+def peak_rss():
+    """
+    Return the peak resident set size of this process in bytes, or ``None`` if it cannot be measured.
+
+    :rtype: int
+
+    """
+    if getrusage is None:
+        return None
+    peak = getrusage(RUSAGE_SELF).ru_maxrss
+    return peak if platform == 'darwin' else peak * 1024
+
+
+def object_counts(type_names=None):
+    """
+    Return the number of live objects tracked by the garbage collector for each type name.
+
+    :param type_names: the type names to count (defaults to every type)
+    :type type_names: list
+
+    :rtype: dict
+
+    """
+    counts = Counter(type(obj).__name__ for obj in get_objects())
+    if type_names is None:
+        return dict(counts)
+    return {name: counts.get(name, 0) for name in type_names}
+
+
+def memory_report(type_names=TRACKED_TYPES, garbage_collect=True):
+    """
+    Return the current and peak RSS of this process and the number of live simulation objects.
+
+    Objects are counted after a full garbage collection by default, so only reachable objects are reported.
+
+    :param type_names: the type names to count
+    :param garbage_collect: whether to collect garbage before counting
+
+    :type type_names: list
+    :type garbage_collect: bool
+
+    :rtype: dict
+
+    """
+    if garbage_collect:
+        collect()
+    return {'rss': rss(),
+            'peak_rss': peak_rss(),
+            'objects': len(get_objects()),
+            'counts': object_counts(type_names)}
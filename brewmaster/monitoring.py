@@ -0,0 +1,114 @@
+from __future__ import division, print_function
+import numpy as np
+
+
+INITIAL_SIZE = 64
+
+
+class LevelSeries(object):
+    """
+    A step-function time series of a level (items in a store, amount in a container)
+    backed by growable NumPy arrays.
+
+    Without a bucket every change is kept (changes at the same instant collapse into
+    one sample). With a bucket, changes are downsampled into one sample per bucket
+    holding the ``minimum``, ``maximum`` and ``last`` level seen in it.
+
+    :param time: the time of the initial level
+    :param level: the initial level
+    :param bucket: the width of the downsampling buckets, e.g. ``1`` for one sample per simulated hour
+
+    :type time: float
+    :type level: float
+    :type bucket: float
+
+    """
+
+    def __init__(self, time=0.0, level=0.0, bucket=None):
+        self.bucket = bucket
+        self.size = 0
+        self._times = np.empty(INITIAL_SIZE)
+        self._last = np.empty(INITIAL_SIZE)
+        if bucket is not None:
+            self._minimum = np.empty(INITIAL_SIZE)
+            self._maximum = np.empty(INITIAL_SIZE)
+        self.record(time, level)
+
+    def _grow(self):
+        for name in ('_times', '_last', '_minimum', '_maximum'):
+            if hasattr(self, name):
+                column = getattr(self, name)
+                grown = np.empty(2 * len(column))
+                grown[:self.size] = column[:self.size]
+                setattr(self, name, grown)
+
+    def record(self, time, level):
+        """
+        Record the level at a time no earlier than the last one recorded.
+
+        :param time: the simulation time
+        :param level: the level at that time
+
+        :type time: float
+        :type level: float
+
+        """
+        idx = self.size - 1
+        if self.bucket is None:
+            if idx >= 0 and self._times[idx] == time:
+                self._last[idx] = level
+                return
+        else:
+            time = (time // self.bucket) * self.bucket
+            if idx >= 0 and self._times[idx] == time:
+                self._last[idx] = level
+                if level < self._minimum[idx]:
+                    self._minimum[idx] = level
+                elif level > self._maximum[idx]:
+                    self._maximum[idx] = level
+                return
+
+        if self.size == len(self._times):
+            self._grow()
+        idx += 1
+        self._times[idx] = time
+        self._last[idx] = level
+        if self.bucket is not None:
+            previous = self._last[idx - 1] if idx else level
+            self._minimum[idx] = min(previous, level)
+            self._maximum[idx] = max(previous, level)
+        self.size += 1
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def times(self):
+        """ The times of the samples (the start of each bucket when downsampling), as a view. """
+        return self._times[:self.size]
+
+    @property
+    def levels(self):
+        """ The level after each sample (the last level of each bucket when downsampling), as a view. """
+        return self._last[:self.size]
+
+    @property
+    def minimum(self):
+        """ The lowest level in each bucket, as a view. """
+        return self._minimum[:self.size] if self.bucket is not None else self.levels
+
+    @property
+    def maximum(self):
+        """ The highest level in each bucket, as a view. """
+        return self._maximum[:self.size] if self.bucket is not None else self.levels
+
+    def steps(self):
+        """
+        Return the corner points of the step function, e.g. for plotting with ``plt.plot``.
+
+        :rtype: tuple
+
+        """
+        times = np.repeat(self.times, 2)[1:]
+        levels = np.repeat(self.levels, 2)[:-1]
+        return times, levels
@@ -0,0 +1,321 @@
+"""
+A production brewery supplying many accounts (bars, retailers, festivals) with kegs.
+
+The brewery runs in the main process. Accounts are partitioned across worker processes,
+each simulating its accounts in its own environment, and the two sides meet every
+``window`` hours: the brewery ships the kegs ordered at the last meeting and the accounts
+report the kegs they have emptied, which go back to the cellar ``return_delay`` hours after
+they were emptied (or at the next meeting, if that is later). Within a window the brewery
+and every partition run in parallel::
+
+    with Network([Account('bar {}'.format(idx), demand=2) for idx in range(200)], processes=4) as network:
+        network.run(365 * 24)
+        network.kpis()
+
+"""
+from __future__ import division, print_function
+from multiprocessing import Pipe, Process, cpu_count
+from simpy import Environment
+from .brewery import KEG_RETURN_TIME, Brewery
+from .eventlog import EventLog
+from .sampling import Sampler
+from .util import SimpyMixin
+
+
+SYNC_WINDOW = 24
+STOP_TIMEOUT = 10
+WHOLESALE_DISCOUNT = 0.5
+ACCOUNT_KPIS = ['account_pints_sold', 'account_stockouts']
+
+
+class Account(SimpyMixin):
+    """
+    A customer of the brewery that sells its kegs by the pint.
+
+    Pints are ordered at random times, ``demand`` per hour on average, while the account is
+    open, each of a beer picked at random among those it has on hand. At every meeting with
+    the brewery it orders enough kegs to bring each beer it sells back up to ``par_level``.
+
+    :param name: the name of the account, which also seeds its random stream
+    :param demand: the average number of pints ordered per hour
+    :param beers: the beers it sells (defaults to all of the brewery's)
+    :param par_level: the number of kegs of each beer it keeps on hand
+    :param return_delay: the hours between emptying a keg and the keg reaching the brewery
+    :param opens: the time the account opens, e.g. the first day of a festival
+    :param closes: the time the account closes for good
+
+    :type name: str
+    :type demand: float
+    :type beers: list
+    :type par_level: int
+    :type return_delay: float
+    :type opens: float
+    :type closes: float
+
+    """
+    __slots__ = ('name', 'demand', 'beers', 'par_level', 'return_delay', 'opens', 'closes',
+                 'kegs', 'empties', 'pints_sold', 'stockouts')
+
+    def __init__(self, name, demand=1.0, beers=None, par_level=1, return_delay=KEG_RETURN_TIME,
+                 opens=0.0, closes=float('inf'), *args, **kwargs):
+        kwargs.setdefault('strict', True)
+        super(Account, self).__init__(*args, **kwargs)
+        self.name = name
+        self.demand = demand
+        self.beers = beers
+        self.par_level = par_level
+        self.return_delay = return_delay
+        self.opens = opens
+        self.closes = closes
+        self.kegs = {}
+        self.empties = []
+        self.pints_sold = 0
+        self.stockouts = 0
+
+    def start(self, env, random_seed, beers):
+        """ Place the account in an environment and start its demand. """
+        self.env = env
+        self.rng = Sampler(random_seed, stream='account/' + self.name)
+        self.events = EventLog()
+        self.beers = list(beers) if self.beers is None else self.beers
+        self.kegs = {beer: [] for beer in self.beers}
+        self.process(self.serve())
+
+    def serve(self):
+        if self.opens > self.now:
+            yield self.wait(self.opens - self.now)
+        while True:
+            yield self.wait(self.rng.expovariate(self.demand))
+            if self.now >= self.closes:
+                return
+            beer = self.rng.choice(self.beers)
+            if not self.kegs[beer]:
+                on_hand = [name for name in self.beers if self.kegs[name]]
+                if not on_hand:
+                    self.stockouts += 1
+                    continue
+                beer = self.rng.choice(on_hand)
+            keg = self.kegs[beer][0]
+            keg[1] -= 1
+            self.pints_sold += 1
+            if keg[1] < 1:
+                self.kegs[beer].pop(0)
+                self.empties.append((keg[0], self.now + self.return_delay))
+
+    def receive(self, beer, kegs):
+        """ Put delivered ``(number, pints)`` kegs of a beer on hand. """
+        self.kegs[beer].extend([number, pints] for number, pints in kegs)
+
+    def orders(self):
+        """ Return the kegs of each beer needed to get back to the par level. """
+        if self.now >= self.closes:
+            return {}
+        return {beer: self.par_level - len(kegs) for beer, kegs in self.kegs.items() if len(kegs) < self.par_level}
+
+
+class AccountPartition(object):
+    """
+    The accounts simulated by one worker, in one environment of their own.
+
+    :param accounts: the accounts of the partition
+    :param random_seed: the seed of the network
+    :param beers: the beers of the brewery
+
+    :type accounts: list
+    :type random_seed: int
+    :type beers: list
+
+    """
+
+    def __init__(self, accounts, random_seed, beers):
+        self.env = Environment()
+        self.accounts = {account.name: account for account in accounts}
+        for account in accounts:
+            account.start(self.env, random_seed, beers)
+
+    def advance(self, until, deliveries):
+        """
+        Receive the kegs shipped at the start of a window, run to its end and report back.
+
+        :param until: the end of the window
+        :param deliveries: the ``(number, pints)`` kegs of each beer shipped to each account
+
+        :type until: float
+        :type deliveries: dict
+
+        :return: the orders of each account, the ``(number, due)`` kegs to return and the account KPIs
+        :rtype: tuple
+        """
+        for name, shipment in deliveries.items():
+            for beer, kegs in shipment.items():
+                self.accounts[name].receive(beer, kegs)
+        self.env.run(until)
+        empties = []
+        for account in self.accounts.values():
+            empties.extend(account.empties)
+            account.empties = []
+        orders = {name: account.orders() for name, account in self.accounts.items()}
+        totals = {'account_pints_sold': sum(account.pints_sold for account in self.accounts.values()),
+                  'account_stockouts': sum(account.stockouts for account in self.accounts.values())}
+        return orders, empties, totals
+
+
+def _partition_worker(connection, accounts, random_seed, beers):
+    partition = AccountPartition(accounts, random_seed, beers)
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        connection.send(partition.advance(*message))
+    connection.close()
+
+
+class Network(object):
+    """
+    A production brewery and the accounts it supplies, partitioned across worker processes.
+
+    Kegs are sold to the accounts at ``1 - WHOLESALE_DISCOUNT`` of the bar price through
+    :meth:`Brewery.dispatch_kegs` and come back through :meth:`Brewery.return_kegs`.
+    Every account has its own random stream, so results do not depend on how the
+    accounts are partitioned, only on the seed and the window. Use it as a context
+    manager, or call :meth:`close`, to stop the worker processes.
+
+    :param accounts: the accounts
+    :param processes: the number of worker processes, ``0`` simulates the accounts in this process
+    :param window: the hours between meetings of the brewery and the accounts
+    :param random_seed: the seed of the brewery and the accounts
+    :param wholesale_discount: the discount on the bar price of a pint sold to an account
+    :param config: keyword arguments passed on to :class:`Brewery`
+
+    :type accounts: list
+    :type processes: int
+    :type window: float
+    :type random_seed: int
+    :type wholesale_discount: float
+
+    """
+
+    def __init__(self, accounts, processes=None, window=SYNC_WINDOW, random_seed=None,
+                 wholesale_discount=WHOLESALE_DISCOUNT, **config):
+        self.brewery = Brewery(env=Environment(), random_seed=random_seed, **config)
+        self.window = window
+        self.wholesale_discount = wholesale_discount
+        self.kegs_out = {}
+        self.kegs_returned = 0
+        self.totals = dict.fromkeys(ACCOUNT_KPIS, 0)
+        self.names = [account.name for account in accounts]
+        self.orders = {account.name: {beer: account.par_level for beer in (account.beers or self.brewery.beers)}
+                       for account in accounts}
+        if len(self.orders) < len(accounts):
+            raise ValueError("Account names must be unique")
+
+        processes = min(cpu_count() if processes is None else processes, len(accounts))
+        random_seed = self.brewery.streams.seed
+        beers = list(self.brewery.beers)
+        self.partitions = []
+        self.workers = []
+        self.owners = {}
+        if processes == 0:
+            self.partitions.append(AccountPartition(accounts, random_seed, beers))
+            self.owners = dict.fromkeys(self.orders, 0)
+            return
+        for idx in range(processes):
+            members = accounts[idx::processes]
+            parent, child = Pipe()
+            worker = Process(target=_partition_worker, args=(child, members, random_seed, beers), daemon=True)
+            worker.start()
+            child.close()
+            self.partitions.append(parent)
+            self.workers.append(worker)
+            self.owners.update(dict.fromkeys([account.name for account in members], idx))
+
+    @property
+    def now(self):
+        return self.brewery.now
+
+    def ship_orders(self):
+        """ Ship the kegs ordered by every account, in account order as far as the cellar allows, grouped by partition. """
+        deliveries = [{} for _ in self.partitions]
+        for name in self.names:
+            shipment = {}
+            for beer, num_kegs in self.orders.get(name, {}).items():
+                price = self.brewery.prices[beer] * (1 - self.wholesale_discount)
+                kegs = self.brewery.dispatch_kegs(beer, num_kegs, price=price)
+                if kegs:
+                    shipment[beer] = []
+                    for keg in kegs:
+                        self.kegs_out[keg.number] = keg
+                        shipment[beer].append((keg.number, keg.amount))
+            if shipment:
+                deliveries[self.owners[name]][name] = shipment
+        return deliveries
+
+    def return_empties(self, empties):
+        for number, due in empties:
+            self.brewery.process(self.brewery.return_kegs([self.kegs_out.pop(number)], due))
+            self.kegs_returned += 1
+
+    def run(self, until=365*24):
+        """
+        Run the brewery and the accounts, window by window.
+
+        :param until: the time to run to
+        :type until: float
+        """
+        try:
+            while self.now < until:
+                end = min(until, self.now + self.window)
+                deliveries = self.ship_orders()
+                if self.workers:
+                    for connection, shipped in zip(self.partitions, deliveries):
+                        connection.send((end, shipped))
+                    self.brewery.run(end)
+                    reports = [connection.recv() for connection in self.partitions]
+                else:
+                    self.brewery.run(end)
+                    reports = [self.partitions[0].advance(end, deliveries[0])]
+
+                self.orders = {}
+                for orders, empties, totals in reports:
+                    self.orders.update(orders)
+                    self.return_empties(empties)
+                self.totals = {kpi: sum(totals[kpi] for _, _, totals in reports) for kpi in self.totals}
+        except BaseException:
+            self.close()
+            raise
+
+    def kpis(self):
+        """ Return the KPIs of the brewery and the totals of its accounts. """
+        result = {'funds': self.brewery.funds,
+                  'pints_sold': self.brewery.pints_sold,
+                  'stockouts': self.brewery.stockouts,
+                  'parties_turned_away': self.brewery.parties_turned_away,
+                  'kegs_shipped': self.brewery.kegs_shipped,
+                  'kegs_returned': self.kegs_returned}
+        result.update(self.totals)
+        return result
+
+    def close(self):
+        """ Stop the worker processes, terminating those that cannot be told to stop. """
+        for connection, worker in zip(self.partitions, self.workers):
+            try:
+                if worker.is_alive():
+                    connection.send(None)
+            except (OSError, EOFError):
+                # The worker died or closed its end: there is nobody left to tell.
+                pass
+            connection.close()
+        for worker in self.workers:
+            worker.join(timeout=STOP_TIMEOUT)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+        self.workers = []
+        self.partitions = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
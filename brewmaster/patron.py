@@ -1,6 +1,6 @@
 from __future__ import division, print_function
-from random import expovariate, sample, uniform
-from .util import Interrupt, SimpyMixin, poisson, csv_to_dict, json_to_dict
+from .eventlog import DEBUG, INFO, WARNING, register_event
+from .util import Interrupt, SimpyMixin
 from .keg import KEGS_PER_PINT
 
 
@@ -14,50 +14,102 @@ TIME_TO_REORDER = [0.12, 0.65]
 TIME_TO_PAY = [0.1, 0.2]
 inf = float('inf')
 
+PARTY = 'Party of {:.0f} (arrived at {:.1f})'
+ARRIVED = register_event(DEBUG, PARTY + ' arrived and waiting to be seated')
+WAITING_TO_ORDER = register_event(DEBUG, PARTY + ' waiting to order')
+WAITING_TO_BE_SERVED = register_event(DEBUG, PARTY + ' waiting to be served')
+DRINKING = register_event(DEBUG, PARTY + ' is drinking')
+WAITING_TO_PAY = register_event(DEBUG, PARTY + ' waiting to pay')
+LEFT = register_event(DEBUG, PARTY + ' leaving')
+LEFT_EARLY = register_event(INFO, PARTY + ' leaving {:.2f} hrs early because {}', names=(3,))
+WANTS_PINT = register_event(DEBUG, 'A customer in ' + PARTY + ' wants to drink a pint of {}', names=(2,))
+ORDERED_INSTEAD = register_event(DEBUG, 'A customer in ' + PARTY + ' could not get {} so they ordered {}', names=(2, 3))
+NO_BEER = register_event(WARNING, 'A customer in ' + PARTY + ' could not get {} nor any other beer', names=(2,))
+
+
+def table_size_for(tables, party_size):
+    """
+    Return the size of the table a party asks for: the smallest one with more seats than the party.
+
+    :param tables: the tables of the brewery, keyed by size
+    :param party_size: the number of people in the party
+
+    :type tables: dict
+    :type party_size: int
+
+    :rtype: int
+
+    """
+    return max(tables, key=lambda x: party_size - x if x > party_size else -inf)
+
 
 class Patron(SimpyMixin):
+    __slots__ = ('brewery', 'arrival', 'departure', 'party_size', 'max_wait', 'max_orders', 'consuming')
+
     def __init__(self, brewery, max_wait=None, *args, **kwargs):
+        kwargs.setdefault('env', brewery.env)
+        kwargs.setdefault('rng', brewery.streams['patrons'])
+        kwargs.setdefault('events', brewery.events)
+        kwargs.setdefault('profiler', brewery.profiler)
         super(Patron, self).__init__(*args, **kwargs)
         self.brewery = brewery
-        self.departure = self.now + expovariate(AVG_GROUP_STAY)
-        self.party_size = poisson(AVG_GROUP_SIZE - 1) + 1
-        self.max_wait = uniform(*MAX_WAIT) if max_wait is None else max_wait
-        self.max_orders = [poisson(AVG_NUM_DRINKS) for _ in range(self.party_size)]
-        self.name = "Party of {} (arrived at {:.1f})".format(self.party_size, self.now)
+        self.arrival = self.now
+        self.departure = self.now + self.rng.expovariate(AVG_GROUP_STAY)
+        self.party_size = self.rng.poisson(AVG_GROUP_SIZE - 1) + 1
+        self.max_wait = self.rng.uniform(*MAX_WAIT) if max_wait is None else max_wait
+        self.max_orders = [self.rng.poisson(AVG_NUM_DRINKS) for _ in range(self.party_size)]
         self.consuming = self.process(self.consume())
 
+    @property
+    def name(self):
+        return PARTY.format(self.party_size, self.arrival)
+
     def consume(self):
         try:
-            self.brewery.log(self.name + ' arrived and waiting to be seated')
-            tables = self.brewery.tables
-            table_size = max(tables, key=lambda x: self.party_size - x if x > self.party_size else -inf)
+            debug = self.events.level <= DEBUG
+            if debug:
+                self.log(ARRIVED, self.party_size, self.arrival)
+            table_size = table_size_for(self.brewery.tables, self.party_size)
             with self.brewery.tables[table_size].request() as table:
                 request = yield table | self.wait(self.max_wait)
                 if table not in request:
+                    self.brewery.parties_turned_away += 1
                     raise Interrupt("they are tired of waiting")
                     self.brewery.tables[table_size].release(table)
 
-                self.brewery.log(self.name + ' waiting to order')
+                if debug:
+                    self.log(WAITING_TO_ORDER, self.party_size, self.arrival)
                 yield self.wait(TIME_TO_ORDER)
                 beers = True
                 while self.now < self.departure and beers:
                     beers = self.select_beers()
                     if beers:
-                        yield self.process(self.brewery.take_order(beers, 1))
-                        self.brewery.log(self.name + ' waiting to be served')
+                        self.brewery.settle(beers, 1)
+                        if debug:
+                            self.log(WAITING_TO_BE_SERVED, self.party_size, self.arrival)
                         yield self.wait(TIME_TO_BE_SERVED)
-                        self.brewery.log(self.name + ' is drinking')
+                        if debug:
+                            self.log(DRINKING, self.party_size, self.arrival)
                         yield self.wait(TIME_TO_REORDER)
-                self.brewery.log(self.name + ' waiting to pay')
+                if debug:
+                    self.log(WAITING_TO_PAY, self.party_size, self.arrival)
                 yield self.wait(TIME_TO_PAY)
-                self.brewery.log(self.name + ' leaving')
+                if debug:
+                    self.log(LEFT, self.party_size, self.arrival)
 
         except Interrupt as interruption:
-            self.brewery.log('Party {} leaving {} hrs early because'.format(self.name, self.departure - self.now, interruption))
+            self.log(LEFT_EARLY, self.party_size, self.arrival, self.departure - self.now, str(interruption.cause))
+        finally:
+            self.brewery.patrons.pop(self, None)
 
     def select_beers(self):
         beers = []
-        tapped_kegs = {keg.name: keg for keg in self.brewery.tapped_kegs.items}
+        debug = self.events.level <= DEBUG
+        tapped_kegs = self.brewery.tapped_kegs
+        beers_on_tap = tapped_kegs.beers
+        if not beers_on_tap:
+            self.brewery.stockouts += sum(1 for orders in self.max_orders if orders > 0)
+            return beers
 
         for customer in range(self.party_size):
             if self.max_orders[customer] > 0:
@@ -65,16 +117,19 @@ class Patron(SimpyMixin):
             else:
                 continue
             new_beer = None
-            beer = sample(tapped_kegs.keys(), 1)[0]
-            self.brewery.log('A customer in {} wants to drink a pint of {}'.format(self.name, beer))
-            if beer not in tapped_kegs or tapped_kegs[beer].amount < KEGS_PER_PINT:
-                candidate_kegs = [key for key, keg in tapped_kegs.items() if keg.amount > KEGS_PER_PINT]
+            beer = self.rng.choice(beers_on_tap)
+            if debug:
+                self.log(WANTS_PINT, self.party_size, self.arrival, beer)
+            if tapped_kegs.inventory(beer) < KEGS_PER_PINT:
+                candidate_kegs = [name for name in beers_on_tap if tapped_kegs.inventory(name) > KEGS_PER_PINT]
                 if candidate_kegs:
-                    new_beer = sample(candidate_kegs, 1)[0]
-                    self.brewery.log('A customer in {} could not get {} so they ordered {}'.format(self.name, beer, new_beer))
+                    new_beer = self.rng.choice(candidate_kegs)
+                    if debug:
+                        self.log(ORDERED_INSTEAD, self.party_size, self.arrival, beer, new_beer)
                     beers.append(new_beer)
                 else:
-                    self.brewery.log('A customer in {} could not get {} nor any other beer'.format(self.name, beer))
+                    self.brewery.stockouts += 1
+                    self.log(NO_BEER, self.party_size, self.arrival, beer)
             else:
                 beers.append(beer)
 
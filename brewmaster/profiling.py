@@ -0,0 +1,159 @@
+from __future__ import division, print_function
+from collections import defaultdict
+from time import perf_counter
+
+
+OUTSIDE = '(callbacks)'
+PROCESS_COLUMNS = ['started', 'steps', 'scheduled', 'seconds']
+STORE_COLUMNS = ['puts', 'gets', 'filters', 'seconds']
+
+
+class Profiler(object):
+    """
+    Opt-in instrumentation of a simulation.
+
+    Processes started through :meth:`SimpyMixin.process` are attributed to their
+    type (the qualified name of their generator function, e.g. ``Patron.consume``)
+    with the number started, the generator steps resumed, the events scheduled
+    while they ran and the wall-clock time spent in their steps. Watched stores,
+    containers and resources count their put and get attempts, the time spent
+    fulfilling them (also included in the time of the process asking) and the
+    evaluations of get filters.
+
+    Nothing is wrapped unless a profiler is passed in, so an unprofiled run pays nothing.
+
+    """
+
+    def __init__(self):
+        self.env = None
+        self.processes = defaultdict(lambda: dict.fromkeys(PROCESS_COLUMNS, 0))
+        self.stores = defaultdict(lambda: dict.fromkeys(STORE_COLUMNS, 0))
+
+    def attach(self, env):
+        """
+        Count the events scheduled in an environment, by the type of the process that was active.
+
+        :param env: the simulation environment
+        :type env: :class:`simpy.Environment`
+
+        """
+        if self.env is env:
+            return
+        self.env = env
+        schedule = env.schedule
+        processes = self.processes
+
+        def counting_schedule(event, priority=1, delay=0):
+            processes[getattr(env.active_process, 'profile_name', OUTSIDE)]['scheduled'] += 1
+            schedule(event, priority, delay)
+
+        env.schedule = counting_schedule
+
+    def process(self, env, generator):
+        """
+        Start a process whose generator steps are counted and timed.
+
+        :param env: the simulation environment
+        :param generator: the generator of the process
+
+        :rtype: :class:`simpy.Process`
+
+        """
+        name = getattr(generator, '__qualname__', getattr(generator, '__name__', OUTSIDE))
+        self.processes[name]['started'] += 1
+        process = env.process(self._steps(generator, self.processes[name]))
+        process.profile_name = name
+        return process
+
+    @staticmethod
+    def _steps(generator, stats):
+        value, error = None, None
+        while True:
+            start = perf_counter()
+            try:
+                event = generator.send(value) if error is None else generator.throw(error)
+            except StopIteration as stop:
+                stats['steps'] += 1
+                stats['seconds'] += perf_counter() - start
+                return getattr(stop, 'value', None)
+            finally:
+                error = None
+            stats['steps'] += 1
+            stats['seconds'] += perf_counter() - start
+            try:
+                value = yield event
+            except GeneratorExit:
+                generator.close()
+                raise
+            except BaseException as exception:
+                value, error = None, exception
+
+    def watch(self, resource, name):
+        """
+        Count and time the put and get attempts of a store, container or resource.
+
+        :param resource: the store, container or resource to watch
+        :param name: the name it is reported under
+
+        :type name: str
+
+        """
+        stats = self.stores[name]
+        do_put, do_get = resource._do_put, resource._do_get
+
+        def counted(evaluate):
+            def evaluate_counted(*args):
+                stats['filters'] += 1
+                return evaluate(*args)
+            return evaluate_counted
+
+        def profiled_put(event):
+            stats['puts'] += 1
+            start = perf_counter()
+            result = do_put(event)
+            stats['seconds'] += perf_counter() - start
+            return result
+
+        def profiled_get(event):
+            stats['gets'] += 1
+            for attribute in ('filter', 'select'):
+                evaluate = getattr(event, attribute, None)
+                if evaluate is not None and not getattr(event, 'profiled', False):
+                    setattr(event, attribute, counted(evaluate))
+                    event.profiled = True
+            start = perf_counter()
+            result = do_get(event)
+            stats['seconds'] += perf_counter() - start
+            return result
+
+        resource._do_put = profiled_put
+        resource._do_get = profiled_get
+
+    def summary(self):
+        """
+        Return the statistics of every process type and store, busiest first.
+
+        :rtype: dict
+
+        """
+        return {'processes': sorted(([name, stats] for name, stats in self.processes.items()),
+                                    key=lambda row: -row[1]['seconds']),
+                'stores': sorted(([name, stats] for name, stats in self.stores.items()),
+                                 key=lambda row: -row[1]['seconds'])}
+
+    def report(self):
+        """
+        Return the statistics as a text table.
+
+        :rtype: str
+
+        """
+        summary = self.summary()
+        lines = ['{:32s}'.format('process') + ''.join('{:>12s}'.format(column) for column in PROCESS_COLUMNS)]
+        for name, stats in summary['processes']:
+            lines.append('{:32s}{started:12d}{steps:12d}{scheduled:12d}{seconds:12.4f}'.format(name, **stats))
+        lines.append('')
+        lines.append('{:32s}'.format('store') + ''.join('{:>12s}'.format(column) for column in STORE_COLUMNS))
+        for name, stats in summary['stores']:
+            lines.append('{:32s}{puts:12d}{gets:12d}{filters:12d}{seconds:12.4f}'.format(name, **stats))
+        return '\n'.join(lines)
@@ -0,0 +1,163 @@
+from __future__ import division, print_function
+import numpy as np
+from .monitoring import LevelSeries
+
+
+def lowest_inventory(brewery):
+    """
+    Score every beer by the pints of it the brewery holds, so the scarcest beer is brewed next.
+
+    A brew-selection policy takes the brewery and returns one score per beer in
+    :attr:`RecipeMatrix.names` order; the feasible beer with the lowest score is brewed.
+
+    :param brewery: the brewery choosing a beer to brew
+    :type brewery: :class:`~brewmaster.brewery.Brewery`
+
+    :rtype: :class:`numpy.ndarray`
+
+    """
+    return brewery.inventories()
+
+
+class RecipeMatrix(object):
+    """
+    The recipes of a beer catalog compiled into a beers by ingredients matrix.
+
+    Row ``i`` holds the amount of each ingredient needed for one keg of ``names[i]``,
+    so the needs of every beer can be compared against the ingredients at hand at once.
+
+    :param beers: the parsed beers, keyed by name
+    :type beers: dict
+
+    """
+
+    def __init__(self, beers):
+        self.names = list(beers)
+        self.ingredients = []
+        self.beer_index = {name: idx for idx, name in enumerate(self.names)}
+        self.ingredient_index = {}
+        for beer in beers.values():
+            for ingredient in beer['ingredients']:
+                if ingredient not in self.ingredient_index:
+                    self.ingredient_index[ingredient] = len(self.ingredients)
+                    self.ingredients.append(ingredient)
+
+        self.matrix = np.zeros((len(self.names), len(self.ingredients)))
+        for name, beer in beers.items():
+            for ingredient, amount in beer['ingredients'].items():
+                self.matrix[self.beer_index[name], self.ingredient_index[ingredient]] = amount
+
+    def __len__(self):
+        return len(self.names)
+
+    def recipe(self, beer):
+        """ Return the row of ingredient amounts for one keg of a beer. """
+        return self.matrix[self.beer_index[beer]]
+
+    def feasible(self, levels, kegs=1):
+        """
+        Return which beers can be brewed from the ingredients at hand.
+
+        :param levels: the amount of each ingredient at hand
+        :param kegs: the number of kegs in a batch
+
+        :type levels: :class:`numpy.ndarray`
+        :type kegs: int
+
+        :rtype: :class:`numpy.ndarray`
+
+        """
+        return (self.matrix * kegs <= levels).all(axis=1)
+
+
+class DryStorage(object):
+    """
+    The ingredients of a brewery, held as one vector of levels in :class:`RecipeMatrix` column order.
+
+    Withdrawals and deliveries happen immediately: batches are only drawn once
+    :meth:`feasible` says they can be brewed, and deliveries add to the levels.
+
+    :param recipes: the recipe matrix of the catalog
+    :param init: the initial level of every ingredient
+    :param env: the simulation environment, used to time-stamp monitored levels
+    :param monitoring: whether to record a :class:`LevelSeries` of each ingredient's level
+    :param bucket: the width of the downsampling buckets of the series
+
+    :type recipes: :class:`RecipeMatrix`
+    :type init: float
+    :type env: :class:`simpy.Environment`
+    :type monitoring: bool
+    :type bucket: float
+
+    """
+
+    def __init__(self, recipes, init=0, env=None, monitoring=False, bucket=None):
+        self.recipes = recipes
+        self.env = env
+        self.levels = np.full(len(recipes.ingredients), float(init))
+        self.reorder_points = np.zeros(len(recipes.ingredients))
+        self.series = None
+        if monitoring:
+            self.series = {ingredient: LevelSeries(self.now, init, bucket=bucket) for ingredient in recipes.ingredients}
+
+    def __contains__(self, ingredient):
+        return ingredient in self.recipes.ingredient_index
+
+    def __iter__(self):
+        return iter(self.recipes.ingredients)
+
+    @property
+    def now(self):
+        return 0.0 if self.env is None else self.env.now
+
+    def level(self, ingredient):
+        """ Return the amount of an ingredient at hand. """
+        return self.levels[self.recipes.ingredient_index[ingredient]]
+
+    def feasible(self, kegs=1):
+        """ Return which beers can be brewed in batches of ``kegs`` from the ingredients at hand. """
+        return self.recipes.feasible(self.levels, kegs)
+
+    def _record(self, columns):
+        if self.series is not None:
+            now = self.now
+            for idx in columns:
+                self.series[self.recipes.ingredients[idx]].record(now, self.levels[idx])
+
+    def draw(self, beer, kegs=1):
+        """
+        Take the ingredients of a batch of beer out of storage.
+
+        :param beer: the beer to brew
+        :param kegs: the number of kegs in the batch
+
+        :type beer: str
+        :type kegs: int
+
+        :return: the ingredients of the batch that are now at or below their reorder point
+        :rtype: list
+
+        """
+        needed = self.recipes.recipe(beer) * kegs
+        if (needed > self.levels).any():
+            raise ValueError("Not enough ingredients in storage to brew {} kegs of {}".format(kegs, beer))
+        self.levels -= needed
+        used = np.flatnonzero(needed)
+        self._record(used)
+        low = used[self.levels[used] <= self.reorder_points[used]]
+        return [self.recipes.ingredients[idx] for idx in low]
+
+    def stock(self, ingredient, amount):
+        """
+        Add a delivery of an ingredient to storage.
+
+        :param ingredient: the ingredient delivered
+        :param amount: the amount delivered
+
+        :type ingredient: str
+        :type amount: float
+
+        """
+        idx = self.recipes.ingredient_index[ingredient]
+        self.levels[idx] += amount
+        self._record([idx])
@@ -0,0 +1,328 @@
+from __future__ import division, print_function
+from functools import partial
+from math import sqrt
+from multiprocessing import Pool, cpu_count
+from statistics import NormalDist
+from simpy import Environment
+from .brewery import Brewery
+
+
+KPIS = ['funds', 'pints_sold', 'stockouts', 'parties_turned_away']
+Z_95 = 1.959964
+
+
+def t_quantile(confidence, dof):
+    """
+    Return the two-sided critical value of Student's t distribution, using the
+    Cornish-Fisher expansion around the normal quantile.
+
+    :param confidence: the confidence level, e.g. 0.95
+    :param dof: the degrees of freedom
+
+    :type confidence: float
+    :type dof: int
+
+    :rtype: float
+
+    """
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    if dof < 1:
+        return float('inf')
+    return (z + (z ** 3 + z) / (4 * dof) +
+            (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * dof ** 2) +
+            (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * dof ** 3))
+
+
+def kpis(brewery):
+    """
+    Return the key performance indicators of a brewery as a dictionary.
+
+    :param brewery: the brewery to measure
+    :type brewery: :class:`Brewery`
+
+    :rtype: dict
+
+    """
+    return {'funds': brewery.funds,
+            'pints_sold': brewery.pints_sold,
+            'stockouts': brewery.stockouts,
+            'parties_turned_away': brewery.parties_turned_away}
+
+
+def run_replication(random_seed, until=365*24, **config):
+    """
+    Build a brewery in its own environment, run it and return its KPIs.
+
+    :param random_seed: the seed for this replication
+    :param until: the simulated time (in hours) to run for
+    :param config: keyword arguments passed on to :class:`Brewery`
+
+    :type random_seed: int
+    :type until: float
+
+    :rtype: dict
+
+    """
+    brewery = Brewery(env=Environment(), random_seed=random_seed, **config)
+    brewery.run(until)
+    result = kpis(brewery)
+    result['seed'] = random_seed
+    return result
+
+
+def run_antithetic_pair(random_seed, until=365*24, **config):
+    """
+    Run a replication and its antithetic twin and return the average of their KPIs.
+
+    :param random_seed: the seed shared by both runs
+    :param until: the simulated time (in hours) to run for
+    :param config: keyword arguments passed on to :class:`Brewery`
+
+    :type random_seed: int
+    :type until: float
+
+    :rtype: dict
+
+    """
+    plain = run_replication(random_seed, until=until, antithetic=False, **config)
+    mirrored = run_replication(random_seed, until=until, antithetic=True, **config)
+    result = {kpi: (plain[kpi] + mirrored[kpi]) / 2 for kpi in KPIS}
+    result['seed'] = random_seed
+    return result
+
+
+def summarize(results, kpi_names=None):
+    """
+    Return the mean, standard deviation, extremes and 95% confidence interval
+    half-width of each KPI over a list of replication results.
+
+    :param results: the per-replication KPI dictionaries
+    :param kpi_names: the KPIs to summarize (defaults to :data:`KPIS`)
+
+    :type results: list
+    :type kpi_names: list
+
+    :rtype: dict
+
+    """
+    kpi_names = KPIS if kpi_names is None else kpi_names
+    summary = {}
+    for kpi in kpi_names:
+        values = [result[kpi] for result in results]
+        n = len(values)
+        mean = sum(values) / n if n else float('nan')
+        std = sqrt(sum((value - mean) ** 2 for value in values) / (n - 1)) if n > 1 else 0.0
+        summary[kpi] = {'mean': mean,
+                        'std': std,
+                        'min': min(values) if n else float('nan'),
+                        'max': max(values) if n else float('nan'),
+                        'ci95': Z_95 * std / sqrt(n) if n else float('nan'),
+                        'n': n}
+    return summary
+
+
+def replicate(replications=100, until=365*24, seeds=None, processes=None, antithetic=False, **config):
+    """
+    Run seeded replications of one brewery configuration on a process pool.
+
+    In antithetic mode each seed is run twice, once with mirrored variates, and the
+    pair average counts as one replication.
+
+    :param replications: the number of replications to run
+    :param until: the simulated time (in hours) each replication runs for
+    :param seeds: the random seeds to use (defaults to ``range(replications)``)
+    :param processes: the number of worker processes, ``1`` runs serially in
+                      this process (defaults to the number of CPUs)
+    :param antithetic: whether to run antithetic pairs
+    :param config: keyword arguments passed on to :class:`Brewery`
+
+    :type replications: int
+    :type until: float
+    :type seeds: list
+    :type processes: int
+    :type antithetic: bool
+
+    :return: the per-replication KPIs (in seed order) and their summary
+    :rtype: tuple
+
+    """
+    seeds = list(range(replications)) if seeds is None else list(seeds)
+    processes = cpu_count() if processes is None else processes
+    task = partial(run_antithetic_pair if antithetic else run_replication, until=until, **config)
+
+    if processes == 1 or len(seeds) == 1:
+        results = [task(random_seed) for random_seed in seeds]
+    else:
+        pool = Pool(processes=min(processes, len(seeds)))
+        try:
+            results = pool.map(task, seeds, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    return results, summarize(results)
+
+
+def replicate_until(kpi='funds', precision=0.01, relative=True, confidence=0.95,
+                    min_replications=10, max_replications=1000, batch_size=None,
+                    until=365*24, first_seed=0, processes=None, antithetic=False, **config):
+    """
+    Keep adding batches of seeded replications until the confidence interval of a
+    KPI is tight enough, or the replication budget is spent.
+
+    For example, ``replicate_until('funds', precision=0.01, confidence=0.95)`` estimates
+    the final funds to within 1% at 95% confidence.
+
+    :param kpi: the KPI whose confidence interval is monitored
+    :param precision: the target half-width of the interval
+    :param relative: whether ``precision`` is relative to the mean of the KPI
+    :param confidence: the confidence level of the interval
+    :param min_replications: the number of replications to run before checking the interval
+    :param max_replications: the most replications to run
+    :param batch_size: the replications to add between checks (defaults to the number of processes)
+    :param until: the simulated time (in hours) each replication runs for
+    :param first_seed: the seed of the first replication, the others follow consecutively
+    :param processes: the number of worker processes, ``1`` runs serially in this process
+    :param antithetic: whether to run antithetic pairs
+    :param config: keyword arguments passed on to :class:`Brewery`
+
+    :type kpi: str
+    :type precision: float
+    :type relative: bool
+    :type confidence: float
+    :type min_replications: int
+    :type max_replications: int
+    :type batch_size: int
+    :type until: float
+    :type first_seed: int
+    :type processes: int
+    :type antithetic: bool
+
+    :return: the per-replication KPIs and their summary, where the summary of the monitored
+             KPI also holds the interval ``half_width``, the ``target`` it had to meet and
+             whether it ``converged``; ``n`` is the number of replications used
+    :rtype: tuple
+
+    """
+    processes = cpu_count() if processes is None else processes
+    batch_size = max(processes, 1) if batch_size is None else batch_size
+    task = partial(run_antithetic_pair if antithetic else run_replication, until=until, **config)
+    pool = Pool(processes=processes) if processes > 1 else None
+
+    results = []
+    next_seed = first_seed
+    half_width, target, converged = float('inf'), float('nan'), False
+    try:
+        while len(results) < max_replications:
+            size = min(max(batch_size, min_replications - len(results)), max_replications - len(results))
+            seeds = list(range(next_seed, next_seed + size))
+            next_seed += size
+            if pool is None:
+                results.extend(task(random_seed) for random_seed in seeds)
+            else:
+                results.extend(pool.map(task, seeds, chunksize=1))
+
+            if len(results) < max(min_replications, 2):
+                continue
+            stats = summarize(results, [kpi])[kpi]
+            half_width = t_quantile(confidence, stats['n'] - 1) * stats['std'] / sqrt(stats['n'])
+            target = precision * abs(stats['mean']) if relative else precision
+            if half_width <= target:
+                converged = True
+                break
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    summary = summarize(results)
+    summary[kpi].update({'half_width': half_width,
+                         'target': target,
+                         'confidence': confidence,
+                         'converged': converged})
+    return results, summary
+
+
+def compare(baseline, alternative, replications=100, until=365*24, seeds=None, processes=None, antithetic=False):
+    """
+    Compare two brewery configurations with common random numbers.
+
+    Both configurations are run with the same seeds, so every stochastic source draws
+    the same variates in both and the paired differences have a much smaller variance
+    than the difference of two independent runs.
+
+    :param baseline: keyword arguments of the baseline :class:`Brewery`
+    :param alternative: keyword arguments of the alternative :class:`Brewery`
+    :param replications: the number of paired replications to run
+    :param until: the simulated time (in hours) each replication runs for
+    :param seeds: the random seeds to use (defaults to ``range(replications)``)
+    :param processes: the number of worker processes
+    :param antithetic: whether to run antithetic pairs
+
+    :type baseline: dict
+    :type alternative: dict
+    :type replications: int
+    :type until: float
+    :type seeds: list
+    :type processes: int
+    :type antithetic: bool
+
+    :return: the per-seed differences (alternative minus baseline) and their summary
+    :rtype: tuple
+
+    """
+    seeds = list(range(replications)) if seeds is None else list(seeds)
+    options = dict(until=until, seeds=seeds, processes=processes, antithetic=antithetic)
+    baseline_results, _ = replicate(**dict(options, **baseline))
+    alternative_results, _ = replicate(**dict(options, **alternative))
+
+    differences = []
+    for base, alt in zip(baseline_results, alternative_results):
+        difference = {kpi: alt[kpi] - base[kpi] for kpi in KPIS}
+        difference['seed'] = base['seed']
+        differences.append(difference)
+    return differences, summarize(differences)
+
+
+def validate_cohorts(replications=50, until=365*24, seeds=None, processes=None, kpi_names=('funds', 'pints_sold', 'stockouts'), **config):
+    """
+    Check the hourly cohort model of the bar against the per-patron model.
+
+    Both models are replicated with the same configuration and seeds. Their draws are
+    not paired, so each KPI is compared by the difference of the means and the 95%
+    confidence interval half-width of that difference.
+
+    Stockouts are not expected to agree exactly: a patron whose pint comes out of a keg
+    that kicks mid-order goes without, while a cohort waits for the keg to be swapped.
+
+    :param replications: the number of replications of each model
+    :param until: the simulated time (in hours) each replication runs for
+    :param seeds: the random seeds to use (defaults to ``range(replications)``)
+    :param processes: the number of worker processes
+    :param kpi_names: the KPIs to compare
+    :param config: keyword arguments of both :class:`Brewery` models
+
+    :type replications: int
+    :type until: float
+    :type seeds: list
+    :type processes: int
+    :type kpi_names: tuple
+
+    :return: the mean of each model, their difference (cohorts minus patrons), its half-width and relative error, by KPI
+    :rtype: dict
+
+    """
+    seeds = list(range(replications)) if seeds is None else list(seeds)
+    options = dict(config, until=until, seeds=seeds, processes=processes)
+    _, patrons = replicate(bar='patrons', **options)
+    _, cohorts = replicate(bar='cohorts', **options)
+
+    validation = {}
+    for kpi in kpi_names:
+        difference = cohorts[kpi]['mean'] - patrons[kpi]['mean']
+        validation[kpi] = {'patrons': patrons[kpi]['mean'],
+                           'cohorts': cohorts[kpi]['mean'],
+                           'difference': difference,
+                           'ci95': sqrt(patrons[kpi]['ci95'] ** 2 + cohorts[kpi]['ci95'] ** 2),
+                           'relative_error': difference / patrons[kpi]['mean'] if patrons[kpi]['mean'] else None}
+    return validation
@@ -0,0 +1,236 @@
+from __future__ import division, print_function
+from zlib import crc32
+import numpy as np
+from numpy.random import SeedSequence, default_rng
+
+
+BLOCK_SIZE = 1024
+MAX_UNIFORM = 1.0 - 2.0 ** -53
+POISSON_TAIL = 1e-15
+
+
+def _poisson_cdf(lam):
+    """ Return the cumulative distribution of a Poisson variate up to a negligible tail. """
+    pmf = [np.exp(-lam)]
+    cdf = [pmf[0]]
+    k = 0
+    while cdf[-1] < 1.0 - POISSON_TAIL and (k < lam or pmf[-1] > POISSON_TAIL):
+        k += 1
+        pmf.append(pmf[-1] * lam / k)
+        cdf.append(cdf[-1] + pmf[-1])
+    return np.array(cdf)
+
+
+class Sampler(object):
+    """
+    A seedable stream of random variates that are generated with NumPy in blocks
+    and handed out one at a time from a buffer.
+
+    It implements the subset of :class:`random.Random` used by the simulation,
+    plus a true Poisson variate, so it can be used wherever an ``rng`` is expected.
+    Every variate is obtained by inverse transform of a uniform, so two streams
+    with the same seed stay synchronized draw for draw (common random numbers)
+    and an antithetic stream mirrors each uniform ``u`` as ``1 - u``.
+
+    :param seed: the seed of the stream
+    :param stream: the name of the stream, each name gets an independent sequence for the same seed
+    :param antithetic: whether to hand out antithetic variates
+    :param block_size: the number of variates generated at a time
+
+    :type seed: int
+    :type stream: str
+    :type antithetic: bool
+    :type block_size: int
+
+    """
+
+    def __init__(self, seed=None, stream=None, antithetic=False, block_size=BLOCK_SIZE):
+        self.stream = stream
+        self.antithetic = antithetic
+        self.block_size = block_size
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        """
+        Reseed the stream and discard any buffered variates.
+
+        :param seed: the new seed
+        :type seed: int
+
+        """
+        if self.stream is None:
+            self._generator = default_rng(seed)
+        else:
+            spawn_key = (crc32(self.stream.encode('utf-8')),)
+            self._generator = default_rng(SeedSequence(seed, spawn_key=spawn_key))
+        self._uniforms = iter(())
+        self._exponentials = iter(())
+        self._poissons = {}
+        self._poisson_cdfs = {}
+
+    def getstate(self):
+        """
+        Return the state of the stream, including its buffered variates, as plain picklable data.
+
+        :rtype: dict
+
+        """
+        uniforms, exponentials = list(self._uniforms), list(self._exponentials)
+        poissons = {lam: list(buffer) for lam, buffer in self._poissons.items()}
+        self._uniforms, self._exponentials = iter(uniforms), iter(exponentials)
+        self._poissons = {lam: iter(buffer) for lam, buffer in poissons.items()}
+        return {'generator': self._generator.bit_generator.state,
+                'uniforms': list(uniforms),
+                'exponentials': list(exponentials),
+                'poissons': {lam: list(buffer) for lam, buffer in poissons.items()}}
+
+    def setstate(self, state):
+        """
+        Restore a state returned by :meth:`getstate`.
+
+        :param state: the state of the stream
+        :type state: dict
+
+        """
+        self._generator.bit_generator.state = state['generator']
+        self._uniforms = iter(list(state['uniforms']))
+        self._exponentials = iter(list(state['exponentials']))
+        self._poissons = {lam: iter(list(buffer)) for lam, buffer in state['poissons'].items()}
+
+    def _block(self):
+        block = self._generator.random(self.block_size)
+        if self.antithetic:
+            block = np.minimum(1.0 - block, MAX_UNIFORM)
+        return block
+
+    def random(self):
+        """
+        Return a uniform variate in [0, 1).
+
+        :rtype: float
+
+        """
+        value = next(self._uniforms, None)
+        if value is None:
+            self._uniforms = iter(self._block().tolist())
+            value = next(self._uniforms)
+        return value
+
+    def uniform(self, a, b):
+        """
+        Return a uniform variate in the interval [a, b).
+
+        :rtype: float
+
+        """
+        return a + (b - a) * self.random()
+
+    def expovariate(self, lambd):
+        """
+        Return an exponential variate with rate ``lambd``.
+
+        :rtype: float
+
+        """
+        value = next(self._exponentials, None)
+        if value is None:
+            self._exponentials = iter((-np.log1p(-self._block())).tolist())
+            value = next(self._exponentials)
+        return value / lambd
+
+    def poisson(self, lam):
+        """
+        Return a Poisson variate with mean ``lam``.
+
+        Each mean gets its own buffer, so streams should use a handful of distinct means.
+
+        :rtype: int
+
+        """
+        buffer = self._poissons.get(lam)
+        value = None if buffer is None else next(buffer, None)
+        if value is None:
+            if lam not in self._poisson_cdfs:
+                self._poisson_cdfs[lam] = _poisson_cdf(lam)
+            cdf = self._poisson_cdfs[lam]
+            counts = np.minimum(np.searchsorted(cdf, self._block(), side='right'), len(cdf) - 1)
+            self._poissons[lam] = iter(counts.tolist())
+            value = next(self._poissons[lam])
+        return value
+
+    def randoms(self, size):
+        """
+        Return an array of uniform variates in [0, 1).
+
+        Vector draws come straight from the generator and do not disturb the buffers.
+
+        :param size: the number of variates
+        :type size: int
+
+        :rtype: :class:`numpy.ndarray`
+
+        """
+        block = self._generator.random(size)
+        if self.antithetic:
+            block = np.minimum(1.0 - block, MAX_UNIFORM)
+        return block
+
+    def uniforms(self, a, b, size):
+        """ Return an array of uniform variates in the interval [a, b). """
+        return a + (b - a) * self.randoms(size)
+
+    def expovariates(self, lambd, size):
+        """ Return an array of exponential variates with rate ``lambd``. """
+        return -np.log1p(-self.randoms(size)) / lambd
+
+    def poissons(self, lam, size):
+        """ Return an array of Poisson variates with mean ``lam``. """
+        if lam not in self._poisson_cdfs:
+            self._poisson_cdfs[lam] = _poisson_cdf(lam)
+        cdf = self._poisson_cdfs[lam]
+        return np.minimum(np.searchsorted(cdf, self.randoms(size), side='right'), len(cdf) - 1)
+
+    def choice(self, seq):
+        """
+        Return a random element from a non-empty sequence.
+
+        """
+        return seq[int(self.random() * len(seq))]
+
+    def sample(self, population, k):
+        """
+        Return ``k`` unique elements chosen from a sequence.
+
+        :rtype: list
+
+        """
+        pool = list(population)
+        for idx in range(k):
+            swap = idx + int(self.random() * (len(pool) - idx))
+            pool[idx], pool[swap] = pool[swap], pool[idx]
+        return pool[:k]
+
+
+class Streams(dict):
+    """
+    The independently seeded random streams of a model, one per stochastic source.
+
+    Scenarios built with the same seed draw the same variates from each stream,
+    so their differences are not buried in sampling noise.
+
+    :param seed: the seed shared by all streams
+    :param names: the names of the streams
+    :param antithetic: whether the streams hand out antithetic variates
+
+    :type seed: int
+    :type names: list
+    :type antithetic: bool
+
+    """
+
+    def __init__(self, seed=None, names=(), antithetic=False):
+        if seed is None:
+            seed = SeedSequence().entropy
+        super(Streams, self).__init__((name, Sampler(seed, stream=name, antithetic=antithetic)) for name in names)
+        self.seed = seed
+        self.antithetic = antithetic
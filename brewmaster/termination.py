@@ -0,0 +1,177 @@
+"""
+Run a brewery a chunk of simulated time at a time, report progress and stop as soon as the run is settled.
+
+Sweeps are full of configurations that go broke in a few weeks or never sell a pint, and
+of configurations whose outcome is clear long before the horizon. Running in chunks lets
+both stop early, with the reason recorded in the result::
+
+    result = run_terminating(1, until=365 * 24, chunk=WEEK,
+                             stop_when=[Insolvent(), NoSales(4), SteadyState('funds')],
+                             num_stored_kegs=2)
+    result['termination'], result['time']
+
+Predicates are called after every chunk with the brewery and the KPIs recorded after each
+chunk so far. They are small classes rather than closures so they can be sent to pool workers.
+
+"""
+from __future__ import division, print_function
+from simpy import Environment
+from .brewery import Brewery
+from .replication import kpis
+
+
+DAY = 24
+WEEK = 7 * 24
+HORIZON = 'horizon'
+
+
+class Insolvent(object):
+    """
+    Stop once the funds of the brewery are at or below a threshold.
+
+    :param threshold: the funds at or below which the brewery is broke
+    :type threshold: float
+
+    """
+    reason = 'insolvent'
+
+    def __init__(self, threshold=0.0):
+        self.threshold = threshold
+
+    def __call__(self, brewery, history):
+        return brewery.funds <= self.threshold
+
+
+class StockoutStreak(object):
+    """
+    Stop once customers were turned down for lack of beer in each of a number of chunks in a row.
+
+    :param chunks: the length of the streak
+    :type chunks: int
+
+    """
+    reason = 'stockout streak'
+
+    def __init__(self, chunks=7):
+        self.chunks = chunks
+
+    def __call__(self, brewery, history):
+        if len(history) <= self.chunks:
+            return False
+        recent = history[-self.chunks - 1:]
+        return all(after['stockouts'] > before['stockouts'] for before, after in zip(recent, recent[1:]))
+
+
+class NoSales(object):
+    """
+    Stop once no pint was sold for a number of chunks in a row, e.g. because no beer is ever on tap.
+
+    :param chunks: the number of chunks without a sale
+    :type chunks: int
+
+    """
+    reason = 'no sales'
+
+    def __init__(self, chunks=4):
+        self.chunks = chunks
+
+    def __call__(self, brewery, history):
+        if len(history) < self.chunks:
+            return False
+        before = history[-self.chunks - 1]['pints_sold'] if len(history) > self.chunks else 0
+        return history[-1]['pints_sold'] == before
+
+
+class SteadyState(object):
+    """
+    Stop once a KPI grows at a steady rate: its mean growth per chunk over the two halves of the
+    last ``chunks`` chunks differs by at most ``tolerance`` of the larger of the two.
+
+    :param kpi: the KPI to watch
+    :param chunks: the number of chunks compared, half against half
+    :param tolerance: the largest relative difference between the growth of the two halves
+    :param warm_up: the number of chunks to skip before watching
+
+    :type kpi: str
+    :type chunks: int
+    :type tolerance: float
+    :type warm_up: int
+
+    """
+    reason = 'steady state'
+
+    def __init__(self, kpi='funds', chunks=8, tolerance=0.05, warm_up=4):
+        self.kpi = kpi
+        self.chunks = chunks
+        self.tolerance = tolerance
+        self.warm_up = warm_up
+
+    def __call__(self, brewery, history):
+        if len(history) < self.warm_up + self.chunks + 1:
+            return False
+        values = [record[self.kpi] for record in history[-self.chunks - 1:]]
+        half = self.chunks // 2
+        first = (values[half] - values[0]) / half
+        second = (values[-1] - values[-half - 1]) / half
+        return abs(second - first) <= self.tolerance * max(abs(first), abs(second))
+
+
+def run_chunked(brewery, until=365*24, chunk=DAY, callbacks=(), stop_when=()):
+    """
+    Run a brewery to a time in chunks, calling back after every chunk and stopping early when a predicate fires.
+
+    :param brewery: the brewery to run
+    :param until: the time to run to if no predicate fires
+    :param chunk: the simulated hours between checks, e.g. :data:`DAY` or :data:`WEEK`
+    :param callbacks: functions called with the brewery and the latest KPIs (with their ``time``) after every chunk
+    :param stop_when: predicates called with the brewery and the KPIs after every chunk so far, in order
+
+    :type brewery: :class:`Brewery`
+    :type until: float
+    :type chunk: float
+    :type callbacks: list
+    :type stop_when: list
+
+    :return: the KPIs of the brewery, the ``time`` it stopped at and the ``termination`` reason,
+             the ``reason`` of the predicate that fired or :data:`HORIZON`
+    :rtype: dict
+    """
+    history = []
+    termination = HORIZON
+    while brewery.now < until and termination == HORIZON:
+        brewery.run(min(until, brewery.now + chunk))
+        history.append(dict(kpis(brewery), time=brewery.now))
+        for callback in callbacks:
+            callback(brewery, history[-1])
+        for predicate in stop_when:
+            if predicate(brewery, history):
+                termination = predicate.reason
+                break
+    result = kpis(brewery)
+    result.update(time=brewery.now, termination=termination)
+    return result
+
+
+def run_terminating(random_seed, until=365*24, chunk=DAY, callbacks=(), stop_when=(), **config):
+    """
+    Build a brewery in its own environment and run it with :func:`run_chunked`, e.g. as a pool task.
+
+    :param random_seed: the seed for this replication
+    :param until: the simulated time (in hours) to run for if no predicate fires
+    :param chunk: the simulated hours between checks
+    :param callbacks: functions called after every chunk, as for :func:`run_chunked`
+    :param stop_when: predicates checked after every chunk, as for :func:`run_chunked`
+    :param config: keyword arguments passed on to :class:`Brewery`
+
+    :type random_seed: int
+    :type until: float
+    :type chunk: float
+    :type callbacks: list
+    :type stop_when: list
+
+    :rtype: dict
+    """
+    brewery = Brewery(env=Environment(), random_seed=random_seed, **config)
+    result = run_chunked(brewery, until, chunk, callbacks, stop_when)
+    result['seed'] = random_seed
+    return result
@@ -1,21 +1,26 @@
 from __future__ import division, print_function
 from warnings import warn
+from six import string_types
 from traceback import print_exc
 try:
     from StringIO import StringIO
 except ImportError:
     from io import StringIO
+from bisect import bisect_left, bisect_right
+from itertools import islice
 from json import load
 from csv import DictReader
-from random import uniform, expovariate
+from os.path import abspath, getmtime
+from .eventlog import EventLog
+from .monitoring import LevelSeries
+from .sampling import Sampler
 from simpy import Environment, Interrupt, Store, FilterStore, Container, Resource, PreemptiveResource, PriorityResource, Event
+from simpy.resources.store import StoreGet, StorePut
 
 
 inf = float('inf')
-TIMESTAMP = '[{:10.1f}]'
-MAX_POISSON = 1000
 
-ENV = Environment()
+_CONFIG_CACHE = {}
 
 
 def check_inputs(beers, prices):
@@ -27,21 +32,86 @@ def check_inputs(beers, prices):
                 raise KeyError('Ingredient {} for beer {} is not listed in prices'.format(ingredient, beer))
 
 
-def poisson(alpha):
-    count = 0
-    total = 0
-    while True and count < MAX_POISSON:
-        count += 1
-        total += expovariate(alpha)
-        if total > 1:
-            return int(count - 1)
-
-
 def json_to_dict(filename):
     with open(filename) as jsonfile:
         return load(jsonfile)
 
 
+def _cached(loader, filename):
+    key = (loader.__name__, abspath(filename))
+    mtime = getmtime(filename)
+    if key not in _CONFIG_CACHE or _CONFIG_CACHE[key][0] != mtime:
+        _CONFIG_CACHE[key] = (mtime, loader(filename))
+    return _CONFIG_CACHE[key][1]
+
+
+class frozen(dict):
+    """
+    A read-only dictionary. Unlike a mapping proxy it can be pickled, so loaded
+    configuration can be passed on to pool workers.
+
+    """
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("{} is read-only".format(type(self).__name__))
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return type(self), (dict(self),)
+
+
+def _parse_beers(filename):
+    beers = {}
+    for name, beer in json_to_dict(filename).items():
+        beer = dict(beer, name=name)
+        beer['ingredients'] = frozen(dict(beer['ingredients']))
+        beers[name] = frozen(beer)
+    return frozen(beers)
+
+
+def _parse_prices(filename):
+    return frozen({item['name']: item['price'] for item in csv_to_dict(filename)})
+
+
+def load_beers(beers_list):
+    """
+    Return the beers in a JSON file as a read-only mapping of read-only recipes.
+
+    Files are parsed once per process and shared between every caller until
+    they change on disk. A mapping that has already been loaded is returned as is.
+
+    :param beers_list: the JSON file, or an already loaded mapping of beers
+    :type beers_list: str or dict
+
+    :rtype: dict
+
+    """
+    if isinstance(beers_list, string_types):
+        return _cached(_parse_beers, beers_list)
+    return beers_list
+
+
+def load_prices(price_list):
+    """
+    Return the prices in a CSV file as a read-only mapping of name to price.
+
+    Files are parsed once per process and shared between every caller until
+    they change on disk. A mapping that has already been loaded is returned as is.
+
+    :param price_list: the CSV file, or an already loaded mapping of prices
+    :type price_list: str or dict
+
+    :rtype: dict
+
+    """
+    if isinstance(price_list, string_types):
+        return _cached(_parse_prices, price_list)
+    return price_list
+
+
 def csv_to_dict(filename, dialect='excel'):
     """
     Reads a CSV file and returns a dictionary of the rows in it.
@@ -92,68 +162,269 @@ class NotifyingStore(Store):
 
 class SelfMonitoringStore(Store):
     """
-    A store that calls an optional callback whenever there is a put/get request.
+    A store that records the number of items it holds (or any other ``item_func``
+    of its items) in a :class:`LevelSeries` whenever a put/get is fulfilled.
 
-    TODO: make the callback happen when the request is fullfilled.
+    :param item_func: the function of the items that is recorded (defaults to ``len``)
+    :param bucket: the width of the downsampling buckets of the series
 
     """
-    def __init__(self, item_func=None, *args, **kwargs):
+    def __init__(self, item_func=None, bucket=None, *args, **kwargs):
         super(SelfMonitoringStore, self).__init__(*args, **kwargs)
         if item_func is None:
             item_func = len
         self.item_func = item_func
-        self._quantities = [(0, self.item_func(self.items))]
+        self.series = LevelSeries(self._env.now, self.item_func(self.items), bucket=bucket)
+
+    def _do_put(self, event):
+        result = super(SelfMonitoringStore, self)._do_put(event)
+        if event.triggered:
+            self.series.record(self._env.now, self.item_func(self.items))
+        return result
+
+    def _do_get(self, event):
+        result = super(SelfMonitoringStore, self)._do_get(event)
+        if event.triggered:
+            self.series.record(self._env.now, self.item_func(self.items))
+        return result
+
+    @property
+    def records(self):
+        times, levels = self.series.steps()
+        return list(zip(times.tolist(), levels.tolist()))
+
+
+class SelfMonitoringFilterStore(SelfMonitoringStore, FilterStore):
+    pass
+
+
+class KegsGet(StoreGet):
+    """
+    Request to take several kegs out of a :class:`KegStore` in one event.
+
+    :param resource: the store
+    :param select: a function of the store that returns the kegs to take, or ``None`` until they are all available
+
+    """
+    def __init__(self, resource, select):
+        self.select = select
+        super(KegsGet, self).__init__(resource)
+
+
+class KegsPut(StorePut):
+    """
+    Request to put several kegs into a :class:`KegStore` in one event, once there is room for all of them.
 
-    def _trigger_put(self, event):
-        super(SelfMonitoringStore, self)._trigger_put(event)
-        self._record('put')
+    :param resource: the store
+    :param kegs: the kegs to put
 
-    def _trigger_get(self, event):
-        super(SelfMonitoringStore, self)._trigger_get(event)
-        self._record('get')
+    """
+    def __init__(self, resource, kegs):
+        super(KegsPut, self).__init__(resource, list(kegs))
+
+
+class KegStore(FilterStore):
+    """
+    A filter store of kegs that keeps an index of its kegs up to date on every
+    put/get and every fill, pour or empty of a keg it holds.
+
+    The index holds the kegs of each beer ordered by amount, the total pints of
+    each beer and the clean kegs, so lookups do not scan the store's items.
+    Kegs can also be moved in bulk with :meth:`get_kegs`, :meth:`get_clean` and
+    :meth:`put_kegs`, which handle a whole batch as a single event.
+
+    """
+    def __init__(self, *args, **kwargs):
+        super(KegStore, self).__init__(*args, **kwargs)
+        self._kegs = {}
+        self._keys = {}
+        self.pints = {}
+        self.clean_kegs = {}
 
     def _do_put(self, event):
-        super(SelfMonitoringStore, self)._do_put(event)
+        if isinstance(event, KegsPut):
+            if len(self.items) + len(event.item) <= self._capacity:
+                self.items.extend(event.item)
+                for keg in event.item:
+                    keg.store = self
+                    self.index(keg)
+                event.succeed()
+            return None
+
+        result = super(KegStore, self)._do_put(event)
         if event.triggered:
-            self._record('put')
+            event.item.store = self
+            self.index(event.item)
+        return result
 
     def _do_get(self, event):
-        super(SelfMonitoringStore, self)._do_get(event)
+        if isinstance(event, KegsGet):
+            kegs = event.select(self)
+            if kegs is not None:
+                taken = set(kegs)
+                self.items[:] = [keg for keg in self.items if keg not in taken]
+                for keg in kegs:
+                    self.unindex(keg)
+                    keg.store = None
+                event.succeed(kegs)
+            return True
+
+        result = super(KegStore, self)._do_get(event)
         if event.triggered:
-            self._record('get')
+            self.unindex(event.value)
+            event.value.store = None
+        return result
+
+    def get_kegs(self, kegs):
+        """
+        Return an event that takes these kegs out of the store at once, as soon as they are all in it.
 
-    def _record(self, call):
-        self._quantities.append((self._env.now, self.item_func(self.items)))
+        :param kegs: the kegs to take
+        :type kegs: list
+
+        :rtype: :class:`KegsGet`
+
+        """
+        kegs = list(kegs)
+        return KegsGet(self, lambda store: kegs if all(keg.store is store for keg in kegs) else None)
+
+    def get_clean(self, number):
+        """
+        Return an event that takes a number of clean kegs out of the store at once, as soon as there are enough.
+
+        :param number: the number of clean kegs to take
+        :type number: int
+
+        :rtype: :class:`KegsGet`
+
+        """
+        return KegsGet(self, lambda store: list(islice(store.clean_kegs, number))
+                       if len(store.clean_kegs) >= number else None)
+
+    def put_kegs(self, kegs):
+        """
+        Return an event that puts these kegs into the store at once, as soon as there is room for all of them.
+
+        :param kegs: the kegs to put
+        :type kegs: list
+
+        :rtype: :class:`KegsPut`
+
+        """
+        return KegsPut(self, kegs)
+
+    def index(self, keg):
+        """ Add a keg to the index. """
+        if keg.clean:
+            self.clean_kegs[keg] = None
+        key = (keg.amount, keg.number)
+        keg.index_key = (keg.name, key)
+        if keg.name is None:
+            return
+        if keg.name not in self._kegs:
+            self._kegs[keg.name] = []
+            self._keys[keg.name] = []
+            self.pints[keg.name] = 0
+        idx = bisect_right(self._keys[keg.name], key)
+        self._keys[keg.name].insert(idx, key)
+        self._kegs[keg.name].insert(idx, keg)
+        self.pints[keg.name] += keg.amount
+
+    def unindex(self, keg):
+        """ Remove a keg from the index, using the state it was indexed with. """
+        self.clean_kegs.pop(keg, None)
+        name, key = keg.index_key
+        if name is None:
+            return
+        keys = self._keys[name]
+        idx = bisect_left(keys, key)
+        del keys[idx]
+        del self._kegs[name][idx]
+        self.pints[name] -= key[0]
+        if not keys:
+            del self._kegs[name], self._keys[name], self.pints[name]
 
     @property
-    def records(self):
-        result = [self._quantities[0]]
-        for idx, record in enumerate(self._quantities[1:]):
-            result.append((record[0], self._quantities[idx][1]))
-            result.append(record)
-        return result
+    def beers(self):
+        """ The beers held in the store (including kegs that were just emptied). """
+        return list(self._kegs)
 
+    def kegs(self, beer):
+        """ Return the kegs of a beer, from the emptiest to the fullest. """
+        return list(self._kegs.get(beer, ()))
 
-class SelfMonitoringFilterStore(FilterStore, SelfMonitoringStore):
+    def find(self, beer):
+        """ Return the emptiest keg of a beer, or ``None``. """
+        kegs = self._kegs.get(beer)
+        return kegs[0] if kegs else None
+
+    def inventory(self, beer):
+        """ Return the pints of a beer held in the store. """
+        return self.pints.get(beer, 0)
+
+
+class SelfMonitoringKegStore(SelfMonitoringStore, KegStore):
     pass
 
 
+class SelfMonitoringContainer(Container):
+    """
+    A container that records its level in a :class:`LevelSeries` whenever a put/get is fulfilled.
+
+    :param bucket: the width of the downsampling buckets of the series
+
+    """
+    def __init__(self, env, capacity=inf, init=0, bucket=None):
+        super(SelfMonitoringContainer, self).__init__(env, capacity=capacity, init=init)
+        self.series = LevelSeries(env.now, init, bucket=bucket)
+
+    def _do_put(self, event):
+        result = super(SelfMonitoringContainer, self)._do_put(event)
+        if event.triggered:
+            self.series.record(self._env.now, self._level)
+        return result
+
+    def _do_get(self, event):
+        result = super(SelfMonitoringContainer, self)._do_get(event)
+        if event.triggered:
+            self.series.record(self._env.now, self._level)
+        return result
+
+
 class SimpyMixin(object):
     """
     A mixin for objects that function inside a simpy environment.
 
     :param env: the simulation environment
+    :param rng: the random number generator used for every draw of this object
+    :param events: the log this object records its events in
+    :param monitoring: whether new containers and stores record their levels by default
+    :param monitor_interval: the width of the buckets levels are downsampled to, ``None`` keeps every change
+    :param profiler: the profiler that counts and times this object's processes, ``None`` disables profiling
 
     :type env: :class:`simpy.Environment`
+    :type rng: :class:`Sampler`
+    :type events: :class:`EventLog`
+    :type monitoring: bool
+    :type monitor_interval: float
+    :type profiler: :class:`Profiler`
 
     """
+    __slots__ = ('env', 'rng', 'events', 'monitoring', 'monitor_interval', 'profiler')
 
-    def __init__(self, env=None, strict=False, **kwargs):
+    def __init__(self, env=None, strict=False, rng=None, events=None, monitoring=False, monitor_interval=None,
+                 profiler=None, **kwargs):
         self.env = env
+        self.rng = Sampler() if rng is None else rng
+        self.events = EventLog() if events is None else events
+        self.monitoring = monitoring
+        self.monitor_interval = monitor_interval
         if self.env is None and not strict:
-            self.env = ENV
-            self._log = []
+            self.env = Environment()
             warn("Creating new environment")
+        self.profiler = profiler
+        if profiler is not None:
+            profiler.attach(self.env)
         super(SimpyMixin, self).__init__()
 
     def run(self, until=365*24):
@@ -177,16 +448,31 @@ class SimpyMixin(object):
         """
         return self.env.now
 
-    def wait(self, time):
+    def duration(self, time, rng=None):
+        """
+        Return a duration. If time is a list of length 2, choose a random time between the interval given.
+
+        :param time: amount of time
+        :param rng: the random stream to draw the time from (defaults to the object's ``rng``)
+        :type time: float or list
+        :type rng: :class:`Sampler`
+
+        :rtype: float
+        """
+        if isinstance(time, list) and len(time) == 2:
+            time = (self.rng if rng is None else rng).uniform(*time)
+        return time
+
+    def wait(self, time, rng=None):
         """
         Return a timeout. If time is a list of length 2, choose a random time between the interval given.
 
         :param time: amount of time to wait
+        :param rng: the random stream to draw the time from (defaults to the object's ``rng``)
         :type time: float or list
+        :type rng: :class:`Sampler`
         """
-        if isinstance(time, list) and len(time) == 2:
-            time = uniform(*time)
-        return self.env.timeout(time)
+        return self.env.timeout(self.duration(time, rng))
 
     def process(self, generator):
         """
@@ -198,21 +484,27 @@ class SimpyMixin(object):
         :rtype: :class:`simpy.Process`
 
         """
+        if self.profiler is not None:
+            return self.profiler.process(self.env, generator)
         return self.env.process(generator)
 
-    def new_container(self, capacity=inf, init=0):
+    def new_container(self, capacity=inf, init=0, monitoring=None):
         """
         Return a new container.
 
         :param capacity: the maximum amount the container can store
         :param init: the initial quantity in the container
+        :param monitoring: whether the container records its level (defaults to :attr:`monitoring`)
 
         :type capacity: float
         :type init: float
+        :type monitoring: bool
 
         :rtype: :class:`simpy.Container`
 
         """
+        if self.monitoring if monitoring is None else monitoring:
+            return SelfMonitoringContainer(self.env, capacity=capacity, init=init, bucket=self.monitor_interval)
         return Container(self.env, capacity=capacity, init=init)
 
     def new_resource(self, capacity=1, kind=None):
@@ -238,26 +530,30 @@ class SimpyMixin(object):
             raise ValueError(
                 'A specialized resource can either be `priority` or `preemptive`.')
 
-    def new_store(self, capacity=inf, kind=None, monitoring=False):
+    def new_store(self, capacity=inf, kind=None, monitoring=None):
         """
         Return a new store.
 
         :param capacity: the maximum number of items the store can hold
-        :param kind: the type of store (options: 'priority', 'filter')
+        :param kind: the type of store (options: 'priority', 'filter', 'keg')
+        :param monitoring: whether the store records its number of items (defaults to :attr:`monitoring`)
 
         :type capacity: int
         :type kind: str
+        :type monitoring: bool
 
         :rtype: :class:`Store`
 
         """
-        if monitoring:
+        if self.monitoring if monitoring is None else monitoring:
             if kind is None:
-                return SelfMonitoringStore(env=self.env, capacity=capacity)
+                return SelfMonitoringStore(env=self.env, capacity=capacity, bucket=self.monitor_interval)
             elif kind== 'priority':
                 return SelfMonitoringPriorityFilterStore(env=self.env, capacity=capacity)
             elif kind == 'filter':
-                return SelfMonitoringFilterStore(env=self.env, capacity=capacity)
+                return SelfMonitoringFilterStore(env=self.env, capacity=capacity, bucket=self.monitor_interval)
+            elif kind == 'keg':
+                return SelfMonitoringKegStore(env=self.env, capacity=capacity, bucket=self.monitor_interval)
         else:
             if kind is None:
                 return Store(env=self.env, capacity=capacity)
@@ -265,8 +561,10 @@ class SimpyMixin(object):
                 return PriorityFilterStore(env=self.env, capacity=capacity)
             elif kind == 'filter':
                 return FilterStore(env=self.env, capacity=capacity)
+            elif kind == 'keg':
+                return KegStore(env=self.env, capacity=capacity)
             else:
-                raise ValueError('A specialized store can either be `priority` or `filter`.')
+                raise ValueError('A specialized store can either be `priority`, `filter` or `keg`.')
 
     def new_event(self):
         """
@@ -277,6 +575,11 @@ class SimpyMixin(object):
         """
         return Event(self.env)
 
-    def log(self, msg):
-        text = getattr(self, 'timestamp', TIMESTAMP) + " - {}"
-        self._log.append(text.format(self.now, msg))
+    def log(self, code, a=0.0, b=0.0, c=0.0, d=0.0):
+        """
+        Record an event in the event log at the current simulation time.
+
+        :param code: the kind of event, as returned by :func:`register_event`
+        :type code: int
+        """
+        self.events.record(self.env.now, code, a, b, c, d)
@@ -1,14 +1,16 @@
 #!/usr/bin/env python
-from pip.req import parse_requirements
-from pip.download import PipSession
+import re
 from setuptools import setup, find_packages
 
 
-install_reqs = parse_requirements('requirements.txt', session=PipSession())
-requirements = [str(ir.req) for ir in install_reqs]
+with open('brewmaster/__init__.py') as init_file:
+    version = re.search(r"^__version__ = ['\"]([^'\"]+)['\"]", init_file.read(), re.MULTILINE).group(1)
+
+with open('requirements.txt') as requirements_file:
+    requirements = [line.strip() for line in requirements_file if line.strip() and not line.startswith('#')]
 
 setup(name='brewmaster',
-      version='0.0.3',
+      version=version,
       description='A model-based framework to assist breweries in optimizing their processes.',
       long_description=open('README.md').read(),
       download_url='https://github.com/sanbales/brewmaster',
@@ -17,8 +19,9 @@ setup(name='brewmaster',
       author_email='sanbales@gmail.com',
       url='https://github.com/sanbales/brewmaster',
       license='MIT',
-      packages=find_packages(),
+      packages=find_packages(exclude=['tests', 'tests.*']),
       install_requires=requirements,
+      python_requires='>=3.9',
       classifiers=['Development Status :: 2 - Pre-Alpha',
                    'License :: OSI Approved :: MIT License',
                    'Natural Language :: English',
@@ -27,8 +30,8 @@ setup(name='brewmaster',
                    'Operating System :: MacOS :: MacOS X',
                    'Operating System :: POSIX :: Linux',
                    'Operating System :: Microsoft :: Windows',
-                   'Programming Language :: Python :: 2.7',
-                   'Programming Language :: Python :: 3.4',
+                   'Programming Language :: Python :: 3',
+                   'Programming Language :: Python :: 3 :: Only',
                    'Topic :: Office/Business'
                    ],
       py_modules=['brewmaster'])
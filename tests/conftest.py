@@ -0,0 +1,11 @@
+import os
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def in_repository(monkeypatch):
+    """ Run every test from the repository root, where the default beers.json and prices.csv live. """
+    monkeypatch.chdir(ROOT)
@@ -0,0 +1,41 @@
+from brewmaster.benchmark import MIN_WALL_TIME, TOLERANCE, regressions
+
+
+def report(*results):
+    return {'results': [dict(result) for result in results]}
+
+
+BASELINE = report({'name': 'year', 'wall_time': 2.0, 'events_per_second': 100000.0, 'peak_rss': 100.0},
+                  {'name': 'quick', 'wall_time': MIN_WALL_TIME / 2, 'events_per_second': 50000.0, 'peak_rss': 80.0})
+
+
+def test_a_slower_run_is_a_regression():
+    found = regressions(report({'name': 'year', 'wall_time': 3.0, 'events_per_second': 60000.0, 'peak_rss': 100.0}),
+                        BASELINE)
+    assert [(entry['name'], entry['measurement']) for entry in found] == [('year', 'wall_time'),
+                                                                          ('year', 'events_per_second')]
+    assert found[0]['baseline'] == 2.0 and found[0]['value'] == 3.0 and found[0]['change'] == 0.5
+    assert found[1]['change'] == 0.4
+
+
+def test_changes_within_tolerance_pass():
+    within = 1 + TOLERANCE / 2
+    assert regressions(report({'name': 'year', 'wall_time': 2.0 * within, 'events_per_second': 100000.0 / within,
+                               'peak_rss': 100.0 * within}), BASELINE) == []
+    assert regressions(report({'name': 'year', 'wall_time': 1.0, 'events_per_second': 200000.0,
+                               'peak_rss': 50.0}), BASELINE) == []
+    assert regressions(report({'name': 'year', 'wall_time': 3.0}), BASELINE, tolerance=0.6) == []
+
+
+def test_missing_measurements_and_scenarios_are_skipped():
+    assert regressions(report({'name': 'year', 'wall_time': 2.0}), BASELINE) == []
+    assert regressions(report({'name': 'new', 'wall_time': 100.0, 'peak_rss': 1e6}), BASELINE) == []
+    baseline = report({'name': 'year', 'wall_time': 2.0, 'events_per_second': 0.0})
+    assert regressions(report({'name': 'year', 'wall_time': 2.0, 'events_per_second': 10.0, 'peak_rss': 500.0}),
+                       baseline) == []
+
+
+def test_only_memory_is_compared_for_quick_runs():
+    found = regressions(report({'name': 'quick', 'wall_time': MIN_WALL_TIME, 'events_per_second': 1000.0,
+                                'peak_rss': 120.0}), BASELINE)
+    assert [(entry['name'], entry['measurement']) for entry in found] == [('quick', 'peak_rss')]
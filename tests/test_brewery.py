@@ -0,0 +1,138 @@
+import logging
+import pytest
+from simpy import Environment
+from brewmaster.brewery import CREDIT_INTERVAL, Brewery
+
+BEER = 'Bridal Veil Pale Ale'
+MALT = 'Brewers Malt 2-Row (Briess)'
+
+
+def dry_brewery(**kwargs):
+    """ A brewery that never sells and orders malt at once, to arrive 5 hours later. """
+    return Brewery(env=Environment(), random_seed=1, log_level=logging.WARNING, num_stored_kegs=1,
+                   num_kegs_per_beer=0, reorder_points={MALT: 1000}, lead_times={MALT: 5}, **kwargs)
+
+
+def test_duplicate_reorders_are_ignored():
+    brewery = dry_brewery(initial_funds=20000)
+    order = brewery.orders[MALT]
+    brewery.reorder(MALT)
+    brewery.reorder(MALT)
+    assert brewery.orders[MALT] is order
+    brewery.env.run(until=24)
+    assert brewery.dry_storage.level(MALT) == 2000
+    assert brewery.funds == 20000 - brewery.prices[MALT] * 1000
+
+
+def test_delivery_is_paid_for_on_arrival():
+    brewery = dry_brewery(initial_funds=20000)
+    brewery.env.run(until=4)
+    assert brewery.funds == 20000
+    assert brewery.dry_storage.level(MALT) == 1000
+    brewery.env.run(until=6)
+    assert brewery.register.level == 20000 - brewery.prices[MALT] * 1000
+    assert brewery.payables == 0
+    assert brewery.dry_storage.level(MALT) == 2000
+    assert not brewery.orders and not brewery.deliveries
+
+
+def test_unfunded_order_is_delivered_and_owed():
+    brewery = dry_brewery(initial_funds=0)
+    brewery.env.run(until=6)
+    cost = brewery.prices[MALT] * 1000
+    assert brewery.dry_storage.level(MALT) == 2000
+    assert not brewery.orders
+    assert brewery.register.level == 0
+    assert brewery.payables == cost
+    assert brewery.funds == -cost
+
+
+def test_revenue_pays_off_what_is_owed_first():
+    brewery = dry_brewery(initial_funds=0)
+    brewery.env.run(until=6)
+    cost = brewery.prices[MALT] * 1000
+    assert brewery.pay_off(cost / 4) == 0
+    assert brewery.payables == cost * 3 / 4
+    assert brewery.pay_off(cost) == cost / 4
+    assert brewery.payables == 0
+
+
+def test_unfunded_brewery_keeps_brewing_and_selling():
+    brewery = Brewery(env=Environment(), random_seed=1, log_level=logging.WARNING, initial_funds=0,
+                      order_quantities={MALT: 5000})
+    brewery.env.run(until=365 * 24)
+    assert brewery.pints_sold > 0
+    assert brewery.funds == brewery.register.level + brewery.unbanked - brewery.payables
+    assert all(due >= brewery.now for _, due in brewery.deliveries.values())
+
+
+@pytest.fixture
+def quiet_bar(tmp_path):
+    """ A brewery whose bar opens on day 1 with its taps stocked but no sales of its own. """
+    sales = tmp_path / 'sales.csv'
+    sales.write_text(u'time,beer,pints\n')
+    brewery = Brewery(env=Environment(), random_seed=1, log_level=logging.WARNING, bar='replay', sales=str(sales))
+    brewery.run(24 + 10.25)
+    return brewery
+
+
+def test_settled_revenue_counts_in_funds_at_once_and_reaches_the_register_at_the_next_credit(quiet_bar):
+    brewery = quiet_bar
+    price = brewery.prices[BEER]
+    register = brewery.register.level
+    assert brewery.settle(BEER, 3) == 3 * price
+    assert brewery.settle([BEER, BEER], [1, 2]) == 3 * price
+    assert brewery.banking is not None
+    assert brewery.funds == register + 6 * price
+    assert brewery.register.level == register and brewery.unbanked == 6 * price
+
+    brewery.run(24 + 10.75)
+    assert brewery.register.level == register
+    brewery.run(24 + 11.5)
+    assert brewery.register.level == register + 6 * price
+    assert brewery.unbanked == 0 and brewery.banking is None
+    assert brewery.funds == register + 6 * price
+
+
+def test_funds_grow_by_the_pints_poured(quiet_bar):
+    brewery = quiet_bar
+    funds = brewery.funds
+    for hour in range(1, 6):
+        brewery.settle(BEER, hour)
+        brewery.run(brewery.now + 0.4)
+    brewery.run(brewery.now + CREDIT_INTERVAL)
+    pours = brewery.pours()
+    assert pours['pints'].sum() == 15 and brewery.stockouts == 0
+    assert brewery.funds == brewery.register.level == funds + pours['pints'].sum() * brewery.prices[BEER]
+
+
+def test_credits_fall_on_credit_interval_boundaries(quiet_bar):
+    brewery = quiet_bar
+    credits = []
+    register_put = brewery.register.put
+
+    def put(amount):
+        credits.append((brewery.now, amount))
+        return register_put(amount)
+
+    brewery.register.put = put
+    for _ in range(6):
+        brewery.settle(BEER, 1)
+        brewery.run(brewery.now + 0.3)
+    brewery.run(brewery.now + CREDIT_INTERVAL)
+    price = brewery.prices[BEER]
+    assert [time % CREDIT_INTERVAL for time, _ in credits] == [0] * len(credits)
+    assert [time for time, _ in credits] == [24 + 11, 24 + 12]
+    assert sum(amount for _, amount in credits) == 6 * price
+
+
+def test_credits_pay_off_what_is_owed_first(quiet_bar):
+    brewery = quiet_bar
+    price = brewery.prices[BEER]
+    register = brewery.register.level
+    brewery.payables = 2 * price
+    brewery.settle(BEER, 5)
+    assert brewery.funds == register + 3 * price
+    brewery.run(24 + 11.5)
+    assert brewery.payables == 0
+    assert brewery.register.level == register + 3 * price
@@ -0,0 +1,96 @@
+import json
+import os
+import shutil
+import pytest
+from brewmaster import brewery, cache, demand
+from brewmaster.cache import ResultCache, result_key
+
+UNTIL = 7 * 24
+
+
+def test_key_is_stable():
+    assert result_key(UNTIL, 1, num_fermenters=2) == result_key(UNTIL, 1, num_fermenters=2)
+
+
+def test_defaults_are_keyed_as_given():
+    assert result_key(UNTIL, 1) == result_key(UNTIL, 1, num_fermenters=1)
+
+
+@pytest.mark.parametrize('changed', [dict(until=UNTIL + 1), dict(random_seed=2), dict(num_fermenters=2),
+                                     dict(tables={4: 2}), dict(tables={2: 4, 4: 10, 6: 4, 10: 1, 8: 4})])
+def test_key_changes_with_the_run(changed):
+    run = dict(until=UNTIL, random_seed=1)
+    assert result_key(**dict(run, **changed)) != result_key(**run)
+
+
+def test_runs_without_a_seed_are_not_keyed():
+    with pytest.raises(ValueError):
+        result_key(UNTIL)
+
+
+def test_key_follows_file_contents_not_names(tmp_path):
+    copy = tmp_path / 'renamed.json'
+    shutil.copy('beers.json', copy)
+    assert result_key(UNTIL, 1, beers_list=str(copy)) == result_key(UNTIL, 1)
+
+    with open('beers.json') as source:
+        beers = json.load(source)
+    beers['Bridal Veil Pale Ale']['mash_time'] = [2, 3]
+    changed = tmp_path / 'changed.json'
+    with open(changed, 'w') as target:
+        json.dump(beers, target)
+    assert result_key(UNTIL, 1, beers_list=str(changed)) != result_key(UNTIL, 1)
+
+
+@pytest.mark.parametrize('module, name', [(brewery, 'TIME_TO_KEG'), (demand, 'SALES_CHUNK_SIZE')])
+def test_key_changes_with_model_constants(monkeypatch, module, name):
+    before = result_key(UNTIL, 1)
+    monkeypatch.setattr(module, name, getattr(module, name) * 2)
+    assert result_key(UNTIL, 1) != before
+
+
+def test_key_changes_with_the_version(monkeypatch):
+    before = result_key(UNTIL, 1)
+    monkeypatch.setattr(cache, '__version__', '0.0.0')
+    assert result_key(UNTIL, 1) != before
+
+
+def test_hits_and_misses(tmp_path):
+    results = ResultCache(str(tmp_path))
+    first = results.run(UNTIL, random_seed=1)
+    second = results.run(UNTIL, random_seed=1)
+    results.run(UNTIL, random_seed=2)
+    assert (results.hits, results.misses) == (1, 2)
+    assert second == first
+
+
+def test_corrupt_results_miss(tmp_path):
+    results = ResultCache(str(tmp_path))
+    key = result_key(UNTIL, 1)
+    with open(results.path(key), 'wb') as stored:
+        stored.write(b'not a pickle')
+    assert results.get(key) is None
+
+
+def test_result_is_kept_when_evicted_after_reading(tmp_path, monkeypatch):
+    results = ResultCache(str(tmp_path))
+    results.put('key', {'funds': 1.0})
+
+    def evicted(path, times):
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(os, 'utime', evicted)
+    assert results.get('key') == {'funds': 1.0}
+
+
+def test_least_recently_used_results_are_evicted(tmp_path):
+    results = ResultCache(str(tmp_path))
+    for idx in range(3):
+        results.put(str(idx), list(range(1000)))
+        os.utime(results.path(str(idx)), (idx, idx))
+    results.get('0')
+    size = os.path.getsize(results.path('0'))
+    results.max_bytes = 2 * size
+    results.evict()
+    assert results.get('1') is None
+    assert results.get('0') is not None and results.get('2') is not None
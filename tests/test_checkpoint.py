@@ -0,0 +1,97 @@
+import pickle
+import pytest
+from simpy import Environment
+from brewmaster.brewery import Brewery
+from brewmaster.checkpoint import fork, warm_up
+from brewmaster.replication import kpis
+
+WARM_UP = 30 * 24
+UNTIL = 90 * 24
+
+
+@pytest.fixture(scope='module')
+def snapshot():
+    return warm_up(WARM_UP, random_seed=1)
+
+
+@pytest.fixture(scope='module')
+def stocked():
+    return warm_up(WARM_UP, random_seed=1, num_stored_kegs=40, num_kegs_per_beer=10)
+
+
+def test_fork_continues_the_run(snapshot):
+    brewery = Brewery(env=Environment(), random_seed=1)
+    brewery.run(UNTIL)
+    forked = fork(snapshot)
+    forked.run(UNTIL)
+    assert kpis(forked) == kpis(brewery)
+
+
+def test_forks_are_independent(snapshot):
+    state = pickle.dumps(snapshot)
+    first = fork(snapshot)
+    first.run(UNTIL)
+    second = fork(pickle.loads(state))
+    second.run(UNTIL)
+    assert kpis(first) == kpis(second)
+    assert pickle.dumps(snapshot) == state
+
+
+def test_fork_with_new_seed_draws_new_streams(snapshot):
+    same = fork(snapshot)
+    same.run(UNTIL)
+    reseeded = fork(snapshot, random_seed=2)
+    reseeded.run(UNTIL)
+    assert kpis(reseeded) != kpis(same)
+
+
+def test_festival_ships_kegs(stocked):
+    festival = fork(stocked)
+    festival.process(festival.ship_kegs('Bridal Veil Pale Ale', 2))
+    festival.run(festival.now + 48)
+    assert festival.kegs_shipped == 2
+
+
+def test_too_small_cellar_is_refused(snapshot):
+    with pytest.raises(ValueError):
+        fork(snapshot, num_stored_kegs=len(snapshot['state']['kegs']) - 1)
+
+
+def test_too_few_taps_are_refused(stocked):
+    on_tap = sum(1 for state in stocked['state']['kegs'] if state['location'] == 'tapped_kegs')
+    assert on_tap
+    with pytest.raises(ValueError):
+        fork(stocked, num_bar_kegs=on_tap - 1)
+
+
+def test_overdue_delivery_arrives_at_once(snapshot):
+    overdue = dict(snapshot, state=dict(snapshot['state']))
+    ingredient = 'Irish Moss'
+    overdue['state']['deliveries'] = {ingredient: [1.0, overdue['state']['time'] - 5]}
+    brewery = fork(overdue)
+    level = brewery.dry_storage.level(ingredient)
+    brewery.run(brewery.now + 1)
+    assert ingredient not in brewery.deliveries
+    assert brewery.dry_storage.level(ingredient) >= level + 1.0
+
+
+def test_fresh_brewery_can_be_checkpointed():
+    brewery = Brewery(env=Environment(), random_seed=1)
+    state = brewery.checkpoint()
+    assert state['bar'] == {'day': 0}
+    forked = Brewery(env=Environment(), random_seed=1, checkpoint=state)
+    forked.run(UNTIL)
+    brewery.run(UNTIL)
+    assert kpis(forked) == kpis(brewery)
+
+
+def test_fork_can_be_checkpointed_before_it_runs(snapshot):
+    forked = fork(snapshot)
+    state = forked.checkpoint()
+    assert state['bar'] == snapshot['state']['bar'] and state['brewing'] == snapshot['state']['brewing']
+    assert [dict(keg, number=None) for keg in state['kegs']] == \
+        [dict(keg, number=None) for keg in snapshot['state']['kegs']]
+    again = fork({'config': snapshot['config'], 'state': forked.checkpoint()})
+    again.run(UNTIL)
+    forked.run(UNTIL)
+    assert kpis(again) == kpis(forked)
@@ -0,0 +1,50 @@
+from simpy import Environment
+from brewmaster.brewery import TABLES, Brewery
+from brewmaster.cohort import Cohort
+from brewmaster.replication import validate_cohorts
+from brewmaster.sampling import Sampler
+
+
+def test_every_party_is_seated_or_turned_away():
+    for parties in (0, 1, 3, 40):
+        cohort = Cohort(Sampler(1, stream='patrons'), parties, 1.0, TABLES)
+        assert cohort.seated + cohort.turned_away == parties
+        assert cohort.pints >= cohort.drinkers >= 0
+        assert all(owed >= 0 for owed in cohort.backlog.values())
+
+
+def test_crowds_are_turned_away_and_leave_a_backlog():
+    cohort = Cohort(Sampler(1, stream='patrons'), 200, 1.0, {4: 1})
+    assert cohort.turned_away > 150
+    assert cohort.backlog[4] > 0
+
+
+def test_table_sizes_are_shared_between_cohorts():
+    table_for = {}
+    Cohort(Sampler(2, stream='patrons'), 30, 1.0, TABLES, table_for=table_for)
+    assert table_for and all(size in TABLES for size in table_for.values())
+
+
+def test_same_stream_gives_the_same_cohort():
+    first = Cohort(Sampler(3, stream='patrons'), 12, 1.0, TABLES, closing=0.5)
+    second = Cohort(Sampler(3, stream='patrons'), 12, 1.0, TABLES, closing=0.5)
+    assert (first.seated, first.pints, first.backlog) == (second.seated, second.pints, second.backlog)
+
+
+def test_dry_taps_count_stockouts_once_per_drinker():
+    brewery = Brewery(env=Environment(), random_seed=1, bar='cohorts', num_kegs_per_beer=0)
+    process = brewery.process(brewery.pour_round(12, drinkers=5))
+    brewery.run(1)
+    assert process.value == 0.0
+    assert brewery.stockouts == 5
+
+
+def test_cohort_runs_report_stockouts_when_the_cellar_runs_dry():
+    brewery = Brewery(env=Environment(), random_seed=1, bar='cohorts')
+    brewery.run(120 * 24)
+    assert brewery.stockouts > 0
+
+
+def test_validation_compares_stockouts():
+    validation = validate_cohorts(replications=2, until=10 * 24, processes=1)
+    assert set(validation) == {'funds', 'pints_sold', 'stockouts'}
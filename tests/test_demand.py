@@ -0,0 +1,93 @@
+import logging
+import numpy as np
+from simpy import Environment
+from brewmaster.brewery import Brewery
+from brewmaster.demand import SalesProfile, iter_sales, read_sales
+from brewmaster.sampling import Sampler
+
+BEER = 'Bridal Veil Pale Ale'
+
+
+def write_sales(path, sales):
+    with open(str(path), 'w') as csvfile:
+        csvfile.write('time,beer,pints\n')
+        for time, beer, pints in sales:
+            csvfile.write('{},{},{}\n'.format(time, beer, pints))
+    return str(path)
+
+
+def test_read_sales_in_chunks(tmp_path):
+    sales = [(1.5 * idx, BEER, idx + 1) for idx in range(5)]
+    chunks = list(read_sales(write_sales(tmp_path / 'sales.csv', sales), chunk_size=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert [sale for chunk in chunks for sale in chunk] == sales
+
+
+def test_timestamps_are_hours_since_the_monday_of_the_first_sale(tmp_path):
+    filename = write_sales(tmp_path / 'sales.csv', [('2024-01-03 10:30:00', BEER, 2),
+                                                   ('2024-01-04 11:00:00', BEER, 1),
+                                                   ('2024-01-08 00:15:00', BEER, 3)])
+    assert [sale[0] for sale in iter_sales(filename)] == [2 * 24 + 10.5, 3 * 24 + 11, 7 * 24 + 0.25]
+
+
+def test_iter_sales_skips_sales_across_chunks(tmp_path):
+    sales = [(float(idx), BEER, 1) for idx in range(7)]
+    filename = write_sales(tmp_path / 'sales.csv', sales)
+    assert list(iter_sales(filename, skip=3, chunk_size=2)) == sales[3:]
+    assert list(iter_sales(filename, skip=10)) == []
+
+
+def test_sales_profile_sums_pints_by_day_and_hour(tmp_path):
+    filename = write_sales(tmp_path / 'sales.csv', [(10.25, 'A', 2), (10.75, 'A', 1), (11.5, 'B', 4),
+                                                   (11.5, 'C', 9), (7 * 24 + 12.0, 'B', 5)])
+    profile = SalesProfile(filename, ['A', 'B'])
+    assert len(profile) == 2 and profile.days == [0, 7]
+    assert profile.pints.shape == (2, 24, 2)
+    assert profile.pints[0, 10].tolist() == [3, 0] and profile.pints[0, 11].tolist() == [0, 4]
+    assert profile.pints[1, 12].tolist() == [0, 5]
+    assert profile.pints.sum() == 12
+    assert profile.weekdays[0] == [0, 1] and profile.weekdays[1] == []
+
+
+def test_sales_profile_draws_the_same_day_of_the_week_if_it_can(tmp_path):
+    filename = write_sales(tmp_path / 'sales.csv', [(10.0, 'A', 1), (24 + 10.0, 'A', 2)])
+    profile = SalesProfile(filename, ['A'])
+    rng = Sampler(1)
+    assert all(profile.draw_day(rng, 1)[10, 0] == 2 for _ in range(10))
+    assert {profile.draw_day(rng, 3)[10, 0] for _ in range(50)} == {1, 2}
+
+
+def test_replayed_pours_match_the_trace(tmp_path):
+    # the bar first opens on day 1, once its taps are stocked
+    day = 24.0
+    filename = write_sales(tmp_path / 'sales.csv', [(day + 3.0, BEER, 2), (day + 10.5, BEER, 1),
+                                                   (day + 11.25, BEER, 3), (day + 12.0, 'Unknown Stout', 4),
+                                                   (day + 15.0, BEER, 2), (2 * day + 11.0, BEER, 1)])
+    brewery = Brewery(env=Environment(), random_seed=1, log_level=logging.WARNING, bar='replay', sales=filename)
+    brewery.run(2 * day)
+    pours = brewery.pours()
+    assert pours['time'].tolist() == [day + 10.0, day + 10.5, day + 11.25, day + 15.0]
+    assert pours['pints'].tolist() == [2, 1, 3, 2]
+    assert (pours['beer'] == brewery.recipes.beer_index[BEER]).all()
+    assert brewery.sales_read == 5 and brewery.stockouts == 0
+    brewery.run(3 * day)
+    assert brewery.pours()['time'].tolist()[-1] == 2 * day + 11.0
+    assert brewery.sales_read == 6
+
+
+def test_resampling_is_reproducible_for_a_seed(tmp_path):
+    sales = [(day * 24 + hour + 0.5, BEER, (day + hour) % 3 + 1)
+             for day in range(28) for hour in range(12, 20)]
+    filename = write_sales(tmp_path / 'sales.csv', sales)
+
+    def resampled(seed):
+        brewery = Brewery(env=Environment(), random_seed=seed, log_level=logging.WARNING, bar='resample',
+                          sales=filename)
+        brewery.run(14 * 24)
+        return brewery.pours()
+
+    first, again, other = resampled(1), resampled(1), resampled(2)
+    for name in first:
+        np.testing.assert_array_equal(first[name], again[name])
+    assert first['time'].tolist() != other['time'].tolist() or first['pints'].tolist() != other['pints'].tolist()
+    assert first['time'].size and (first['time'] % 1 == 0).all()
@@ -0,0 +1,74 @@
+from logging import DEBUG, INFO, WARNING
+from brewmaster.eventlog import EventLog, register_event
+
+NOTED = register_event(DEBUG, 'Noted {:.0f}')
+POURED = register_event(INFO, 'Poured {:.0f} pints of {}', names=(1,))
+RAN_OUT = register_event(WARNING, 'Ran out of {}', names=(0,))
+
+
+def record_all(log):
+    log.record(1.0, NOTED, 1)
+    log.record(2.0, POURED, 3, 'Stout')
+    log.record(3.0, RAN_OUT, 'Pale')
+
+
+def test_events_below_the_level_are_dropped():
+    for level, codes in [(DEBUG, [NOTED, POURED, RAN_OUT]), (INFO, [POURED, RAN_OUT]), (WARNING, [RAN_OUT])]:
+        log = EventLog(level=level)
+        record_all(log)
+        assert [code for _, code, _ in log] == codes
+        assert len(log) == log.recorded == len(codes)
+    log = EventLog(level=INFO)
+    assert not log.enabled(NOTED) and log.enabled(POURED) and log.enabled(RAN_OUT)
+
+
+def test_names_are_interned_and_rendered():
+    log = EventLog(level=DEBUG)
+    record_all(log)
+    log.record(4.0, POURED, 2, 'Stout')
+    assert log.names == ['Stout', 'Pale']
+    assert list(log)[1] == (2.0, POURED, [3.0, 'Stout', 0.0, 0.0])
+    assert log.render() == ['[       1.0] - Noted 1', '[       2.0] - Poured 3 pints of Stout',
+                            '[       3.0] - Ran out of Pale', '[       4.0] - Poured 2 pints of Stout']
+    assert log.render(WARNING) == ['[       3.0] - Ran out of Pale']
+
+
+def test_ring_buffer_keeps_the_latest_events_in_order():
+    log = EventLog(level=DEBUG, capacity=4)
+    for idx in range(3):
+        log.record(float(idx), NOTED, idx)
+    assert len(log) == 3
+    assert log.arrays()['time'].tolist() == [0.0, 1.0, 2.0]
+
+    for idx in range(3, 10):
+        log.record(float(idx), NOTED, idx)
+    assert log.recorded == 10 and len(log) == 4
+    arrays = log.arrays()
+    assert arrays['time'].tolist() == [6.0, 7.0, 8.0, 9.0]
+    assert arrays['a'].tolist() == [6.0, 7.0, 8.0, 9.0]
+    assert [time for time, _, _ in log] == [6.0, 7.0, 8.0, 9.0]
+
+
+def test_ring_buffer_wraps_exactly_at_capacity():
+    log = EventLog(level=DEBUG, capacity=3)
+    for idx in range(3):
+        log.record(float(idx), NOTED, idx)
+    assert log.arrays()['time'].tolist() == [0.0, 1.0, 2.0]
+    log.record(3.0, POURED, 1, 'Stout')
+    assert log.arrays()['time'].tolist() == [1.0, 2.0, 3.0]
+    assert [code for _, code, _ in log] == [NOTED, NOTED, POURED]
+
+
+def test_dropped_events_do_not_overwrite_the_ring_buffer():
+    log = EventLog(level=WARNING, capacity=2)
+    log.record(1.0, RAN_OUT, 'Pale')
+    for idx in range(5):
+        log.record(2.0 + idx, POURED, 1, 'Stout')
+    assert log.recorded == 1 and list(log) == [(1.0, RAN_OUT, ['Pale', 0.0, 0.0, 0.0])]
+
+
+def test_clear_discards_the_events():
+    log = EventLog(level=DEBUG, capacity=2)
+    record_all(log)
+    log.clear()
+    assert len(log) == 0 and list(log) == []
@@ -0,0 +1,104 @@
+import os
+from logging import WARNING
+import numpy as np
+import pytest
+from simpy import Environment
+from brewmaster import export
+from brewmaster.brewery import Brewery
+from brewmaster.export import RunReader, RunWriter, append_column, run_outputs, truncate_column
+
+UNTIL = 14 * 24
+
+
+def outputs(seed, **config):
+    brewery = Brewery(env=Environment(), random_seed=seed, **config)
+    brewery.run(UNTIL)
+    return run_outputs(brewery, seed=seed)
+
+
+@pytest.fixture(scope='module')
+def runs():
+    return [outputs(seed, monitoring=True) for seed in range(3)]
+
+
+def test_columns_grow_and_shrink(tmp_path):
+    column = str(tmp_path / 'column.npy')
+    assert append_column(column, [1.0, 2.0]) == 2
+    assert append_column(column, [3.0]) == 3
+    assert np.load(column).tolist() == [1.0, 2.0, 3.0]
+    truncate_column(column, 1)
+    assert np.load(column).tolist() == [1.0]
+    assert append_column(column, [4.0]) == 2
+    assert np.load(column).tolist() == [1.0, 4.0]
+
+
+def test_pours_do_not_depend_on_the_event_log():
+    logged = outputs(1)
+    quiet = outputs(1, log_level=WARNING, log_capacity=10)
+    assert quiet['kpis']['pints_sold'] == logged['kpis']['pints_sold'] > 0
+    assert quiet['sales']['pints'].sum() == quiet['kpis']['pints_sold']
+    assert quiet['sales']['beer'] == logged['sales']['beer']
+    assert np.array_equal(quiet['sales']['time'], logged['sales']['time'])
+
+
+def assert_stored(store, runs):
+    assert len(store) == len(runs)
+    assert store.kpis['seed'].tolist() == [run['kpis']['seed'] for run in runs]
+    for idx, run in enumerate(runs):
+        sales = store.sales(idx)
+        assert np.array_equal(sales['time'], run['sales']['time'])
+        assert [store.beers[beer] for beer in sales['beer']] == run['sales']['beer']
+        times, levels = store.series('cellar', idx)
+        assert np.array_equal(times, run['series']['cellar'][0])
+        assert np.array_equal(levels, run['series']['cellar'][1])
+
+
+def test_round_trip(tmp_path, runs):
+    writer = RunWriter(str(tmp_path))
+    for run in runs:
+        writer.append(run)
+    assert_stored(RunReader(str(tmp_path)), runs)
+
+
+def test_appending_to_an_existing_store(tmp_path, runs):
+    RunWriter(str(tmp_path)).append(runs[0])
+    writer = RunWriter(str(tmp_path))
+    for run in runs[1:]:
+        writer.append(run)
+    assert_stored(RunReader(str(tmp_path)), runs)
+
+
+def test_crash_before_the_manifest_is_replaced(tmp_path, runs, monkeypatch):
+    RunWriter(str(tmp_path)).append(runs[0])
+
+    def crash(source, target):
+        raise OSError("crashed")
+
+    monkeypatch.setattr(export.os, 'replace', crash)
+    with pytest.raises(OSError):
+        RunWriter(str(tmp_path)).append(runs[1])
+    monkeypatch.undo()
+
+    assert_stored(RunReader(str(tmp_path)), runs[:1])
+    RunWriter(str(tmp_path)).append(runs[2])
+    assert_stored(RunReader(str(tmp_path)), [runs[0], runs[2]])
+
+
+def test_writer_recovers_from_leftovers_of_a_dead_writer(tmp_path, runs):
+    RunWriter(str(tmp_path)).append(runs[0])
+    # a writer killed part way through its columns leaves them longer than the manifest
+    append_column(os.path.join(str(tmp_path), 'sales', 'time.npy'), runs[1]['sales']['time'])
+    append_column(os.path.join(str(tmp_path), 'series', 'new', 'time.npy'), [0.0, 1.0])
+    writer = RunWriter(str(tmp_path))
+    writer.append(runs[2])
+    assert_stored(RunReader(str(tmp_path)), [runs[0], runs[2]])
+    assert len(np.load(os.path.join(str(tmp_path), 'series', 'new', 'time.npy'))) == 0
+
+
+def test_kpis_must_match(tmp_path, runs):
+    writer = RunWriter(str(tmp_path))
+    writer.append(runs[0])
+    with pytest.raises(ValueError):
+        writer.append(dict(runs[1], kpis={'funds': 0.0}))
+    writer.append(runs[1])
+    assert_stored(RunReader(str(tmp_path)), runs[:2])
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import pytest
+from brewmaster.feed import DAY, stream_kpis
+
+
+def collect(runs, until, limit=None, **options):
+    async def consume():
+        records = []
+        stream = stream_kpis(runs, until=until, **options)
+        try:
+            async for name, record in stream:
+                records.append((name, record))
+                if limit is not None and len(records) >= limit:
+                    break
+        finally:
+            await stream.aclose()
+        return records
+
+    return asyncio.run(consume())
+
+
+def test_each_run_reports_every_day_in_order():
+    records = collect({'a': {'random_seed': 1}, 'b': {'random_seed': 2}}, until=5 * DAY)
+    for name in ('a', 'b'):
+        days = [record['day'] for run, record in records if run == name]
+        assert days == list(range(5))
+        times = [record['time'] for run, record in records if run == name]
+        assert times == [DAY * (day + 1) for day in range(5)]
+
+
+def test_records_cover_sales_and_vessels():
+    records = collect([{'random_seed': 1}], until=5 * DAY)
+    revenue = sum(record['revenue'] for _, record in records)
+    assert revenue > 0
+    assert all(set(record['vessel_occupancy']) == {'mash_tuns', 'cooper_tanks', 'fermenters', 'conditioners'}
+               for _, record in records)
+
+
+def test_closing_early_stops_the_runs():
+    before = threading.active_count()
+    records = collect([{'random_seed': seed} for seed in range(4)], until=365 * DAY, limit=3, buffer=2)
+    assert len(records) == 3
+    assert threading.active_count() <= before + 1
+
+
+def test_event_loop_keeps_running_while_the_feed_shuts_down():
+    async def consume():
+        ticks = []
+
+        async def tick():
+            while True:
+                ticks.append(None)
+                await asyncio.sleep(0)
+
+        ticker = asyncio.ensure_future(tick())
+        stream = stream_kpis([{'random_seed': 1}], until=365 * DAY)
+        await stream.__anext__()
+        await asyncio.sleep(0)
+        before = len(ticks)
+        await stream.aclose()
+        ticker.cancel()
+        return len(ticks) - before
+
+    assert asyncio.run(consume()) > 0
+
+
+def test_errors_reach_the_consumer():
+    with pytest.raises(ValueError):
+        collect([{'random_seed': 1, 'bar': 'replay'}], until=DAY)
+
+
+def test_worker_processes():
+    records = collect({'a': {'random_seed': 1}}, until=2 * DAY, processes=1)
+    assert [record['day'] for _, record in records] == [0, 1]
@@ -0,0 +1,63 @@
+import pytest
+from brewmaster import investment
+from brewmaster.investment import _clearly_worse, candidates, optimize
+
+
+@pytest.fixture
+def runs(monkeypatch):
+    """ Replace the simulation with a profit of 100 per unit of ``x`` less capital, recording the seeds of each ``x``. """
+    seeds = {}
+
+    def simulate_profit(task, until, initial_funds):
+        config, capital, random_seed = task
+        seeds.setdefault(config['x'], []).append(random_seed)
+        profit = 100.0 * config['x'] + 10.0 * (random_seed % 2)
+        if config.get('noisy') == config['x']:
+            profit += 1000.0 if random_seed % 2 else -1000.0
+        return profit - capital
+
+    monkeypatch.setattr(investment, '_simulate_profit', simulate_profit)
+    return seeds
+
+
+def test_candidates_cover_every_combination():
+    assert candidates({'a': [1, 2], 'b': [3]}) == [{'a': 1, 'b': 3}, {'a': 2, 'b': 3}]
+
+
+def test_clearly_worse_needs_a_significant_difference():
+    leader = {'profits': [100.0, 110.0, 100.0, 110.0]}
+    assert _clearly_worse({'profits': [90.0, 100.0, 90.0, 100.0]}, leader)
+    assert not _clearly_worse({'profits': [90.0, 120.0, 90.0, 118.0]}, leader)
+    assert not _clearly_worse({'profits': [100.0, 110.0, 100.0, 110.0]}, leader)
+    assert not _clearly_worse({'profits': [0.0]}, {'profits': [100.0]})
+
+
+def test_successive_halving_drops_the_worse_half_each_round(runs):
+    best, ranking = optimize({'x': [1, 2, 3, 4]}, first_replications=4, max_replications=64, processes=1)
+    assert best == {'x': 4}
+    assert [candidate['option']['x'] for candidate in ranking] == [4, 3, 2, 1]
+    assert [candidate['round'] for candidate in ranking] == [None, 1, 0, 0]
+    assert [candidate['replications'] for candidate in ranking] == [16, 8, 4, 4]
+    assert [candidate['profit'] for candidate in ranking] == [405.0, 305.0, 205.0, 105.0]
+
+
+def test_every_replication_runs_once_on_shared_seeds(runs):
+    _, ranking = optimize({'x': [1, 2, 3, 4]}, first_replications=4, max_replications=64, processes=1)
+    for candidate in ranking:
+        assert runs[candidate['option']['x']] == list(range(candidate['replications']))
+
+
+def test_candidates_not_clearly_worse_survive(runs):
+    best, ranking = optimize({'x': [1, 2, 3, 4]}, first_replications=4, max_replications=16, processes=1,
+                             noisy=1)
+    assert best == {'x': 4}
+    assert [candidate['option']['x'] for candidate in ranking] == [4, 3, 1, 2]
+    assert [candidate['round'] for candidate in ranking] == [None, None, None, 0]
+    assert [candidate['replications'] for candidate in ranking] == [16, 16, 16, 4]
+
+
+def test_capital_cost_is_taken_off_the_profit(runs):
+    best, ranking = optimize({'x': [1, 2]}, first_replications=2, max_replications=2, processes=1,
+                             unit_costs={'x': 150.0}, owned={'x': 1})
+    assert best == {'x': 1}
+    assert [candidate['profit'] for candidate in ranking] == [105.0, 205.0 - 150.0]
@@ -0,0 +1,130 @@
+import pytest
+from simpy import Environment
+from brewmaster.keg import PINTS_PER_KEG, Cooperage, Keg
+from brewmaster.util import KegStore, SelfMonitoringKegStore
+
+
+@pytest.fixture
+def env():
+    return Environment()
+
+
+def make_kegs(env, beers, cooperage=None):
+    cooperage = Cooperage(env=env) if cooperage is None else cooperage
+    kegs = []
+    for beer in beers:
+        keg = Keg(cooperage=cooperage, env=env)
+        if beer is not None:
+            keg.fill(beer)
+        kegs.append(keg)
+    return kegs
+
+
+def stocked_store(env, beers, capacity=float('inf'), kind=KegStore):
+    store = kind(env=env, capacity=capacity)
+    kegs = make_kegs(env, beers)
+    for keg in kegs:
+        store.put(keg)
+    env.run()
+    return store, kegs
+
+
+def assert_index_matches_items(store):
+    """ The index must describe exactly the kegs held, whatever happened to them. """
+    for beer in set(keg.name for keg in store.items if keg.name is not None) | set(store.beers):
+        held = [keg for keg in store.items if keg.name == beer]
+        assert sorted(store.kegs(beer), key=lambda keg: keg.number) == sorted(held, key=lambda keg: keg.number)
+        amounts = [keg.amount for keg in store.kegs(beer)]
+        assert amounts == sorted(amounts)
+        assert store.inventory(beer) == sum(keg.amount for keg in held)
+    assert set(store.clean_kegs) == set(keg for keg in store.items if keg.clean)
+    assert all(keg.store is store for keg in store.items)
+
+
+def test_index_tracks_puts_and_pours(env):
+    store, kegs = stocked_store(env, ['Stout', 'Stout', 'Pale', None])
+    assert store.inventory('Stout') == 2 * PINTS_PER_KEG
+    kegs[1].draw(10)
+    assert store.find('Stout') is kegs[1]
+    kegs[0].draw(PINTS_PER_KEG)
+    kegs[0].empty()
+    assert store.kegs('Stout') == [kegs[1]]
+    assert set(store.clean_kegs) == {kegs[0], kegs[3]}
+    kegs[3].fill('Pale', 50)
+    assert store.find('Pale') is kegs[3]
+    assert_index_matches_items(store)
+
+
+def test_keg_outside_a_store_is_not_indexed(env):
+    store, kegs = stocked_store(env, ['Stout'])
+    store.get_kegs(kegs)
+    env.run()
+    assert kegs[0].store is None
+    kegs[0].draw(5)
+    assert store.inventory('Stout') == 0
+    assert_index_matches_items(store)
+
+
+def test_bulk_get_takes_all_kegs_in_one_event(env):
+    store, kegs = stocked_store(env, ['Stout', 'Pale', 'Pale', None])
+    taken = store.get_kegs(kegs[1:3])
+    env.run()
+    assert taken.value == kegs[1:3]
+    assert store.items == [kegs[0], kegs[3]]
+    assert store.inventory('Pale') == 0
+    assert_index_matches_items(store)
+
+
+def test_bulk_get_waits_until_every_keg_is_in_the_store(env):
+    store, kegs = stocked_store(env, ['Stout'])
+    late = make_kegs(env, ['Pale'])[0]
+    taken = store.get_kegs([kegs[0], late])
+    env.run()
+    assert not taken.triggered and kegs[0].store is store
+    store.put(late)
+    env.run()
+    assert taken.value == [kegs[0], late]
+    assert store.items == []
+
+
+def test_get_clean_waits_for_enough_clean_kegs(env):
+    store, kegs = stocked_store(env, [None, 'Stout'])
+    taken = store.get_clean(2)
+    env.run()
+    assert not taken.triggered
+    returned = make_kegs(env, [None])[0]
+    store.put(returned)
+    env.run()
+    assert sorted(taken.value, key=lambda keg: keg.number) == [kegs[0], returned]
+    assert store.items == [kegs[1]]
+    assert_index_matches_items(store)
+
+
+def test_bulk_put_waits_for_room_for_the_whole_batch(env):
+    store, kegs = stocked_store(env, ['Stout'], capacity=2)
+    batch = make_kegs(env, ['Pale', 'Pale'])
+    put = store.put_kegs(batch)
+    env.run()
+    assert not put.triggered and len(store.items) == 1
+    store.get_kegs(kegs)
+    env.run()
+    assert put.triggered
+    assert store.items == batch
+    assert store.inventory('Pale') == 2 * PINTS_PER_KEG
+    assert_index_matches_items(store)
+
+
+def test_monitored_store_records_bulk_moves(env):
+    store, kegs = stocked_store(env, ['Stout', 'Stout', 'Pale'], kind=SelfMonitoringKegStore)
+    store.get_kegs(kegs[:2])
+    env.run()
+    assert store.series.levels[-1] == 1
+    assert_index_matches_items(store)
+
+
+def test_overfilling_or_overdrawing_a_keg_fails(env):
+    keg = make_kegs(env, ['Stout'])[0]
+    with pytest.raises(ValueError):
+        keg.fill('Stout', 1)
+    with pytest.raises(ValueError):
+        keg.draw(PINTS_PER_KEG + 1)
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from brewmaster.monitoring import INITIAL_SIZE, LevelSeries
+
+
+def random_walk(seed, size=500):
+    rng = np.random.RandomState(seed)
+    times = np.cumsum(rng.exponential(0.3, size))
+    levels = np.cumsum(rng.randint(-5, 6, size)).astype(float)
+    return times, levels
+
+
+def test_full_resolution_keeps_every_change():
+    times, levels = random_walk(1)
+    series = LevelSeries(0.0, 0.0)
+    for time, level in zip(times, levels):
+        series.record(time, level)
+    assert len(series) == len(times) + 1 > INITIAL_SIZE
+    assert series.times.tolist() == [0.0] + times.tolist()
+    assert series.levels.tolist() == [0.0] + levels.tolist()
+    assert series.minimum.tolist() == series.maximum.tolist() == series.levels.tolist()
+
+
+def test_changes_at_the_same_time_collapse():
+    series = LevelSeries(0.0, 5.0)
+    series.record(1.0, 3.0)
+    series.record(1.0, 4.0)
+    assert series.times.tolist() == [0.0, 1.0] and series.levels.tolist() == [5.0, 4.0]
+
+
+@pytest.mark.parametrize('bucket', [0.5, 1.0, 24.0])
+def test_buckets_hold_the_min_max_and_last_of_the_full_series(bucket):
+    times, levels = random_walk(2)
+    full = LevelSeries(0.0, 0.0)
+    downsampled = LevelSeries(0.0, 0.0, bucket=bucket)
+    for time, level in zip(times, levels):
+        full.record(time, level)
+        downsampled.record(time, level)
+
+    starts = (full.times // bucket) * bucket
+    expected_times = np.unique(starts)
+    assert downsampled.times.tolist() == expected_times.tolist()
+    for idx, start in enumerate(expected_times):
+        inside = np.flatnonzero(starts == start)
+        # the level held when the bucket starts counts too
+        held = full.levels[max(0, inside[0] - 1):inside[-1] + 1]
+        assert downsampled.levels[idx] == full.levels[inside[-1]]
+        assert downsampled.minimum[idx] == held.min()
+        assert downsampled.maximum[idx] == held.max()
+
+
+def test_bucket_extremes_include_changes_at_the_same_time():
+    series = LevelSeries(0.0, 5.0, bucket=1.0)
+    series.record(1.5, 9.0)
+    series.record(1.5, 2.0)
+    series.record(1.75, 6.0)
+    assert series.times.tolist() == [0.0, 1.0]
+    assert series.minimum.tolist() == [5.0, 2.0]
+    assert series.maximum.tolist() == [5.0, 9.0]
+    assert series.levels.tolist() == [5.0, 6.0]
+
+
+def test_steps_trace_the_step_function():
+    series = LevelSeries(0.0, 1.0)
+    series.record(2.0, 3.0)
+    series.record(5.0, 0.0)
+    times, levels = series.steps()
+    assert times.tolist() == [0.0, 2.0, 2.0, 5.0, 5.0]
+    assert levels.tolist() == [1.0, 1.0, 3.0, 3.0, 0.0]
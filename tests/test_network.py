@@ -0,0 +1,42 @@
+from brewmaster.network import Account, Network
+
+UNTIL = 30 * 24
+BEER = 'Bridal Veil Pale Ale'
+
+
+def accounts(count=4):
+    return [Account('bar {}'.format(idx), demand=2) for idx in range(count)]
+
+
+def test_results_do_not_depend_on_partitioning():
+    with Network(accounts(), processes=0, random_seed=1) as serial:
+        serial.run(UNTIL)
+    with Network(accounts(), processes=2, random_seed=1) as parallel:
+        parallel.run(UNTIL)
+    assert parallel.kpis() == serial.kpis()
+
+
+def test_context_manager_stops_workers():
+    with Network(accounts(), processes=2, random_seed=1) as network:
+        workers = list(network.workers)
+        assert all(worker.is_alive() for worker in workers)
+    assert not any(worker.is_alive() for worker in workers)
+    assert network.workers == []
+
+
+def test_close_survives_dead_workers():
+    network = Network(accounts(), processes=2, random_seed=1)
+    network.workers[0].terminate()
+    network.workers[0].join()
+    network.close()
+    network.close()
+
+
+def test_accounts_are_credited_the_pints_in_the_keg():
+    network = Network([Account('bar', demand=1)], processes=0, random_seed=1)
+    for keg in network.brewery.cellar.kegs(BEER):
+        keg.draw(keg.amount / 2)
+    shipped = network.ship_orders()[0]['bar'][BEER]
+    assert shipped
+    for number, pints in shipped:
+        assert pints == network.kegs_out[number].amount < network.kegs_out[number].capacity
@@ -0,0 +1,64 @@
+import logging
+from simpy import Container, Environment
+from brewmaster.brewery import Brewery
+from brewmaster.profiling import OUTSIDE, Profiler
+from brewmaster.replication import kpis
+
+
+def fill(env, container, times):
+    for _ in range(times):
+        yield env.timeout(1)
+        yield container.put(1)
+
+
+def test_processes_and_stores_are_counted():
+    env = Environment()
+    profiler = Profiler()
+    profiler.attach(env)
+    container = Container(env)
+    profiler.watch(container, 'container')
+    profiler.process(env, fill(env, container, 3))
+    profiler.process(env, fill(env, container, 2))
+    env.run()
+
+    stats = profiler.processes['fill']
+    assert stats['started'] == 2
+    # one step per yield and one to finish
+    assert stats['steps'] == (2 * 3 + 1) + (2 * 2 + 1)
+    # a timeout and a put per round, and the end of the process
+    assert stats['scheduled'] == (2 * 3 + 1) + (2 * 2 + 1)
+    # the start of each process is scheduled from outside any process
+    assert profiler.processes[OUTSIDE]['scheduled'] == 2
+    assert profiler.stores['container']['puts'] == 5 and profiler.stores['container']['gets'] == 0
+    assert container.level == 5
+
+
+def test_attaching_twice_counts_once():
+    env = Environment()
+    profiler = Profiler()
+    profiler.attach(env)
+    profiler.attach(env)
+    profiler.process(env, fill(env, Container(env), 1))
+    env.run()
+    assert profiler.processes['fill']['scheduled'] == 3
+
+
+def test_brewery_processes_are_counted_by_type():
+    brewery = Brewery(env=Environment(), random_seed=1, log_level=logging.WARNING, profile=True)
+    brewery.run(30 * 24)
+    processes = brewery.profiler.processes
+    assert processes['Patron.consume']['started'] == brewery.parties_arrived > 0
+    assert processes['Brewery.run_bar']['started'] == processes['Brewery.run_brewery']['started'] == 1
+    assert all(stats['steps'] >= stats['started'] for stats in processes.values())
+    assert brewery.profiler.stores['cellar']['gets'] > 0
+    assert 'Patron.consume' in brewery.profiler.report()
+
+
+def test_profiling_does_not_change_the_run():
+    profiled = Brewery(env=Environment(), random_seed=1, log_level=logging.WARNING, profile=True)
+    profiled.run(60 * 24)
+    plain = Brewery(env=Environment(), random_seed=1, log_level=logging.WARNING)
+    plain.run(60 * 24)
+    assert plain.profiler is None
+    assert kpis(profiled) == kpis(plain)
+    assert profiled.pours()['time'].tolist() == plain.pours()['time'].tolist()
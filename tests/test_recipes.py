@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from simpy import Environment
+from brewmaster.recipes import DryStorage, RecipeMatrix
+
+BEERS = {'Pale': {'ingredients': {'malt': 10.0, 'hops': 1.0}},
+         'Stout': {'ingredients': {'malt': 12.0, 'barley': 3.0}}}
+
+
+@pytest.fixture
+def recipes():
+    return RecipeMatrix(BEERS)
+
+
+def test_recipe_matrix_has_a_row_per_beer_and_a_column_per_ingredient(recipes):
+    assert recipes.names == ['Pale', 'Stout'] and len(recipes) == 2
+    assert recipes.ingredients == ['malt', 'hops', 'barley']
+    assert recipes.matrix.tolist() == [[10.0, 1.0, 0.0], [12.0, 0.0, 3.0]]
+    assert recipes.recipe('Stout').tolist() == [12.0, 0.0, 3.0]
+
+
+def test_feasible_scales_with_the_batch(recipes):
+    levels = np.array([24.0, 1.0, 6.0])
+    assert recipes.feasible(levels).tolist() == [True, True]
+    assert recipes.feasible(levels, kegs=2).tolist() == [False, True]
+    assert recipes.feasible(levels, kegs=3).tolist() == [False, False]
+
+
+def test_draw_consumes_the_recipe_of_the_batch(recipes):
+    storage = DryStorage(recipes, init=50)
+    assert storage.draw('Stout', kegs=2) == []
+    assert storage.levels.tolist() == [26.0, 50.0, 44.0]
+    assert storage.draw('Pale') == []
+    assert storage.level('malt') == 16.0 and storage.level('hops') == 49.0
+    assert storage.feasible(kegs=1).tolist() == [True, True]
+    assert storage.feasible(kegs=2).tolist() == [False, False]
+
+
+def test_draw_reports_ingredients_at_their_reorder_point(recipes):
+    storage = DryStorage(recipes, init=30)
+    storage.reorder_points[:] = [10.0, 29.0, 30.0]
+    assert storage.draw('Pale', kegs=2) == ['malt', 'hops']
+    assert storage.draw('Stout', kegs=0) == []
+
+
+def test_running_short_leaves_storage_untouched(recipes):
+    storage = DryStorage(recipes, init=20)
+    with pytest.raises(ValueError):
+        storage.draw('Stout', kegs=2)
+    assert storage.levels.tolist() == [20.0, 20.0, 20.0]
+    assert storage.draw('Pale', kegs=2) == ['malt']
+    with pytest.raises(ValueError):
+        storage.draw('Pale')
+    assert storage.levels.tolist() == [0.0, 18.0, 20.0]
+
+
+def test_stock_adds_a_delivery(recipes):
+    storage = DryStorage(recipes, init=5)
+    storage.stock('barley', 7.5)
+    assert storage.level('barley') == 12.5
+    assert 'barley' in storage and 'wheat' not in storage
+    assert list(storage) == ['malt', 'hops', 'barley']
+
+
+def test_monitored_levels_follow_draws_and_deliveries(recipes):
+    env = Environment()
+    storage = DryStorage(recipes, init=40, env=env, monitoring=True)
+    env.run(until=2)
+    storage.draw('Pale', kegs=2)
+    env.run(until=5)
+    storage.stock('malt', 100)
+    assert storage.series['malt'].times.tolist() == [0.0, 2.0, 5.0]
+    assert storage.series['malt'].levels.tolist() == [40.0, 20.0, 120.0]
+    assert storage.series['hops'].levels.tolist() == [40.0, 38.0]
+    assert storage.series['barley'].levels.tolist() == [40.0]
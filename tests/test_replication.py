@@ -0,0 +1,51 @@
+from brewmaster.replication import (compare, replicate, replicate_until, run_antithetic_pair, run_replication,
+                                    summarize, t_quantile)
+
+SHORT = 20 * 24
+VARIED = 60 * 24  # long enough for the seeds to give different funds
+
+
+def test_replications_are_reproducible_by_seed():
+    assert run_replication(4, until=SHORT) == run_replication(4, until=SHORT)
+    assert run_replication(4, until=SHORT, antithetic=True) == run_replication(4, until=SHORT, antithetic=True)
+
+
+def test_parallel_replications_match_serial_ones():
+    serial, _ = replicate(3, until=SHORT, processes=1)
+    parallel, _ = replicate(3, until=SHORT, processes=2)
+    assert serial == parallel
+    assert [result['seed'] for result in serial] == [0, 1, 2]
+
+
+def test_antithetic_pair_averages_both_runs():
+    plain = run_replication(6, until=SHORT)
+    mirrored = run_replication(6, until=SHORT, antithetic=True)
+    pair = run_antithetic_pair(6, until=SHORT)
+    assert pair['funds'] == (plain['funds'] + mirrored['funds']) / 2
+
+
+def test_comparing_a_configuration_with_itself_gives_zero_differences():
+    differences, summary = compare({}, {}, replications=3, until=SHORT, processes=1)
+    assert all(difference['funds'] == 0 for difference in differences)
+    assert summary['funds']['std'] == 0
+
+
+def test_summary_statistics():
+    summary = summarize([{'funds': 1.0}, {'funds': 3.0}], ['funds'])['funds']
+    assert summary['mean'] == 2.0 and summary['min'] == 1.0 and summary['max'] == 3.0 and summary['n'] == 2
+
+
+def test_t_quantile_approaches_the_normal_quantile():
+    assert abs(t_quantile(0.95, 10) - 2.228) < 0.01
+    assert abs(t_quantile(0.95, 10000) - 1.96) < 0.001
+
+
+def test_sequential_stopping_stops_once_precise_enough():
+    results, summary = replicate_until('funds', precision=0.5, min_replications=3, max_replications=20,
+                                       until=VARIED, processes=1)
+    assert summary['funds']['converged']
+    assert len(results) == 3
+    results, summary = replicate_until('funds', precision=1e-9, min_replications=2, max_replications=4,
+                                       batch_size=1, until=VARIED, processes=1)
+    assert not summary['funds']['converged']
+    assert len(results) == 4
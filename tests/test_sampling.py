@@ -0,0 +1,64 @@
+import numpy as np
+from brewmaster.sampling import MAX_UNIFORM, Sampler, Streams
+
+
+def draws(sampler, size=50):
+    return [sampler.random() for _ in range(size)]
+
+
+def test_same_seed_and_stream_give_the_same_variates():
+    assert draws(Sampler(7, stream='arrivals')) == draws(Sampler(7, stream='arrivals'))
+
+
+def test_streams_are_independent_of_each_other():
+    assert draws(Sampler(7, stream='arrivals')) != draws(Sampler(7, stream='brewing'))
+    assert draws(Sampler(7, stream='arrivals')) != draws(Sampler(8, stream='arrivals'))
+
+
+def test_drawing_from_one_stream_does_not_shift_another():
+    untouched = Streams(3, names=['arrivals', 'brewing'])
+    busy = Streams(3, names=['arrivals', 'brewing'])
+    draws(busy['arrivals'], 5000)
+    assert draws(busy['brewing']) == draws(untouched['brewing'])
+
+
+def test_antithetic_stream_mirrors_the_uniforms():
+    plain = np.array(draws(Sampler(11, stream='bar'), 3000))
+    mirrored = np.array(draws(Sampler(11, stream='bar', antithetic=True), 3000))
+    assert np.allclose(mirrored, np.minimum(1.0 - plain, MAX_UNIFORM))
+    assert mirrored.max() < 1.0
+
+
+def test_antithetic_exponentials_are_negatively_correlated():
+    plain_stream = Sampler(5, stream='bar')
+    mirrored_stream = Sampler(5, stream='bar', antithetic=True)
+    plain = np.array([plain_stream.expovariate(2.0) for _ in range(5000)])
+    mirrored = np.array([mirrored_stream.expovariate(2.0) for _ in range(5000)])
+    assert np.corrcoef(plain, mirrored)[0, 1] < -0.5
+    assert abs(plain.mean() - 0.5) < 0.05
+
+
+def test_poisson_variates_have_the_right_mean():
+    sampler = Sampler(2, stream='arrivals')
+    counts = [sampler.poisson(3.5) for _ in range(20000)]
+    assert abs(np.mean(counts) - 3.5) < 0.1
+    assert abs(sampler.poissons(3.5, 20000).mean() - 3.5) < 0.1
+
+
+def test_state_round_trip_continues_the_sequence():
+    sampler = Sampler(9, stream='patrons')
+    draws(sampler, 10)
+    sampler.expovariate(1.0)
+    state = sampler.getstate()
+    expected = draws(sampler, 2000) + [sampler.expovariate(1.0), sampler.poisson(2.0)]
+    restored = Sampler(0, stream='patrons')
+    restored.setstate(state)
+    assert draws(restored, 2000) + [restored.expovariate(1.0), restored.poisson(2.0)] == expected
+
+
+def test_sample_and_choice_stay_in_the_population():
+    sampler = Sampler(4)
+    population = list(range(10))
+    picked = sampler.sample(population, 4)
+    assert len(set(picked)) == 4 and set(picked) <= set(population)
+    assert all(sampler.choice(range(3)) in (0, 1, 2) for _ in range(100))
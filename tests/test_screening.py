@@ -0,0 +1,47 @@
+from math import isfinite
+import pytest
+from brewmaster.screening import screen, turn_away, validate_screening
+
+UNTIL = 60 * 24
+TABLE_LIMITED = dict(tables={4: 2}, arrival_rate=5, num_stored_kegs=60, num_kegs_per_beer=20)
+
+
+def test_default_plan_has_a_finite_brewing_delay():
+    estimate = screen(until=UNTIL)
+    assert isfinite(estimate['brewing_delay'])
+    assert estimate['brewing_delay'] > 0
+
+
+def test_no_batch_no_brewing_delay():
+    estimate = screen(num_stored_kegs=1, batch_size=2, until=UNTIL)
+    assert estimate['brew_rate'] == 0
+    assert estimate['brewing_delay'] == 0
+
+
+def test_batches_must_hold_kegs():
+    for batch_size in (0, -1):
+        with pytest.raises(ValueError):
+            screen(batch_size=batch_size, until=UNTIL)
+
+
+def test_turn_away_grows_as_tables_shrink():
+    shares = [turn_away(5.0, tables, 0.85, fixed_time=0.3)[0] for tables in (20, 8, 4, 2)]
+    assert shares[0] == pytest.approx(0.0, abs=1e-3)
+    assert shares == sorted(shares)
+    assert 0 < shares[-1] < 1
+
+
+def test_waiting_shortens_the_time_a_table_is_held():
+    _, free = turn_away(1.0, 20, 0.85, fixed_time=0.3)
+    _, contested = turn_away(5.0, 2, 0.85, fixed_time=0.3)
+    assert free == pytest.approx(0.85)
+    assert 0.3 <= contested < free
+
+
+@pytest.mark.parametrize('config, tolerance', [({}, 0.35), (TABLE_LIMITED, 0.3)])
+def test_estimates_are_close_to_the_simulator(config, tolerance):
+    rows, errors = validate_screening([config], replications=2, until=UNTIL, processes=1)
+    row = rows[0]
+    assert set(errors) >= {'pints_sold', 'turn_away', 'brewing_delay'}
+    for name in ('pints_sold', 'brewing_delay'):
+        assert abs(row['error'][name]) <= tolerance * row['simulated'][name]
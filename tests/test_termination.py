@@ -0,0 +1,97 @@
+import logging
+import pickle
+from simpy import Environment
+from brewmaster.brewery import Brewery
+from brewmaster.termination import (DAY, HORIZON, WEEK, Insolvent, NoSales, SteadyState, StockoutStreak,
+                                    run_chunked, run_terminating)
+
+
+class Funds(object):
+    def __init__(self, funds):
+        self.funds = funds
+
+
+def history(**columns):
+    length = len(next(iter(columns.values())))
+    return [{name: values[idx] for name, values in columns.items()} for idx in range(length)]
+
+
+def test_insolvent():
+    assert Insolvent()(Funds(0.0), [])
+    assert not Insolvent()(Funds(0.01), [])
+    assert Insolvent(100.0)(Funds(50.0), [])
+
+
+def test_stockout_streak_needs_a_stockout_in_every_chunk():
+    streak = StockoutStreak(chunks=3)
+    assert not streak(None, history(stockouts=[0, 1, 2]))
+    assert streak(None, history(stockouts=[0, 1, 2, 3]))
+    assert not streak(None, history(stockouts=[0, 1, 1, 2]))
+    assert streak(None, history(stockouts=[5, 5, 6, 7, 8]))
+
+
+def test_no_sales_counts_from_the_start():
+    no_sales = NoSales(chunks=2)
+    assert not no_sales(None, history(pints_sold=[0]))
+    assert no_sales(None, history(pints_sold=[0, 0]))
+    assert not no_sales(None, history(pints_sold=[0, 1]))
+    assert not no_sales(None, history(pints_sold=[3, 4, 5]))
+    assert no_sales(None, history(pints_sold=[3, 4, 4, 4]))
+
+
+def test_steady_state_compares_the_growth_of_two_halves():
+    steady = SteadyState('funds', chunks=4, tolerance=0.05, warm_up=2)
+    linear = history(funds=[10.0 * idx for idx in range(7)])
+    assert steady(None, linear)
+    assert not steady(None, linear[:6])
+    accelerating = history(funds=[float(idx ** 2) for idx in range(7)])
+    assert not steady(None, accelerating)
+    assert steady(None, history(funds=[5.0] * 7))
+
+
+def test_predicates_can_be_pickled():
+    for predicate in (Insolvent(10.0), StockoutStreak(3), NoSales(2), SteadyState('pints_sold', 6)):
+        copy = pickle.loads(pickle.dumps(predicate))
+        assert vars(copy) == vars(predicate) and copy.reason == predicate.reason
+
+
+def test_run_to_the_horizon_matches_an_unchunked_run():
+    brewery = Brewery(env=Environment(), random_seed=1)
+    brewery.run(4 * WEEK)
+    result = run_chunked(Brewery(env=Environment(), random_seed=1), until=4 * WEEK, chunk=DAY)
+    assert result['termination'] == HORIZON
+    assert result['time'] == 4 * WEEK
+    assert result['funds'] == brewery.funds and result['pints_sold'] == brewery.pints_sold
+
+
+def test_callbacks_see_every_chunk():
+    seen = []
+    run_chunked(Brewery(env=Environment(), random_seed=1), until=3.5 * DAY, chunk=DAY,
+                callbacks=[lambda brewery, kpis: seen.append(kpis['time'])])
+    assert seen == [DAY, 2 * DAY, 3 * DAY, 3.5 * DAY]
+
+
+def test_first_predicate_to_fire_stops_the_run():
+    result = run_terminating(1, until=52 * WEEK, chunk=DAY, stop_when=[NoSales(2), Insolvent(float('inf'))],
+                             num_stored_kegs=1, num_kegs_per_beer=0)
+    assert result['termination'] == Insolvent.reason
+    assert result['time'] == DAY
+    assert result['seed'] == 1
+
+
+def test_a_dry_brewery_stops_for_lack_of_sales():
+    result = run_terminating(1, until=52 * WEEK, chunk=DAY, stop_when=[NoSales(3)],
+                             num_stored_kegs=1, num_kegs_per_beer=0)
+    assert result['termination'] == NoSales.reason
+    assert result['time'] == 3 * DAY
+    assert result['pints_sold'] == 0
+
+
+def test_a_brewery_that_cannot_pay_for_its_malt_goes_broke():
+    malt = 'Brewers Malt 2-Row (Briess)'
+    result = run_terminating(1, until=52 * WEEK, chunk=DAY, stop_when=[Insolvent()], log_level=logging.WARNING,
+                             initial_funds=1000, num_stored_kegs=1, num_kegs_per_beer=0,
+                             reorder_points={malt: 1000}, lead_times={malt: 30})
+    assert result['termination'] == Insolvent.reason
+    assert result['time'] == 2 * DAY
+    assert result['funds'] == 1000 - 10 * 1000
@@ -0,0 +1,33 @@
+import pickle
+from copy import deepcopy
+import pytest
+from brewmaster.replication import run_replication
+from brewmaster.util import load_beers, load_prices
+
+
+def test_loaded_config_is_read_only():
+    beers = load_beers('beers.json')
+    with pytest.raises(TypeError):
+        beers['Stout'] = {}
+    with pytest.raises(TypeError):
+        next(iter(beers.values()))['ingredients'].update(water=1)
+
+
+def test_loaded_config_is_shared_until_the_file_changes():
+    assert load_beers('beers.json') is load_beers('beers.json')
+    assert load_prices('prices.csv') is load_prices('prices.csv')
+
+
+def test_loaded_config_can_be_pickled_and_copied():
+    beers, prices = load_beers('beers.json'), load_prices('prices.csv')
+    for copied in (pickle.loads(pickle.dumps(beers)), deepcopy(beers)):
+        assert copied == beers
+        with pytest.raises(TypeError):
+            copied['Stout'] = {}
+    assert pickle.loads(pickle.dumps(prices)) == prices
+
+
+def test_replication_with_loaded_config_matches_filenames():
+    loaded = run_replication(3, until=10 * 24, beers_list=load_beers('beers.json'),
+                             price_list=load_prices('prices.csv'))
+    assert loaded == run_replication(3, until=10 * 24)